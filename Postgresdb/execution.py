@@ -0,0 +1,149 @@
+import os
+import shlex
+import subprocess
+import threading
+import time
+import hashlib
+from contextlib import contextmanager
+import psycopg2
+import psycopg2.pool
+
+# Shared postgres execution layer
+# Control statements (existence checks, CREATE DATABASE, slots) run over pooled psycopg2 connections,
+# client tools get the password in their own environment instead of the process-wide os.environ
+
+CONTROL_POOL_SIZE = 4
+# Pools idle this long are closed, an open session on postgres would block DROP DATABASE or TEMPLATE postgres
+CONTROL_POOL_IDLE_SECONDS = 60
+
+# One pool per server, user and database, created on first use and closed again once idle
+_controlPools = {}
+_controlPoolsLock = threading.Lock()
+_controlPoolSweeper = None
+
+# Environment for one postgres client process, nothing is written to os.environ
+def PostgresEnv(password):
+    env = os.environ.copy()
+    env.pop('PGPASSWORD', None)
+    if password:
+        env['PGPASSWORD'] = str(password)
+    return env
+
+# Shell line for a client tool on a remote host, the password only lives in that command's environment
+def RemoteToolCommand(command, password):
+    if isinstance(command, (list, tuple)):
+        command = shlex.join(command)
+    if not password:
+        return command
+    return f"PGPASSWORD={shlex.quote(str(password))} {command}"
+
+# Run a postgres client tool locally or on the remote host over ssh
+def RunBackupCommand(command, password, ssh=None, inputData=None):
+    if ssh is None:
+        result = subprocess.run(command, input=inputData, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=PostgresEnv(password))
+        return result.returncode == 0, result.stderr.decode()
+
+    stdin, stdout, stderr = ssh.exec_command(RemoteToolCommand(command, password))
+    if inputData is not None:
+        stdin.write(inputData)
+        stdin.channel.shutdown_write()
+    exitStatus = stdout.channel.recv_exit_status()
+    return exitStatus == 0, stderr.read().decode()
+
+# Same as RunBackupCommand but also returns stdout
+def RunCommandOutput(command, password, ssh=None):
+    if ssh is None:
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=PostgresEnv(password))
+        return result.returncode, result.stdout.decode(errors='replace'), result.stderr.decode(errors='replace')
+
+    stdin, stdout, stderr = ssh.exec_command(RemoteToolCommand(command, password))
+    output = stdout.read().decode(errors='replace')
+    exitStatus = stdout.channel.recv_exit_status()
+    return exitStatus, output, stderr.read().decode(errors='replace')
+
+class ControlPool:
+    def __init__(self, user, host, port, password, dbname):
+        # One connection stays open between calls, extra ones only while statements run concurrently
+        self.pool = psycopg2.pool.ThreadedConnectionPool(1, CONTROL_POOL_SIZE, dbname=dbname, user=user, password=password, host=host, port=port)
+        # ThreadedConnectionPool raises when it runs out, the semaphore makes callers wait instead
+        self.slots = threading.BoundedSemaphore(CONTROL_POOL_SIZE)
+        self.inUse = 0
+        self.lastUsed = time.monotonic()
+
+# Runs in one daemon thread per process, started with the first pool
+def SweepIdleControlPools():
+    while True:
+        time.sleep(CONTROL_POOL_IDLE_SECONDS / 2)
+        with _controlPoolsLock:
+            idle = [key for key, entry in _controlPools.items() if entry.inUse == 0 and time.monotonic() - entry.lastUsed >= CONTROL_POOL_IDLE_SECONDS]
+            for key in idle:
+                _controlPools.pop(key).pool.closeall()
+
+# The password only enters the key as a digest
+def GetControlPool(user, host, port, password, dbname="postgres"):
+    global _controlPoolSweeper
+    key = (user, str(host), str(port), dbname, hashlib.sha256(str(password).encode('utf-8')).hexdigest())
+    with _controlPoolsLock:
+        if key not in _controlPools:
+            _controlPools[key] = ControlPool(user, host, port, password, dbname)
+        if _controlPoolSweeper is None:
+            _controlPoolSweeper = threading.Thread(target=SweepIdleControlPools, daemon=True)
+            _controlPoolSweeper.start()
+        entry = _controlPools[key]
+        # Counted under the lock so the sweeper never closes a pool that is about to be used
+        entry.inUse += 1
+        return entry
+
+# Autocommit connection from the control pool, broken connections are discarded instead of returned
+@contextmanager
+def ControlConnection(user, host, port, password, dbname="postgres"):
+    entry = GetControlPool(user, host, port, password, dbname)
+    pool = entry.pool
+    conn = None
+    broken = False
+    try:
+        entry.slots.acquire()
+        try:
+            conn = pool.getconn()
+            if conn.closed:
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            conn.autocommit = True
+            yield conn
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            broken = True
+            raise
+        finally:
+            if conn is not None:
+                pool.putconn(conn, close=broken or bool(conn.closed))
+            entry.slots.release()
+    finally:
+        with _controlPoolsLock:
+            entry.inUse -= 1
+            entry.lastUsed = time.monotonic()
+
+# Run one control statement, fetch=True returns the rows
+def ExecuteControl(user, host, port, password, query, params=None, dbname="postgres", fetch=False):
+    with ControlConnection(user, host, port, password, dbname) as conn:
+        with conn.cursor() as cur:
+            cur.execute(query, params)
+            return cur.fetchall() if fetch else None
+
+def DatabaseExists(user, host, port, password, dbName):
+    return bool(ExecuteControl(user, host, port, password, "SELECT 1 FROM pg_database WHERE datname = %s;", (dbName,), fetch=True))
+
+def CreateDatabaseIfNotExists(user, host, port, password, dbName):
+    with ControlConnection(user, host, port, password) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (dbName,))
+            if cur.fetchone() is None:
+                # template0 cannot have sessions open, copying template1 fails while anyone is connected to it
+                cur.execute(f'CREATE DATABASE "{dbName}" TEMPLATE template0;')
+                print(f"Database '{dbName}' created successfully.")
+                return True
+    return False
+
+# List databases that can be dumped, largest first so they are scheduled first
+def ListDatabases(user, host, port, password):
+    rows = ExecuteControl(user, host, port, password, "SELECT datname FROM pg_database WHERE datistemplate = false AND datallowconn ORDER BY pg_database_size(datname) DESC;", fetch=True)
+    return [row[0] for row in rows]
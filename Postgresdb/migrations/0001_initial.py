@@ -0,0 +1,30 @@
+# Generated by Django 5.1.1 on 2026-10-17 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseBackupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('postgres_host', models.CharField(max_length=255)),
+                ('postgres_port', models.CharField(max_length=10)),
+                ('database_name', models.CharField(max_length=255)),
+                ('high_water_mark', models.CharField(blank=True, max_length=64, null=True)),
+                ('sequence', models.IntegerField(default=0)),
+                ('backup_path', models.CharField(blank=True, max_length=1024, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('postgres_host', 'postgres_port', 'database_name')},
+            },
+        ),
+    ]
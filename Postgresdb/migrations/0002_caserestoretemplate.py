@@ -0,0 +1,29 @@
+# Generated by Django 5.1.1 on 2026-10-17 20:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Postgresdb', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseRestoreTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('postgres_host', models.CharField(max_length=255)),
+                ('postgres_port', models.CharField(max_length=10)),
+                ('backup_id', models.CharField(max_length=1024)),
+                ('template_name', models.CharField(max_length=63)),
+                ('size_bytes', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('postgres_host', 'postgres_port', 'template_name')},
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.1 on 2026-10-17 20:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Postgresdb', '0002_caserestoretemplate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseExportRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('postgres_host', models.CharField(max_length=255)),
+                ('postgres_port', models.CharField(max_length=10)),
+                ('database_name', models.CharField(max_length=255)),
+                ('rows', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+                ('seconds', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
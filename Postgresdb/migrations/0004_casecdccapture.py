@@ -0,0 +1,35 @@
+# Generated by Django 5.1.1 on 2026-10-17 20:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Postgresdb', '0003_caseexportrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaseCdcCapture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('postgres_host', models.CharField(max_length=255)),
+                ('postgres_port', models.CharField(max_length=10)),
+                ('database_name', models.CharField(max_length=255)),
+                ('slot_name', models.CharField(max_length=63)),
+                ('segment_path', models.CharField(max_length=1024)),
+                ('running', models.BooleanField(default=False)),
+                ('stop_requested', models.BooleanField(default=False)),
+                ('owner', models.CharField(blank=True, default='', max_length=255)),
+                ('transactions', models.BigIntegerField(default=0)),
+                ('segments', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'unique_together': {('postgres_host', 'postgres_port', 'database_name')},
+            },
+        ),
+    ]
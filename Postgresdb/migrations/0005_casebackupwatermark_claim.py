@@ -0,0 +1,23 @@
+# Generated by Django 5.1.1 on 2026-10-17 20:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Postgresdb', '0004_casecdccapture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='casebackupwatermark',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='casebackupwatermark',
+            name='claimed_by',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+    ]
@@ -1,3 +1,75 @@
 from django.db import models
 
 # Create your models here.
+
+# Last exported updated_on per database for incremental case backups
+class CaseBackupWatermark(models.Model):
+    postgres_host = models.CharField(max_length=255)
+    postgres_port = models.CharField(max_length=10)
+    database_name = models.CharField(max_length=255)
+    # Stored as the text postgres returned so it compares exactly against updated_on
+    high_water_mark = models.CharField(max_length=64, null=True, blank=True)
+    sequence = models.IntegerField(default=0)
+    backup_path = models.CharField(max_length=1024, null=True, blank=True)
+    # Lease of the run currently exporting the next sequence, empty when no run holds it
+    claimed_by = models.CharField(max_length=64, blank=True, default="")
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('postgres_host', 'postgres_port', 'database_name')
+
+    def __str__(self):
+        return f"{self.postgres_host}:{self.postgres_port}/{self.database_name} @ {self.high_water_mark}"
+
+# Template database holding a restored case backup, cloned for repeat restores of the same backup
+class CaseRestoreTemplate(models.Model):
+    postgres_host = models.CharField(max_length=255)
+    postgres_port = models.CharField(max_length=10)
+    backup_id = models.CharField(max_length=1024)
+    template_name = models.CharField(max_length=63)
+    size_bytes = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('postgres_host', 'postgres_port', 'template_name')
+
+    def __str__(self):
+        return f"{self.postgres_host}:{self.postgres_port}/{self.template_name} <- {self.backup_id}"
+
+# Throughput of finished case exports, used to turn estimated bytes into an estimated duration
+class CaseExportRun(models.Model):
+    postgres_host = models.CharField(max_length=255)
+    postgres_port = models.CharField(max_length=10)
+    database_name = models.CharField(max_length=255)
+    rows = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+    seconds = models.FloatField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.postgres_host}:{self.postgres_port}/{self.database_name} {self.bytes} bytes in {self.seconds:.1f}s"
+
+# Logical replication capture of the case tables, shared by every worker process through the database
+# The capture thread lives in the owner process, other processes stop it through stop_requested
+class CaseCdcCapture(models.Model):
+    postgres_host = models.CharField(max_length=255)
+    postgres_port = models.CharField(max_length=10)
+    database_name = models.CharField(max_length=255)
+    slot_name = models.CharField(max_length=63)
+    segment_path = models.CharField(max_length=1024)
+    running = models.BooleanField(default=False)
+    stop_requested = models.BooleanField(default=False)
+    owner = models.CharField(max_length=255, blank=True, default="")
+    transactions = models.BigIntegerField(default=0)
+    segments = models.BigIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('postgres_host', 'postgres_port', 'database_name')
+
+    def __str__(self):
+        return f"{self.postgres_host}:{self.postgres_port}/{self.database_name} via {self.slot_name}"
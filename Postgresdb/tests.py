@@ -1,3 +1,388 @@
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+from unittest import mock
 from django.test import TestCase
+from .utils import ParseTestDecodingChange, ApplyCdcChange, BuildDumpIndex, MergeDumpRanges, PipeDumpRanges
+from .utils import RecoverySettings, StartWalArchiver, StopWalArchiver, WalArchiverRunning, WalArchivePath
+from .utils import ExportCaseWindow, CASE_EXPORT_TABLES
+import psycopg2
 
-# Create your tests here.
+
+class RecordingCursor:
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, query, params=None):
+        self.statements.append((query, params))
+
+
+class ParseTestDecodingChangeTests(TestCase):
+    def test_insert_unquoted_table(self):
+        change = ParseTestDecodingChange("table public.data: INSERT: id[integer]:1 data[text]:'one'")
+        self.assertEqual(change["table"], "data")
+        self.assertEqual(change["action"], "INSERT")
+        self.assertEqual(change["columns"], [("id", "integer", "1"), ("data", "text", "one")])
+        self.assertIsNone(change["old_key"])
+
+    def test_quoted_table_and_columns(self):
+        change = ParseTestDecodingChange('table public."Case ""Main""": INSERT: "Case Id"[bigint]:7 "say ""hi"""[text]:\'x\'')
+        self.assertEqual(change["table"], 'Case "Main"')
+        self.assertEqual(change["columns"], [("Case Id", "bigint", "7"), ('say "hi"', "text", "x")])
+
+    def test_string_quoting_and_spaces(self):
+        change = ParseTestDecodingChange("table public.notes: INSERT: id[integer]:1 body[text]:'it''s a note: with [brackets] and spaces'")
+        self.assertEqual(change["columns"][1], ("body", "text", "it's a note: with [brackets] and spaces"))
+
+    def test_null_and_unchanged_toast(self):
+        change = ParseTestDecodingChange("table public.data: UPDATE: id[integer]:1 note[text]:null blob[bytea]:unchanged-toast-datum")
+        self.assertEqual(change["columns"], [("id", "integer", "1"), ("note", "text", None)])
+
+    def test_array_and_parameterised_types(self):
+        change = ParseTestDecodingChange("table public.data: INSERT: tags[text[]]:'{a,\"b c\"}' grid[integer[][]]:'{{1,2},{3,4}}' name[character varying(255)]:'n'")
+        self.assertEqual(change["columns"], [
+            ("tags", "text[]", '{a,"b c"}'),
+            ("grid", "integer[][]", "{{1,2},{3,4}}"),
+            ("name", "character varying(255)", "n"),
+        ])
+
+    def test_update_with_old_key(self):
+        change = ParseTestDecodingChange("table public.data: UPDATE: old-key: id[integer]:1 new-tuple: id[integer]:2 data[text]:'moved'")
+        self.assertEqual(change["old_key"], [("id", "integer", "1")])
+        self.assertEqual(change["columns"], [("id", "integer", "2"), ("data", "text", "moved")])
+
+    def test_delete_and_truncate(self):
+        delete = ParseTestDecodingChange("table public.data: DELETE: id[integer]:3")
+        self.assertEqual((delete["action"], delete["columns"]), ("DELETE", [("id", "integer", "3")]))
+        noTuple = ParseTestDecodingChange("table public.data: DELETE: (no-tuple-data)")
+        self.assertEqual(noTuple["columns"], [])
+        truncate = ParseTestDecodingChange("table public.data: TRUNCATE: (no-flags)")
+        self.assertEqual((truncate["action"], truncate["columns"]), ("TRUNCATE", []))
+
+    def test_unrecognized_line(self):
+        with self.assertRaises(Exception):
+            ParseTestDecodingChange("BEGIN 1234")
+
+
+class ApplyCdcChangeTests(TestCase):
+    def apply(self, line, keyColumns=("id",)):
+        cursor = RecordingCursor()
+        ApplyCdcChange(cursor, ParseTestDecodingChange(line), {"data": list(keyColumns), 'Case "Main"': list(keyColumns)})
+        return cursor.statements
+
+    def test_insert(self):
+        statements = self.apply("table public.data: INSERT: id[integer]:1 tags[text[]]:'{a}' note[text]:null")
+        self.assertEqual(statements, [(
+            'INSERT INTO public."data" ("id", "tags", "note") VALUES (%s::integer, %s::text[], %s::text) ON CONFLICT ("id") DO NOTHING;',
+            ["1", "{a}", None],
+        )])
+
+    def test_insert_without_primary_key(self):
+        statements = self.apply("table public.data: INSERT: id[integer]:1", keyColumns=())
+        self.assertEqual(statements, [('INSERT INTO public."data" ("id") VALUES (%s::integer);', ["1"])])
+
+    def test_update_uses_old_key(self):
+        statements = self.apply("table public.data: UPDATE: old-key: id[integer]:1 new-tuple: id[integer]:2 data[text]:'x'")
+        self.assertEqual(statements, [(
+            'UPDATE public."data" SET "id" = %s::integer, "data" = %s::text WHERE "id" = %s::integer;',
+            ["2", "x", "1"],
+        )])
+
+    def test_update_without_old_key_uses_primary_key_of_new_tuple(self):
+        statements = self.apply("table public.data: UPDATE: id[integer]:1 data[text]:'x'")
+        self.assertEqual(statements, [(
+            'UPDATE public."data" SET "id" = %s::integer, "data" = %s::text WHERE "id" = %s::integer;',
+            ["1", "x", "1"],
+        )])
+
+    def test_delete_escapes_identifiers(self):
+        statements = self.apply('table public."Case ""Main""": DELETE: "id"[integer]:3')
+        self.assertEqual(statements, [('DELETE FROM public."Case ""Main""" WHERE "id" = %s::integer;', ["3"])])
+
+    def test_delete_without_key_fails(self):
+        with self.assertRaises(Exception):
+            self.apply("table public.data: DELETE: (no-tuple-data)")
+
+    def test_truncate(self):
+        self.assertEqual(self.apply("table public.data: TRUNCATE: (no-flags)"), [('TRUNCATE public."data";', None)])
+
+
+CLUSTER_DUMP = (
+    "--\n-- PostgreSQL database cluster dump\n--\n\nCREATE ROLE app;\n\n"
+    "--\n-- Database \"template1\" dump\n--\n\n\\connect template1\n\n"
+    "--\n-- Database \"shop\" dump\n--\n\nCREATE DATABASE shop;\n\\connect shop\n\n"
+    "COPY public.orders (id, item) FROM stdin;\n1\tbook\n2\tpen \\. not an end marker\n\\.\n\n"
+    "COPY public.\"Items\" (id) FROM stdin;\n7\n\\.\n\n"
+    "--\n-- PostgreSQL database cluster dump complete\n--\n"
+)
+
+# pg_dumpall before 11 writes no per-database headers
+LEGACY_DUMP = (
+    "CREATE ROLE app;\n"
+    "\\connect template1\n"
+    "\\connect -reuse-previous=on \"dbname='shop'\"\n"
+    "COPY public.orders (id) FROM stdin;\n1\n\\.\n"
+)
+
+
+class DumpIndexTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def index(self, text):
+        filePath = os.path.join(self.directory, "dump.sql")
+        with open(filePath, "w") as dumpFile:
+            dumpFile.write(text)
+        return filePath, BuildDumpIndex(filePath)
+
+    def test_cluster_dump_sections(self):
+        filePath, index = self.index(CLUSTER_DUMP)
+        data = CLUSTER_DUMP.encode()
+        self.assertEqual(index["size"], len(data))
+        self.assertEqual(set(index["databases"]), {"template1", "shop"})
+        self.assertEqual(data[index["globals"]["start"]:index["globals"]["end"]], data[:data.index(b'--\n-- Database "template1"') + 3])
+        shop = index["databases"]["shop"]
+        self.assertTrue(data[shop["start"]:].startswith(b'-- Database "shop" dump'))
+        self.assertEqual(shop["end"], len(data))
+        self.assertEqual(index["databases"]["template1"]["end"], shop["start"])
+        self.assertTrue(os.path.exists(filePath + ".idx.json"))
+
+    def test_copy_blocks_cover_exactly_the_data(self):
+        filePath, index = self.index(CLUSTER_DUMP)
+        data = CLUSTER_DUMP.encode()
+        tables = index["databases"]["shop"]["tables"]
+        self.assertEqual(set(tables), {"public.orders", "public.Items"})
+        orders = tables["public.orders"]
+        self.assertEqual(data[orders["start"]:orders["end"]], b"COPY public.orders (id, item) FROM stdin;\n1\tbook\n2\tpen \\. not an end marker\n\\.\n")
+        items = tables["public.Items"]
+        self.assertEqual(data[items["start"]:items["end"]], b'COPY public."Items" (id) FROM stdin;\n7\n\\.\n')
+
+    def test_legacy_dump_sections_start_at_connect(self):
+        filePath, index = self.index(LEGACY_DUMP)
+        data = LEGACY_DUMP.encode()
+        shop = index["databases"]["shop"]
+        self.assertTrue(data[shop["start"]:].startswith(b"\\connect -reuse-previous=on"))
+        self.assertEqual(index["databases"]["template1"]["end"], shop["start"])
+        self.assertEqual(data[index["globals"]["start"]:index["globals"]["end"]], b"CREATE ROLE app;\n")
+        orders = shop["tables"]["public.orders"]
+        self.assertEqual(data[orders["start"]:orders["end"]], b"COPY public.orders (id) FROM stdin;\n1\n\\.\n")
+
+    def test_plain_dump_is_one_unnamed_section(self):
+        text = "SET client_encoding = 'UTF8';\nCOPY public.orders (id) FROM stdin;\n1\n\\.\n"
+        filePath, index = self.index(text)
+        self.assertEqual(list(index["databases"]), [""])
+        orders = index["databases"][""]["tables"]["public.orders"]
+        self.assertEqual(text.encode()[orders["start"]:orders["end"]], b"COPY public.orders (id) FROM stdin;\n1\n\\.\n")
+
+
+class MergeDumpRangesTests(TestCase):
+    def test_repeated_and_overlapping_ranges_are_merged(self):
+        self.assertEqual(MergeDumpRanges([("a", 50, 80), ("a", 10, 20), ("a", 50, 80), ("a", 15, 30)]), [("a", 10, 30), ("a", 50, 80)])
+
+    def test_adjacent_ranges_share_one_reader(self):
+        self.assertEqual(MergeDumpRanges([("a", 20, 40), ("a", 0, 20)]), [("a", 0, 40)])
+
+    def test_ranges_of_different_files_stay_apart(self):
+        self.assertEqual(MergeDumpRanges([("b", 0, 10), ("a", 5, 10)]), [("a", 5, 10), ("b", 0, 10)])
+
+    def test_empty(self):
+        self.assertEqual(MergeDumpRanges([]), [])
+
+
+class PipeDumpRangesTests(TestCase):
+    def test_readers_extract_exactly_the_ranges(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filePath = os.path.join(directory, "dump sql's.sql")
+        with open(filePath, "w") as dumpFile:
+            dumpFile.write(CLUSTER_DUMP)
+        index = BuildDumpIndex(filePath)
+        tables = index["databases"]["shop"]["tables"]
+        ranges = [(filePath, tables[name]["start"], tables[name]["end"]) for name in ("public.Items", "public.orders", "public.orders")]
+
+        with mock.patch("Postgresdb.utils.RunBackupCommand", return_value=(True, "")) as runCommand:
+            PipeDumpRanges("postgres", "localhost", 5432, "secret", "shop", ranges)
+        command = runCommand.call_args[0][0]
+        self.assertEqual(command[:2], ["sh", "-c"])
+        readers, psql = command[2].rsplit(" | ", 1)
+        self.assertIn("ON_ERROR_STOP=1", psql)
+
+        output = subprocess.run(["sh", "-c", readers], stdout=subprocess.PIPE, check=True).stdout
+        data = CLUSTER_DUMP.encode()
+        orders, items = tables["public.orders"], tables["public.Items"]
+        self.assertEqual(output, data[orders["start"]:orders["end"]] + data[items["start"]:items["end"]])
+
+
+# Reads a setting back the way the postgresql.conf parser does
+def ReadConfSetting(text, name):
+    match = re.search(rf"^{name} = '((?:[^'\\]|''|\\.)*)'$", text, re.M)
+    return re.sub(r"''|\\(.)", lambda m: "'" if m.group(0) == "''" else m.group(1), match.group(1))
+
+# Expands %f, %p and %% the way postgres does before running restore_command
+def ExpandRestoreCommand(command, walFile, targetPath):
+    return re.sub(r"%[fp%]", lambda m: {"%f": walFile, "%p": targetPath, "%%": "%"}[m.group(0)], command)
+
+
+class RecoverySettingsTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def restore(self, walPath, walFile):
+        command = ExpandRestoreCommand(ReadConfSetting(RecoverySettings(walPath), "restore_command"), walFile, os.path.join(self.directory, "RECOVERYXLOG"))
+        return subprocess.run(["sh", "-c", command], stderr=subprocess.PIPE).returncode
+
+    def test_restore_command_survives_awkward_paths(self):
+        walPath = os.path.join(self.directory, "wal dir $(touch pwned) it's 100%f \\ ;")
+        os.makedirs(walPath)
+        with open(os.path.join(walPath, "000000010000000000000001"), "w") as segment:
+            segment.write("segment")
+        self.assertEqual(self.restore(walPath, "000000010000000000000001"), 0)
+        with open(os.path.join(self.directory, "RECOVERYXLOG")) as restored:
+            self.assertEqual(restored.read(), "segment")
+        self.assertFalse(os.path.exists("pwned"))
+
+    def test_restore_command_falls_back_to_partial_segment(self):
+        walPath = os.path.join(self.directory, "wal")
+        os.makedirs(walPath)
+        with open(os.path.join(walPath, "000000010000000000000002.partial"), "w") as segment:
+            segment.write("partial")
+        self.assertEqual(self.restore(walPath, "000000010000000000000002"), 0)
+        self.assertNotEqual(self.restore(walPath, "000000010000000000000003"), 0)
+
+    def test_target_time_and_action(self):
+        settings = RecoverySettings("/wal", "2026-10-17 10:00:00+00")
+        self.assertEqual(ReadConfSetting(settings, "recovery_target_time"), "2026-10-17 10:00:00+00")
+        self.assertIn("recovery_target_action = 'promote'", settings)
+        self.assertNotIn("recovery_target_time", RecoverySettings("/wal"))
+
+
+class WalArchiverTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.processes = []
+        realPopen = subprocess.Popen
+
+        # A sleep stands in for pg_receivewal so the pid handling runs against a real process
+        def FakeReceiver(command, *args, **kwargs):
+            if command[0] != "pg_receivewal":
+                return realPopen(command, *args, **kwargs)
+            self.receiverCommand = command
+            process = realPopen(["sleep", "60"], **kwargs)
+            self.processes.append(process)
+            return process
+
+        popen = mock.patch("Postgresdb.utils.subprocess.Popen", side_effect=FakeReceiver)
+        popen.start()
+        self.addCleanup(popen.stop)
+        self.addCleanup(self.StopProcesses)
+
+    def StopProcesses(self):
+        for process in self.processes:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+
+    def pidFile(self):
+        return os.path.join(WalArchivePath(self.directory, "db", 5432), "pg_receivewal.pid")
+
+    def test_start_creates_slot_and_records_pid(self):
+        with mock.patch("Postgresdb.utils.RunBackupCommand", return_value=(True, "")) as runCommand:
+            walPath = StartWalArchiver("postgres", "db", 5432, "secret", self.directory)
+        self.assertEqual(walPath, WalArchivePath(self.directory, "db", 5432))
+        slotCommand = runCommand.call_args[0][0]
+        self.assertIn("--create-slot", slotCommand)
+        self.assertIn("--if-not-exists", slotCommand)
+        self.assertIn("--slot", self.receiverCommand)
+        self.assertEqual(self.receiverCommand[self.receiverCommand.index("-D") + 1], walPath)
+        with open(self.pidFile()) as pidInput:
+            self.assertEqual(int(pidInput.read()), self.processes[0].pid)
+        self.assertTrue(WalArchiverRunning(self.pidFile()))
+
+    def test_second_start_reuses_the_running_receiver(self):
+        with mock.patch("Postgresdb.utils.RunBackupCommand", return_value=(True, "")) as runCommand:
+            first = StartWalArchiver("postgres", "db", 5432, "secret", self.directory)
+            second = StartWalArchiver("postgres", "db", 5432, "secret", self.directory)
+        self.assertEqual(first, second)
+        self.assertEqual(runCommand.call_count, 1)
+        self.assertEqual(len(self.processes), 1)
+
+    def test_stale_pid_file_starts_a_new_receiver(self):
+        os.makedirs(os.path.dirname(self.pidFile()))
+        exited = subprocess.Popen(["true"])
+        exited.wait()
+        with open(self.pidFile(), "w") as pidOutput:
+            pidOutput.write(str(exited.pid))
+        self.assertFalse(WalArchiverRunning(self.pidFile()))
+        with mock.patch("Postgresdb.utils.RunBackupCommand", return_value=(True, "")):
+            self.assertTrue(StartWalArchiver("postgres", "db", 5432, "secret", self.directory))
+        self.assertEqual(len(self.processes), 1)
+
+    def test_slot_failure_starts_nothing(self):
+        with mock.patch("Postgresdb.utils.RunBackupCommand", return_value=(False, "permission denied")):
+            self.assertFalse(StartWalArchiver("postgres", "db", 5432, "secret", self.directory))
+        self.assertEqual(self.processes, [])
+        self.assertFalse(os.path.exists(self.pidFile()))
+
+    def test_stop_terminates_receiver_and_removes_pid_file(self):
+        with mock.patch("Postgresdb.utils.RunBackupCommand", return_value=(True, "")):
+            StartWalArchiver("postgres", "db", 5432, "secret", self.directory)
+        self.assertTrue(StopWalArchiver("db", 5432, self.directory))
+        self.assertEqual(self.processes[0].wait(timeout=5), -signal.SIGTERM)
+        self.assertFalse(os.path.exists(self.pidFile()))
+        self.assertFalse(StopWalArchiver("db", 5432, self.directory))
+
+
+class FakeCoordinatorCursor(RecordingCursor):
+    def fetchone(self):
+        return ["00000003-00000002-1"] if "pg_export_snapshot" in self.statements[-1][0] else ["2026-10-17 10:00:00"]
+
+    def mogrify(self, query, params):
+        return (query % tuple(f"'{param}'" for param in params)).encode()
+
+    def copy_expert(self, query, output):
+        output.write(b"1\n")
+
+    def close(self):
+        pass
+
+
+class FakeCoordinator:
+    def set_session(self, **kwargs):
+        pass
+
+    def cursor(self):
+        return FakeCoordinatorCursor()
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ExportCaseWindowTests(TestCase):
+    def test_worker_connection_failure_is_a_failed_result(self):
+        coordinator = FakeCoordinator()
+        connections = iter([coordinator])
+
+        def Connect(*args):
+            try:
+                return next(connections)
+            except StopIteration:
+                raise psycopg2.OperationalError("connection refused")
+
+        with mock.patch("Postgresdb.utils.ConnectPostgres", side_effect=Connect):
+            results = ExportCaseWindow(None, None, "postgres", "db", 5432, "secret", "cases", mock.MagicMock(), workers=2)
+        self.assertEqual(len(results), len(CASE_EXPORT_TABLES))
+        for result in results:
+            self.assertFalse(result["status"])
+            self.assertIn("connection refused", result["error"])
+        self.assertTrue(coordinator.closed)
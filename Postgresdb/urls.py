@@ -5,4 +5,8 @@ urlpatterns = [
     path('BackupPostgres/', PostgresBackup.as_view(),name='Postgres-Backup'),
     path('RestorePostgres/',PostgresRestoreServer.as_view(),name='Postgres-Restore'),
     path('CmmRestore/',CaseMMRestoreSchemaWithData.as_view(), name='Schema-Restore'),
+    path('WalArchive/',PostgresWalArchive.as_view(), name='Wal-Archive'),
+    path('RestorePhysical/',PostgresPhysicalRestore.as_view(), name='Physical-Restore'),
+    path('CaseCdc/',PostgresCaseCdc.as_view(), name='Case-Cdc'),
+    path('EstimateCase/',CaseWindowEstimate.as_view(), name='Case-Estimate'),
 ]
\ No newline at end of file
@@ -2,8 +2,31 @@ import os
 import subprocess
 import  datetime
 from .views import *
+from .models import CaseBackupWatermark, CaseRestoreTemplate, CaseExportRun, CaseCdcCapture
+from django.core.cache import cache
+from .execution import *
+from django.utils import timezone
+from django.db import transaction, close_old_connections
+from django.db.models import Q
 import re
 import paramiko
+import psycopg2
+import psycopg2.pool
+import json
+import math
+import hashlib
+import gzip
+import select
+import threading
+import psycopg2.extras
+import shlex
+import io
+import signal
+import socket
+import time
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 # Formtting size to human readable 
@@ -23,10 +46,63 @@ def CreateRemoteDirectoryIfNotExists(sftp, path):
         # Directory already exists or another IOError
         print(f"Directory {path} already exists or cannot be created: {str(e)}")
 
+STREAM_CHUNK_SIZE = 4 * 1024 * 1024
+ROLE_FILTER_PATTERNS = (b'CREATE ROLE postgres', b'ALTER ROLE postgres')
+
+# Drop postgres role lines from a stream of byte chunks without touching the other bytes
+def FilterRoleLines(chunks):
+    pending = b''
+    for chunk in chunks:
+        data = pending + chunk
+        cut = data.rfind(b'\n') + 1
+        pending = data[cut:]
+        block = data[:cut]
+        # Only split into lines when a block actually contains a role statement
+        if any(pattern in block for pattern in ROLE_FILTER_PATTERNS):
+            block = b''.join(line for line in block.splitlines(keepends=True) if not any(pattern in line for pattern in ROLE_FILTER_PATTERNS))
+        if block:
+            yield block
+    if pending and not any(pattern in pending for pattern in ROLE_FILTER_PATTERNS):
+        yield pending
+
+# Read a remote command's stdout in large blocks, draining stderr alongside it
+def ReadChannelChunks(channel, errors):
+    while True:
+        data = channel.recv(STREAM_CHUNK_SIZE)
+        while channel.recv_stderr_ready():
+            errors.append(channel.recv_stderr(STREAM_CHUNK_SIZE))
+        if not data:
+            break
+        yield data
+    while channel.recv_stderr_ready():
+        errors.append(channel.recv_stderr(STREAM_CHUNK_SIZE))
+
+# Stream a remote dump command into a remote file, optionally zstd compressed on the remote side
+def StreamRemoteDump(ssh, sftp, command, remoteFilePath, compress=False):
+    if compress:
+        # The role filter has to run before compression, so it moves into the remote pipeline
+        command = f"set -o pipefail; {command} | grep -v -e 'CREATE ROLE postgres' -e 'ALTER ROLE postgres' | zstd -T0 -q -c"
+        remoteFilePath = remoteFilePath + ".zst"
+
+    stdin, stdout, stderr = ssh.exec_command(f"bash -c {shlex.quote(command)}" if compress else command)
+    channel = stdout.channel
+    errors = []
+    transferred = 0
+
+    with sftp.file(remoteFilePath, 'wb', bufsize=STREAM_CHUNK_SIZE) as remote_file:
+        remote_file.set_pipelined(True)
+        chunks = ReadChannelChunks(channel, errors)
+        for block in (chunks if compress else FilterRoleLines(chunks)):
+            remote_file.write(block)
+            transferred += len(block)
+
+    exitStatus = channel.recv_exit_status()
+    errorOutput = b''.join(errors).decode(errors='replace')
+    print(f"Transferred {FormatSize(transferred)} to {remoteFilePath}")
+    return exitStatus, errorOutput, remoteFilePath
+
 # Server backup for local and remote
-def ServerSchemaBackup(user, host, port, password, filePath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
-    os.environ['PGPASSWORD'] = password
-    
+def ServerSchemaBackup(user, host, port, password, filePath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None, compress=False):
     if not isRemote:
         if not os.path.exists(filePath):
             os.makedirs(filePath)
@@ -41,7 +117,7 @@ def ServerSchemaBackup(user, host, port, password, filePath, isRemote=False, rem
                 '-v', 
                 '-f',temp_filepath
                 ]
-        result = subprocess.run(command,check=True)
+        result = subprocess.run(command, check=True, env=PostgresEnv(password))
         
         with open(temp_filepath, 'r') as infile, open(filePath, 'w') as outfile:
             for line in infile:
@@ -56,6 +132,7 @@ def ServerSchemaBackup(user, host, port, password, filePath, isRemote=False, rem
             return False
         else:
             print(f"Backup successfull. File saved to {filePath}")
+            BuildDumpIndex(filePath)
             return filePath
 
     else:
@@ -73,29 +150,18 @@ def ServerSchemaBackup(user, host, port, password, filePath, isRemote=False, rem
 
             remote_backup_filepath = f"{filePath}/{int(datetime.datetime.now().timestamp())}_{host}_schema.sql"
             
-            command = f"PGPASSWORD={password} pg_dumpall -U {user} -h {host} -p {port} --schema-only -v"
-            print(f"Executing command: {command}")
+            command = ['pg_dumpall', '-U', user, '-h', str(host), '-p', str(port), '--schema-only', '-v']
+            print(f"Executing command: {shlex.join(command)}")
+            command = RemoteToolCommand(command, password)
             
-            stdin, stdout, stderr = ssh.exec_command(command)
-            print("Backup command executed.")
-            
-            # with ssh.open_sftp().file(remote_backup_filepath, 'w') as remote_file:
-            with sftp.file(remote_backup_filepath, 'w') as remote_file:
-                print("Transferring and filtering backup file...")
-                
-                for line in iter(stdout.readline, ""):
-                    line_stripped = line.strip()
-                    print(line_stripped) 
-                    if 'CREATE ROLE postgres' in line_stripped or 'ALTER ROLE postgres' in line_stripped:
-                        continue
-                    remote_file.write(line_stripped + '\n')
-            
-            error_output = stderr.read().decode()
-            if error_output:
+            print("Transferring and filtering backup file...")
+            exitStatus, error_output, remote_backup_filepath = StreamRemoteDump(ssh, sftp, command, remote_backup_filepath, compress)
+            if exitStatus != 0:
                 print(f"Backup failed with error: {error_output}")
                 return remote_backup_filepath
 
             print(f"Backup saved to remote server at: {remote_backup_filepath}")
+            BuildDumpIndex(remote_backup_filepath, ssh)
             return remote_backup_filepath
 
         except Exception as e:
@@ -103,29 +169,33 @@ def ServerSchemaBackup(user, host, port, password, filePath, isRemote=False, rem
             return remote_backup_filepath
 
         finally:
-            if 'PGPASSWORD' in os.environ:
-                del os.environ['PGPASSWORD']
             ssh.close()
-def ServerDataBackup( user, host, port, password, filePath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
-    os.environ['PGPASSWORD'] = password
-
+def ServerDataBackup( user, host, port, password, filePath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None, compress=False):
     if not isRemote:
         # Local backup
         try:
             # Execute the command locally and save the output to the backup file
             backupFilePath = os.path.join(filePath, f'{int(datetime.datetime.now().timestamp())}_{host}_data_backup.sql')
-            command = f"pg_dumpall -U {user} -h {host} -p {port} | grep -v 'CREATE ROLE postgres' | grep -v 'ALTER ROLE postgres' -f {backupFilePath}"
-            # command = f"pg_dumpall -U {user} -h {host} -p {port} -f {backupFilePath}"
-            
-            with open(backupFilePath, 'w') as backup_file:
-                result = subprocess.run(command, shell=True, stdout=backup_file, stderr=subprocess.PIPE)
+            command = ['pg_dumpall', '-U', user, '-h', str(host), '-p', str(port)]
+
+            # Role lines are filtered in-process instead of through a shell pipeline
+            with open(backupFilePath, 'wb') as backup_file:
+                process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=PostgresEnv(password))
+                errors = []
+                stderrReader = threading.Thread(target=lambda: errors.append(process.stderr.read()))
+                stderrReader.start()
+                for block in FilterRoleLines(iter(lambda: process.stdout.read(STREAM_CHUNK_SIZE), b'')):
+                    backup_file.write(block)
+                returnCode = process.wait()
+                stderrReader.join()
 
             # Check if the command succeeded
-            if result.returncode != 0:
-                print(f"Backup failed: {result.stderr.decode()}")
+            if returnCode != 0:
+                print(f"Backup failed: {b''.join(errors).decode(errors='replace')}")
                 return False
             else:
                 print(f"Backup successful. File saved to {backupFilePath}")
+                BuildDumpIndex(backupFilePath)
                 return backupFilePath
 
         except subprocess.CalledProcessError as e:
@@ -148,24 +218,20 @@ def ServerDataBackup( user, host, port, password, filePath, isRemote=False, remo
             remote_backup_filepath = f"{filePath}/{int(datetime.datetime.now().timestamp())}_{host}_data_backup.sql"
             
             # Command to run pg_dumpall for full server backup
-            command = f"PGPASSWORD={password} pg_dumpall -U {user} -h {host} -p {port} -v"
-            print(f"Executing command: {command}")
+            command = ['pg_dumpall', '-U', user, '-h', str(host), '-p', str(port), '-v']
+            print(f"Executing command: {shlex.join(command)}")
+            command = RemoteToolCommand(command, password)
             
-            # Execute the command on the remote host to fetch the full server backup
-            stdin, stdout, stderr = ssh.exec_command(command)
+            # Execute the command on the remote host and stream the full server backup
             sftp = ssh.open_sftp()
-            
-            with sftp.file(remote_backup_filepath, 'w') as remote_file:
-                print("Transferring and filtering backup file...")
-                
-                for line in iter(stdout.readline, ""):
-                    line_stripped = line.strip()
-                    print(line_stripped) 
-                    if 'CREATE ROLE postgres' in line_stripped or 'ALTER ROLE postgres' in line_stripped:
-                        continue
-                    remote_file.write(line_stripped + '\n')
+            print("Transferring and filtering backup file...")
+            exitStatus, error_output, remote_backup_filepath = StreamRemoteDump(ssh, sftp, command, remote_backup_filepath, compress)
+            if exitStatus != 0:
+                print(f"Remote backup failed with error: {error_output}")
+                return None
             
             print(f"Full server backup saved to remote server at: {remote_backup_filepath}")
+            BuildDumpIndex(remote_backup_filepath, ssh)
             return remote_backup_filepath
         
         except Exception as e:
@@ -173,45 +239,604 @@ def ServerDataBackup( user, host, port, password, filePath, isRemote=False, remo
             return None
         
         finally:
-            if 'PGPASSWORD' in os.environ:  # Ensure the environment variable is cleared
-                del os.environ['PGPASSWORD']
             if ssh:
                 ssh.close()
 
+# Parallel server backup, one pg_dump -Fd -j per database plus a globals file
+def ServerParallelBackup(user, host, port, password, filePath, jobs=None, parallelDatabases=None, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+
+    try:
+        databases = ListDatabases(user, host, port, password)
+        if not databases:
+            print("No databases found to backup.")
+            return False
+
+        # jobs is the global worker limit shared by all concurrent pg_dump processes
+        jobs = int(jobs) if jobs else (os.cpu_count() or 1)
+        parallelDatabases = int(parallelDatabases) if parallelDatabases else max(1, jobs // 2)
+        parallelDatabases = max(1, min(parallelDatabases, len(databases), jobs))
+        perDatabaseJobs = max(1, jobs // parallelDatabases)
+        print(f"Dumping {len(databases)} databases, {parallelDatabases} at a time with {perDatabaseJobs} jobs each.")
+
+        backupDir = os.path.join(filePath, f'{int(datetime.datetime.now().timestamp())}_{host}_server')
+        globalsPath = os.path.join(backupDir, "globals.sql")
+
+        if isRemote:
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(hostname=remoteHost, username=remoteUser, password=remotePassword)
+            print("SSH connection established.")
+            ok, error = RunBackupCommand(['mkdir', '-p', os.path.join(backupDir, "databases")], password, ssh)
+            if not ok:
+                print(f"Unable to create remote backup directory: {error}")
+                return False
+        else:
+            os.makedirs(os.path.join(backupDir, "databases"), exist_ok=True)
+
+        # Roles and tablespaces go in a small separate file
+        globalsCommand = ['pg_dumpall', '-U', user, '-h', str(host), '-p', str(port), '--globals-only', '-f', globalsPath + ".tmp"]
+        ok, error = RunBackupCommand(globalsCommand, password, ssh)
+        if not ok:
+            print(f"Globals backup failed: {error}")
+            return False
+        filterCommand = ['sh', '-c', f"grep -v -e 'CREATE ROLE postgres' -e 'ALTER ROLE postgres' {shlex.quote(globalsPath + '.tmp')} > {shlex.quote(globalsPath)}; rm -f {shlex.quote(globalsPath + '.tmp')}"]
+        RunBackupCommand(filterCommand, password, ssh)
+        print(f"Globals saved to {globalsPath}")
+
+        def DumpDatabase(dbName):
+            dumpPath = os.path.join(backupDir, "databases", dbName)
+            command = [
+                'pg_dump',
+                '-U', user,
+                '-h', str(host),
+                '-p', str(port),
+                '-d', dbName,
+                '-Fd',
+                '-j', str(perDatabaseJobs),
+                '-f', dumpPath
+            ]
+            ok, error = RunBackupCommand(command, password, ssh)
+            if ok:
+                print(f"Database '{dbName}' dumped to {dumpPath}")
+            else:
+                print(f"Dump of database '{dbName}' failed: {error}")
+            return {"name": dbName, "path": os.path.join("databases", dbName), "status": ok, "error": error if not ok else None}
+
+        results = []
+        with ThreadPoolExecutor(max_workers=parallelDatabases) as executor:
+            futures = [executor.submit(DumpDatabase, dbName) for dbName in databases]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+        manifest = {
+            "format": "directory",
+            "host": host,
+            "created_at": datetime.datetime.now().isoformat(),
+            "globals": "globals.sql",
+            "databases": sorted(results, key=lambda item: item["name"])
+        }
+        manifestPath = os.path.join(backupDir, "manifest.json")
+        if ssh:
+            with ssh.open_sftp() as sftp:
+                with sftp.file(manifestPath, 'w') as manifestFile:
+                    manifestFile.write(json.dumps(manifest, indent=2))
+        else:
+            with open(manifestPath, 'w') as manifestFile:
+                json.dump(manifest, manifestFile, indent=2)
+
+        if any(item["status"] is False for item in results):
+            print(f"Parallel backup finished with errors. Manifest saved to {manifestPath}")
+            return False
+
+        print(f"Parallel backup successful. Saved to {backupDir}")
+        return backupDir
+
+    except Exception as e:
+        print(f"Error during parallel backup: {e}")
+        return False
+
+    finally:
+        if ssh:
+            ssh.close()
+
+# Read the database list of a directory/custom format server backup
+def ReadParallelBackupManifest(backupDir, sftp=None):
+    manifestPath = os.path.join(backupDir, "manifest.json")
+    try:
+        if sftp:
+            with sftp.file(manifestPath, 'r') as manifestFile:
+                manifest = json.loads(manifestFile.read().decode('utf-8'))
+        else:
+            with open(manifestPath, 'r') as manifestFile:
+                manifest = json.load(manifestFile)
+        return manifest.get("globals"), [(item["name"], item["path"]) for item in manifest["databases"] if item.get("status", True)]
+    except (IOError, OSError):
+        # No manifest, every entry under databases/ is a -Fd directory or a -Fc file named <db>.dump
+        print(f"No manifest found in {backupDir}, listing dumps instead.")
+        databasesDir = os.path.join(backupDir, "databases")
+        entries = sftp.listdir(databasesDir) if sftp else os.listdir(databasesDir)
+        databases = []
+        for entry in entries:
+            dbName = entry[:-len(".dump")] if entry.endswith(".dump") else entry
+            databases.append((dbName, os.path.join("databases", entry)))
+        return "globals.sql", databases
+
+# Parallel server restore, one pg_restore -j per database for several databases at once
+def ServerParallelRestore(user, host, port, password, backupDir, jobs=None, parallelDatabases=None, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+
+    try:
+        if isRemote:
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(hostname=remoteHost, username=remoteUser, password=remotePassword)
+            print("SSH connection established.")
+            with ssh.open_sftp() as sftp:
+                globalsFile, databases = ReadParallelBackupManifest(backupDir, sftp)
+        else:
+            globalsFile, databases = ReadParallelBackupManifest(backupDir)
+
+        if not databases:
+            print(f"No database dumps found in {backupDir}")
+            return False
+
+        jobs = int(jobs) if jobs else (os.cpu_count() or 1)
+        parallelDatabases = int(parallelDatabases) if parallelDatabases else max(1, jobs // 2)
+        parallelDatabases = max(1, min(parallelDatabases, len(databases), jobs))
+        perDatabaseJobs = max(1, jobs // parallelDatabases)
+        print(f"Restoring {len(databases)} databases, {parallelDatabases} at a time with {perDatabaseJobs} jobs each.")
+
+        # Roles and tablespaces first so ownership in the dumps resolves
+        if globalsFile:
+            globalsCommand = ['psql', '-U', user, '-h', str(host), '-p', str(port), '-d', 'postgres', '-f', os.path.join(backupDir, globalsFile)]
+            ok, error = RunBackupCommand(globalsCommand, password, ssh)
+            if not ok:
+                print(f"Globals restore failed: {error}")
+                return False
+
+        def RestoreDatabase(dbName, dumpPath):
+            try:
+                CreateDatabaseIfNotExists(user, host, port, password, dbName)
+            except Exception as e:
+                print(f"Failed to create database '{dbName}': {e}")
+                return {"name": dbName, "status": False, "error": str(e)}
+
+            command = [
+                'pg_restore',
+                '-U', user,
+                '-h', str(host),
+                '-p', str(port),
+                '-d', dbName,
+                '-j', str(perDatabaseJobs),
+                os.path.join(backupDir, dumpPath)
+            ]
+            ok, error = RunBackupCommand(command, password, ssh)
+            if ok:
+                print(f"Database '{dbName}' restored from {dumpPath}")
+            else:
+                print(f"Restore of database '{dbName}' failed: {error}")
+            return {"name": dbName, "status": ok, "error": error if not ok else None}
+
+        results = []
+        with ThreadPoolExecutor(max_workers=parallelDatabases) as executor:
+            futures = [executor.submit(RestoreDatabase, dbName, dumpPath) for dbName, dumpPath in databases]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+        if any(item["status"] is False for item in results):
+            print("Parallel restore finished with errors.")
+            return False
+
+        print(f"Server restored successfully from {backupDir}")
+        return backupDir
+
+    except Exception as e:
+        print(f"Error during parallel restore: {e}")
+        return False
+
+    finally:
+        if ssh:
+            ssh.close()
+
+# Open an ssh connection for the physical backup helpers, None means run locally
+def ConnectRemote(isRemote, remoteHost, remoteUser, remotePassword):
+    if not isRemote:
+        return None
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(hostname=remoteHost, username=remoteUser, password=remotePassword)
+    print("SSH connection established.")
+    return ssh
+
+WAL_SLOT_NAME = "backup_and_restore_wal"
+
+def WalArchivePath(filePath, host, port):
+    return os.path.join(filePath, f"wal_{host}_{port}")
+
+# Physical backup with pg_basebackup, compressed tar format with the WAL needed for consistency
+def PhysicalBaseBackup(user, host, port, password, filePath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+    try:
+        ssh = ConnectRemote(isRemote, remoteHost, remoteUser, remotePassword)
+        backupDir = os.path.join(filePath, f'{int(datetime.datetime.now().timestamp())}_{host}_physical')
+        command = [
+            'pg_basebackup',
+            '-U', user,
+            '-h', str(host),
+            '-p', str(port),
+            '-D', backupDir,
+            '-Ft',  # One tar per tablespace
+            '-z',
+            '-X', 'stream',
+            '--checkpoint=fast',
+            '--label', os.path.basename(backupDir)
+        ]
+        if not ssh:
+            os.makedirs(filePath, exist_ok=True)
+        ok, error = RunBackupCommand(command, password, ssh)
+        if not ok:
+            print(f"Physical backup failed: {error}")
+            return False
+
+        print(f"Physical backup successful. Saved to {backupDir}")
+        return backupDir
+
+    except Exception as e:
+        print(f"Error during physical backup: {e}")
+        return False
+
+    finally:
+        if ssh:
+            ssh.close()
+
+# A pid file alone is not enough, the receiver it names may have exited
+def WalArchiverRunning(pidFile, ssh=None):
+    if ssh:
+        ok, _ = RunBackupCommand(['sh', '-c', f"[ -f {shlex.quote(pidFile)} ] && kill -0 $(cat {shlex.quote(pidFile)})"], "", ssh)
+        return ok
+    try:
+        with open(pidFile, 'r') as pidInput:
+            os.kill(int(pidInput.read().strip()), 0)
+        return True
+    except (OSError, ValueError):
+        return False
+
+# Start pg_receivewal in the background so WAL segments are collected continuously
+# Called before pg_basebackup, so the slot already holds back WAL from before the backup starts
+def StartWalArchiver(user, host, port, password, filePath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+    walPath = WalArchivePath(filePath, host, port)
+    pidFile = os.path.join(walPath, "pg_receivewal.pid")
+    connection = ['-U', user, '-h', str(host), '-p', str(port)]
+    try:
+        ssh = ConnectRemote(isRemote, remoteHost, remoteUser, remotePassword)
+        # A second receiver on the same slot fails and would only overwrite the pid file of the live one
+        if WalArchiverRunning(pidFile, ssh):
+            print(f"WAL archiver already running into {walPath}")
+            return walPath
+
+        # A replication slot keeps the server from recycling WAL that has not been received yet
+        slotCommand = ['pg_receivewal'] + connection + ['--slot', WAL_SLOT_NAME, '--create-slot', '--if-not-exists']
+        ok, error = RunBackupCommand(slotCommand, password, ssh)
+        if not ok:
+            print(f"Unable to create replication slot: {error}")
+            return False
+
+        receiveCommand = ['pg_receivewal'] + connection + ['--slot', WAL_SLOT_NAME, '-D', walPath, '--synchronous']
+        if ssh:
+            RunBackupCommand(['mkdir', '-p', walPath], password, ssh)
+            background = f"nohup {shlex.join(receiveCommand)} > {shlex.quote(os.path.join(walPath, 'pg_receivewal.log'))} 2>&1 & echo $! > {shlex.quote(pidFile)}"
+            ok, error = RunBackupCommand(['sh', '-c', background], password, ssh)
+            if not ok:
+                print(f"Unable to start WAL archiver: {error}")
+                return False
+        else:
+            os.makedirs(walPath, exist_ok=True)
+            with open(os.path.join(walPath, 'pg_receivewal.log'), 'ab') as logFile:
+                process = subprocess.Popen(receiveCommand, stdout=logFile, stderr=subprocess.STDOUT, start_new_session=True, env=PostgresEnv(password))
+            with open(pidFile, 'w') as pidOutput:
+                pidOutput.write(str(process.pid))
+
+        print(f"WAL archiving started into {walPath}")
+        return walPath
+
+    except Exception as e:
+        print(f"Error starting WAL archiver: {e}")
+        return False
+
+    finally:
+        if ssh:
+            ssh.close()
+
+def StopWalArchiver(host, port, filePath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+    walPath = WalArchivePath(filePath, host, port)
+    pidFile = os.path.join(walPath, "pg_receivewal.pid")
+    try:
+        ssh = ConnectRemote(isRemote, remoteHost, remoteUser, remotePassword)
+        if ssh:
+            ok, error = RunBackupCommand(['sh', '-c', f"kill $(cat {shlex.quote(pidFile)}) && rm -f {shlex.quote(pidFile)}"], "", ssh)
+            if not ok:
+                print(f"Unable to stop WAL archiver: {error}")
+                return False
+        else:
+            with open(pidFile, 'r') as pidInput:
+                os.kill(int(pidInput.read().strip()), signal.SIGTERM)
+            os.remove(pidFile)
+
+        print(f"WAL archiving stopped for {walPath}")
+        return walPath
+
+    except Exception as e:
+        print(f"Error stopping WAL archiver: {e}")
+        return False
+
+    finally:
+        if ssh:
+            ssh.close()
+
+# postgresql.conf string literal, the config parser reads backslash escapes and doubled quotes inside it
+def ConfString(value):
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "''") + "'"
+
+def RecoverySettings(walPath, targetTime=None):
+    # Segments still being written by pg_receivewal carry a .partial suffix, postgres expands % itself so a literal one is %%
+    walDir = shlex.quote(walPath).replace("%", "%%")
+    restoreCommand = f'cp {walDir}/"%f" "%p" || cp {walDir}/"%f.partial" "%p"'
+    settings = [f"restore_command = {ConfString(restoreCommand)}"]
+    if targetTime:
+        settings.append(f"recovery_target_time = {ConfString(targetTime)}")
+    settings.append("recovery_target_action = 'promote'")
+    return "\n".join(settings) + "\n"
+
+# Rebuild a data directory from a base backup and replay archived WAL up to targetTime
+def RestorePhysicalBackup(backupDir, walPath, dataDir, targetTime=None, startServer=False, serverPort=None, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+    try:
+        ssh = ConnectRemote(isRemote, remoteHost, remoteUser, remotePassword)
+        quotedData = shlex.quote(dataDir)
+        quotedBackup = shlex.quote(backupDir)
+
+        # Refuse to overwrite an existing cluster
+        ok, error = RunBackupCommand(['sh', '-c', f"[ ! -e {quotedData} ] || [ -z \"$(ls -A {quotedData})\" ]"], "", ssh)
+        if not ok:
+            print(f"Data directory {dataDir} is not empty, restore will not proceed.")
+            return False
+
+        extract = (
+            f"set -e; mkdir -p {quotedData}; chmod 700 {quotedData}; "
+            f"tar -xzf {quotedBackup}/base.tar.gz -C {quotedData}; "
+            f"if [ -f {quotedBackup}/pg_wal.tar.gz ]; then tar -xzf {quotedBackup}/pg_wal.tar.gz -C {quotedData}/pg_wal; fi; "
+            # Tablespace tars are named by oid and go back to the location recorded in tablespace_map
+            f"if [ -f {quotedData}/tablespace_map ]; then while read oid location; do "
+            f"mkdir -p \"$location\"; chmod 700 \"$location\"; tar -xzf {quotedBackup}/$oid.tar.gz -C \"$location\"; "
+            f"done < {quotedData}/tablespace_map; fi"
+        )
+        ok, error = RunBackupCommand(['sh', '-c', extract], "", ssh)
+        if not ok:
+            print(f"Unable to extract base backup: {error}")
+            return False
+
+        recovery = RecoverySettings(walPath, targetTime)
+        configure = f"printf %s {shlex.quote(recovery)} >> {quotedData}/postgresql.auto.conf && touch {quotedData}/recovery.signal"
+        ok, error = RunBackupCommand(['sh', '-c', configure], "", ssh)
+        if not ok:
+            print(f"Unable to write recovery settings: {error}")
+            return False
+        print(f"Data directory {dataDir} prepared for recovery{' to ' + targetTime if targetTime else ''}.")
+
+        if startServer:
+            command = ['pg_ctl', '-D', dataDir, '-l', os.path.join(dataDir, 'recovery.log'), '-w', 'start']
+            if serverPort:
+                command[-1:-1] = ['-o', f"-p {serverPort}"]
+            ok, error = RunBackupCommand(command, "", ssh)
+            if not ok:
+                print(f"Unable to start server on restored data directory: {error}")
+                return False
+            print(f"Server started on {dataDir}")
+
+        return dataDir
+
+    except Exception as e:
+        print(f"Error during physical restore: {e}")
+        return False
+
+    finally:
+        if ssh:
+            ssh.close()
+
+DUMP_INDEX_SUFFIX = ".idx.json"
+DUMP_INDEX_PATTERN = r'^(-- Database ".*" dump|COPY .* FROM stdin;|\\\.|\\connect .*)$'
+
+def NormalizeTableName(name):
+    return name.replace('"', '')
+
+# Build byte ranges per database section and per table COPY block from grep -b marker lines
+def ParseDumpIndex(markerOutput, size):
+    markers = []
+    for markerLine in markerOutput.splitlines():
+        offset, _, line = markerLine.partition(':')
+        if offset.isdigit():
+            markers.append((int(offset), line))
+
+    # pg_dumpall before 11 has no per-database headers, sections then start at \connect
+    hasHeaders = any(line.startswith('-- Database "') for offset, line in markers)
+    databases = {}
+    current = None
+    copyName = None
+    copyStart = None
+    for offset, line in markers:
+        header = re.match(r'^-- Database "(.*)" dump$', line)
+        connect = re.match(r'^\\connect\s+(?:-reuse-previous=on\s+)?"?(?:dbname=\')?([^"\']+)', line) if not hasHeaders else None
+        if header or connect:
+            name = (header or connect).group(1)
+            if current is not None:
+                databases[current]["end"] = offset
+            current = name
+            databases[current] = {"start": offset, "end": size, "tables": {}}
+        elif line.startswith('COPY '):
+            copyName = NormalizeTableName(line[len('COPY '):].split(' ')[0])
+            copyStart = offset
+        elif line == '\\.' and copyName:
+            if current is None:
+                # Plain pg_dump file, a single unnamed section
+                current = ""
+                databases[current] = {"start": 0, "end": size, "tables": {}}
+            databases[current]["tables"][copyName] = {"start": copyStart, "end": offset + len('\\.\n')}
+            copyName = None
+
+    firstSection = min((section["start"] for section in databases.values()), default=size)
+    return {
+        "version": 1,
+        "size": size,
+        "globals": {"start": 0, "end": firstSection},
+        "databases": databases
+    }
+
+# Index a plain dump file with grep -b so the file is never read into python
+def BuildDumpIndex(filePath, ssh=None):
+    if filePath.endswith('.zst'):
+        print(f"{filePath} is compressed and cannot be indexed for seeking.")
+        return None
+    exitStatus, output, error = RunCommandOutput(['stat', '-c', '%s', filePath], "", ssh)
+    if exitStatus != 0:
+        print(f"Unable to stat {filePath}: {error}")
+        return None
+    size = int(output.strip())
+
+    exitStatus, output, error = RunCommandOutput(['grep', '-a', '-b', '-E', DUMP_INDEX_PATTERN, filePath], "", ssh)
+    if exitStatus not in (0, 1):
+        print(f"Unable to index {filePath}: {error}")
+        return None
+
+    index = ParseDumpIndex(output, size)
+    indexPath = filePath + DUMP_INDEX_SUFFIX
+    if ssh:
+        with ssh.open_sftp() as sftp:
+            with sftp.file(indexPath, 'w') as indexFile:
+                indexFile.write(json.dumps(index))
+    else:
+        with open(indexPath, 'w') as indexFile:
+            json.dump(index, indexFile)
+    print(f"Indexed {len(index['databases'])} database sections of {filePath} into {indexPath}")
+    return index
+
+# Read the sidecar index, rebuilding it when missing or when the dump changed size
+def LoadDumpIndex(filePath, ssh=None):
+    indexPath = filePath + DUMP_INDEX_SUFFIX
+    try:
+        if ssh:
+            with ssh.open_sftp() as sftp:
+                size = sftp.stat(filePath).st_size
+                with sftp.file(indexPath, 'r') as indexFile:
+                    index = json.loads(indexFile.read().decode('utf-8'))
+        else:
+            size = os.path.getsize(filePath)
+            with open(indexPath, 'r') as indexFile:
+                index = json.load(indexFile)
+        if index.get("size") == size:
+            return index
+        print(f"Index {indexPath} is stale, rebuilding.")
+    except (IOError, OSError, ValueError):
+        print(f"No index for {filePath}, building it.")
+    return BuildDumpIndex(filePath, ssh)
+
+def FindIndexedTable(tables, tableName):
+    tableName = NormalizeTableName(tableName)
+    if tableName in tables:
+        return tableName
+    matches = [name for name in tables if name.split('.')[-1] == tableName]
+    return matches[0] if len(matches) == 1 else None
+
+# Overlapping or repeated ranges (the same table asked for twice) would load rows twice, adjacent ones share one reader
+def MergeDumpRanges(ranges):
+    merged = []
+    for filePath, start, end in sorted(ranges):
+        if merged and merged[-1][0] == filePath and start <= merged[-1][2]:
+            merged[-1][2] = max(merged[-1][2], end)
+        else:
+            merged.append([filePath, start, end])
+    return [tuple(item) for item in merged]
+
+# Pipe (file, start, end) byte ranges of dump files into one psql session, tail seeks straight to each range
+def PipeDumpRanges(user, host, port, password, dbName, ranges, ssh=None, stopOnError=True):
+    ranges = MergeDumpRanges(ranges)
+    readers = "; ".join(f"tail -c +{start + 1} {shlex.quote(filePath)} | head -c {end - start}" for filePath, start, end in ranges)
+    psql = ['psql', '-U', user, '-h', str(host), '-p', str(port), '-d', dbName]
+    if stopOnError:
+        psql += ['-v', 'ON_ERROR_STOP=1']
+    return RunBackupCommand(['sh', '-c', f"{{ {readers}; }} | {shlex.join(psql)}"], password, ssh)
+
+# Without ON_ERROR_STOP psql exits 0 on SQL errors, they only show on stderr
+# "already exists" is expected when a dump section re-creates roles or databases that are already there
+def SqlErrors(stderrOutput):
+    return [line.strip() for line in stderrOutput.splitlines() if "ERROR:" in line and "already exists" not in line]
+
+# Restore one database, or only some of its tables, straight from the indexed byte ranges of a dump
+def RestoreFromDumpIndex(user, host, port, password, filePath, dbName, tables=None, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+    try:
+        ssh = ConnectRemote(isRemote, remoteHost, remoteUser, remotePassword)
+        index = LoadDumpIndex(filePath, ssh)
+        if not index:
+            return False
+
+        section = index["databases"].get(dbName) or index["databases"].get("")
+        if section is None:
+            print(f"Database '{dbName}' not found in {filePath}")
+            return False
+
+        if tables:
+            ranges = []
+            for tableName in tables:
+                indexedName = FindIndexedTable(section["tables"], tableName)
+                if indexedName is None:
+                    print(f"Table '{tableName}' has no data in the '{dbName}' section of {filePath}")
+                    return False
+                ranges.append((filePath, section["tables"][indexedName]["start"], section["tables"][indexedName]["end"]))
+            ok, error = PipeDumpRanges(user, host, port, password, dbName, ranges, ssh)
+        else:
+            CreateDatabaseIfNotExists(user, host, port, password, dbName)
+            # The section carries its own CREATE DATABASE and \connect, which fail harmlessly on an existing database
+            ok, error = PipeDumpRanges(user, host, port, password, dbName, [(filePath, section["start"], section["end"])], ssh, stopOnError=False)
+            if ok and SqlErrors(error):
+                ok, error = False, "\n".join(SqlErrors(error))
+
+        if not ok:
+            print(f"Selective restore of '{dbName}' failed: {error}")
+            return False
+        print(f"Restored {'tables ' + ', '.join(tables) if tables else 'database'} of '{dbName}' from {filePath}")
+        return filePath
+
+    except Exception as e:
+        print(f"Error during selective restore: {e}")
+        return False
+
+    finally:
+        if ssh:
+            ssh.close()
+
 # Server restore for local
 def ServerSchemaRestore(user, host, port, password, filePath):
-    db_names = set()
-    with open(filePath, 'r') as file:
-        content = file.read()
-        db_names = set(re.findall(r'CREATE\s+DATABASE\s+("([^"]+)"|([^\s]+))\s+WITH\s+', content, re.IGNORECASE))
-        db_names = {match[1] if match[1] else match[2] for match in db_names}
-        print("Database Names: ",db_names)
+    # Database names come from the index instead of reading the whole dump
+    index = LoadDumpIndex(filePath)
+    if index is None:
+        return False
+    db_names = {name for name in index["databases"] if name not in ("", "template1", "postgres")}
+    print("Database Names: ",db_names)
     
     for dbName in db_names:
-        command = f'CREATE DATABASE \"{dbName}\";'
-        print(command)
-        os.environ['PGPASSWORD'] = password
         try:
-            result = subprocess.run(
-                ['psql', '-U', user, '-h', host, '-p', str(port), '-c', command],
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            if result.returncode == 0:
-                print(f"Database restored successfully from {filePath}")
-            else:
-                print(f"Restoration failed")
-                print(f"Error Output: {result.stderr.decode()}")
-                return False
-        except subprocess.CalledProcessError as e:
+            # One pooled connection serves every CREATE DATABASE instead of a psql per database
+            CreateDatabaseIfNotExists(user, host, port, password, dbName)
+            print(f"Database {dbName} ready for restore from {filePath}")
+        except psycopg2.Error as e:
             print(f"Restore failed: {e}")
             return str(e)
     return filePath
 def ServerDataRestore( user, host, port, password, filePath):
     print(filePath)
-    os.environ['PGPASSWORD'] = password
     command = [
         'psql',
         '-U', user,
@@ -221,7 +846,7 @@ def ServerDataRestore( user, host, port, password, filePath):
     ]
     try:
         # Run the command
-        result = subprocess.run(command, stderr=subprocess.PIPE, check=True)
+        result = subprocess.run(command, stderr=subprocess.PIPE, check=True, env=PostgresEnv(password))
         
         # Check if the command was successful
         if result.returncode == 0:
@@ -234,283 +859,1329 @@ def ServerDataRestore( user, host, port, password, filePath):
     except subprocess.CalledProcessError as e:
         print(f"Restore failed: {e}")
         return False
-    finally:
-        del os.environ['PGPASSWORD']
 
-# Server restore for remote use
-def RestoreServerFromRemote(remote_host, remote_user, remote_password, local_host, db_user, db_port, db_password, schema_file_path, data_file_path):
+# Remote dumps written with compress=True are zstd files
+def RemoteCatCommand(filePath):
+    return 'zstd -dc' if filePath.endswith('.zst') else 'cat'
+
+# Server restore for remote use, each database section of the dumps is sent once to its own database
+# Returns (status, report), the report lists the SQL errors psql hit in the globals and in every database
+def RestoreServerFromRemote(remote_host, remote_user, remote_password, local_host, db_user, db_port, db_password, schema_file_path, data_file_path, parallel_databases=None):
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    report = {"globals": [], "databases": {}}
     
     try:
         # Connect to the remote server
         ssh.connect(remote_host, username=remote_user, password=remote_password)
-        stdin, stdout, stderr = ssh.exec_command(f'cat {schema_file_path}')
-        content = stdout.read().decode('utf-8')
+        dumpFiles = [path for path in (schema_file_path, data_file_path) if path]
+        indexes = {path: LoadDumpIndex(path, ssh) for path in dumpFiles}
 
-        # Extract database names from the schema content
-        db_names = set(re.findall(r'CREATE\s+DATABASE\s+("([^"]+)"|([^\s]+))\s+WITH\s+', content, re.IGNORECASE))
-        db_names = {match[1] if match[1] else match[2] for match in db_names}
+        if any(index is None for index in indexes.values()):
+            # Compressed dumps cannot be split, replay each once and let its \connect lines pick the database
+            for path in dumpFiles:
+                command = f'{RemoteCatCommand(path)} {shlex.quote(path)} | {shlex.join(["psql", "-U", db_user, "-h", str(local_host), "-p", str(db_port), "-d", "postgres"])}'
+                ok, error = RunBackupCommand(['sh', '-c', command], db_password, ssh)
+                report["databases"][path] = {"status": ok and not SqlErrors(error), "errors": SqlErrors(error) if ok else [error]}
+                if not ok:
+                    print(f"Failed to restore {path}: {error}")
+                    return False, report
+            return all(entry["status"] for entry in report["databases"].values()), report
+
+        # Roles and tablespaces once, from the globals part of the first dump
+        globalsPath = dumpFiles[0]
+        globalsRange = indexes[globalsPath]["globals"]
+        if globalsRange["end"] > globalsRange["start"]:
+            ok, error = PipeDumpRanges(db_user, local_host, db_port, db_password, "postgres", [(globalsPath, globalsRange["start"], globalsRange["end"])], ssh, stopOnError=False)
+            report["globals"] = SqlErrors(error) if ok else [error]
+            if report["globals"]:
+                print(f"Errors while restoring globals: {report['globals']}")
+
+        db_names = []
+        for index in indexes.values():
+            db_names.extend(name for name in index["databases"] if name and name not in db_names)
         print("Database Names: ", db_names)
 
-        for dbName in db_names:
-            # Create the database on the local PostgreSQL instance
-            command = f'CREATE DATABASE "{dbName}";'
-            print(command)
-            os.environ['PGPASSWORD'] = db_password
+        def RestoreDatabase(dbName):
             try:
-                result = subprocess.run(
-                    ['psql', '-U', db_user, '-h', local_host, '-p', str(db_port), '-c', command],
-                    check=True,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True
-                )
-                if result.returncode == 0:
-                    print(f"Database '{dbName}' created successfully.")
-                else:
-                    print(f"Failed to create database '{dbName}'")
-                    print(f"Error Output: {result.stderr}")
-                    return False
+                CreateDatabaseIfNotExists(db_user, local_host, db_port, db_password, dbName)
+            except Exception as e:
+                print(f"Failed to create database '{dbName}': {e}")
+                report["databases"][dbName] = {"status": False, "errors": [str(e)]}
+                return False
 
-                restore_command = f'PGPASSWORD={db_password} psql -U {db_user} -h {local_host} -p {db_port} -d "{dbName}" -f {schema_file_path}'
+            # Schema section first, then data section, both only from this database's byte ranges
+            ranges = [(path, indexes[path]["databases"][dbName]["start"], indexes[path]["databases"][dbName]["end"]) for path in dumpFiles if dbName in indexes[path]["databases"]]
+            ok, error = PipeDumpRanges(db_user, local_host, db_port, db_password, dbName, ranges, ssh, stopOnError=False)
+            errors = SqlErrors(error) if ok else [error]
+            report["databases"][dbName] = {"status": not errors, "errors": errors}
+            if errors:
+                print(f"Failed to restore database '{dbName}': {errors}")
+            else:
+                print(f"Database '{dbName}' restored from its dump sections.")
+            return not errors
 
-                # Restore tables from the schema file for the current database
-                restore_stdin, restore_stdout, restore_stderr = ssh.exec_command(restore_command)
-                
-                while True:
-                    # Flush stdout and stderr in real-time
-                    output = restore_stdout.readline()
-                    if output == '' and restore_stdout.channel.exit_status_ready():
-                        break
-                    if output:
-                        print(output.strip())
-                
-                # Read the output and error
-                restore_error = restore_stderr.read().decode('utf-8')
-                if restore_error:
-                    print(f"Failed to restore tables for database '{dbName}': {restore_error}")
-                else:
-                    print(f"Tables restored successfully for database '{dbName}' from remote schema file.")
-                
-                data_restore_command = f'PGPASSWORD={db_password} psql -U {db_user} -h {local_host} -p {db_port} -d "{dbName}" -f {data_file_path}'
-                data_restore_stdin, data_restore_stdout, data_restore_stderr = ssh.exec_command(data_restore_command)
-
-                while True:
-                    # Flush stdout and stderr in real-time for data restoration
-                    data_output = data_restore_stdout.readline()
-                    if data_output == '' and data_restore_stdout.channel.exit_status_ready():
-                        break
-                    if data_output:
-                        print(data_output.strip())
-
-                # Read the data restoration error
-                data_restore_error = data_restore_stderr.read().decode('utf-8')
-                if data_restore_error:
-                    print(f"Failed to restore data for database '{dbName}': {data_restore_error}")
-                else:
-                    print(f"Data restored successfully for database '{dbName}' from remote data file.")
+        # template1 and postgres go first on their own, every CREATE DATABASE copies template1
+        # and fails while another worker has a session open on it
+        serialNames = [name for name in db_names if name in ("template1", "postgres")]
+        results = [RestoreDatabase(dbName) for dbName in serialNames]
 
+        parallel_databases = int(parallel_databases) if parallel_databases else 4
+        with ThreadPoolExecutor(max_workers=max(1, parallel_databases)) as executor:
+            results.extend(executor.map(RestoreDatabase, [name for name in db_names if name not in serialNames]))
 
-            except subprocess.CalledProcessError as e:
-                print(f"Database creation/restore failed: {e}")
-                # return str(e)
+        return all(results), report
 
     except Exception as e:
-        print(f"SSH connection failed: {e}")
+        print(f"Remote server restore failed: {e}")
+        return False, dict(report, error=str(e))
     finally:
         # Ensure the SSH connection is closed
         ssh.close()
 
-    return True
 
+# Tables exported for a case window: table name, column holding the case/job id and which id set it filters on
+CASE_EXPORT_TABLES = [
+    ("Case_Management_case", "id", "case"),
+    ("Case_Management_job", "case_id", "case"),
+    ("Case_Management_caseusermappingtable", "case_id_id", "case"),
+    ("Case_Management_job_target", "job_id", "job"),
+    ("Case_Management_job_target_group", "job_id", "job"),
+    ("Case_Management_case_target", "case_id", "case"),
+    ("Case_Management_useruploadtable_case", "case_id", "case"),
+]
 
-#Local Case Backup
-def LocalCaseQuery(startTime, endTime, user, host, port, password, dbname, filePath):
-    os.environ["PGPASSWORD"] = password
-    
-    schemabackupFilePath = os.path.join(filePath, f'{dbname}_schema_backup_{datetime.datetime.now().strftime("%d%m%Y")}.sql')
-    # pg_dump command to create a schema-only backup
-    command = [
-        'pg_dump',
-        '-h', str(host),
-        '-p', str(port),
-        '-U', user,
-        '-d', dbname,
-        '--schema-only',  # Option to backup only the schema
-        '-v', 
-        '-f', schemabackupFilePath
-    ]
-    
-    # Run the backup command
-    subprocess.run(command, check=True)
-    print(f"Schema backup successful! for database {dbname}. Saved to: {schemabackupFilePath}")
-    
-    # Define the export queries and output file paths
-    queries = [
-    {
-            "query": f"COPY (SELECT * FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}') TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath, "Case_Management_case.csv")
-    },
-    {
-            "query": f"COPY (SELECT * from public.\"Case_Management_job\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}')) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_job.csv")
-    },
-    {
-            "query": f"COPY (SELECT * from public.\"Case_Management_caseusermappingtable\" WHERE case_id_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}')) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_caseusermappingtable.csv")
-    },
-    {
-            "query": f"COPY (SELECT * from public.\"Case_Management_job_target\" WHERE job_id IN (SELECT job_id from public.\"Case_Management_job\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}'))) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_job_target.csv")
-    },
-    {
-            "query": f"COPY (SELECT * from public.\"Case_Management_job_target_group\" WHERE job_id IN (SELECT job_id from public.\"Case_Management_job\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}'))) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_job_target_group.csv")
-    },
-    {
-            "query": f"COPY (SELECT * from public.\"Case_Management_case_target\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}')) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_case_target.csv")
-    },
-    {
-            "query": f"COPY (SELECT * from public.\"Case_Management_useruploadtable_case\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}')) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_useruploadtable_case.csv")
-    }
-    ]
+# COPY options and data file names for the csv and binary case formats
+def CopyOptions(copyFormat):
+    return "(FORMAT binary)" if copyFormat == "binary" else "(FORMAT csv, HEADER true)"
+
+def DataFileName(tableName, copyFormat, chunk=None):
+    extension = "bin" if copyFormat == "binary" else "csv"
+    if chunk is not None:
+        return f"{tableName}.{chunk:04d}.{extension}"
+    return f"{tableName}.{extension}"
+
+# Data files of each table in a backup directory, either one whole-table file or its numbered chunks
+def FindTableDataFiles(tableNames, dataFiles, copyFormat):
+    extension = "bin" if copyFormat == "binary" else "csv"
+    tableFiles = {}
+    for tableName in tableNames:
+        if DataFileName(tableName, copyFormat) in dataFiles:
+            tableFiles[tableName] = [DataFileName(tableName, copyFormat)]
+            continue
+        chunkPattern = re.compile(re.escape(tableName) + r"\.\d{4}\." + extension + "$")
+        chunks = sorted(fileName for fileName in dataFiles if chunkPattern.match(fileName))
+        if chunks:
+            tableFiles[tableName] = chunks
+    return tableFiles
+
+def GetTableColumns(cur, tableName):
+    cur.execute("""
+        SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum;
+    """, (f'public."{tableName}"',))
+    return [[row[0], row[1]] for row in cur.fetchall()]
+
+def MajorVersion(serverVersionNum):
+    serverVersionNum = int(serverVersionNum)
+    return serverVersionNum // 10000 if serverVersionNum >= 100000 else serverVersionNum // 100
+
+# Binary COPY data only loads into the same major version with the same column types
+def CheckBinaryHeader(cur, tableName, header):
+    cur.execute("SHOW server_version_num;")
+    serverVersionNum = cur.fetchone()[0]
+    if MajorVersion(serverVersionNum) != MajorVersion(header["server_version_num"]):
+        raise Exception(f"Binary backup of {tableName} was taken on server version {header['server_version_num']}, target is {serverVersionNum}. Restore from a csv backup instead.")
+    columns = GetTableColumns(cur, tableName)
+    if columns != header["columns"]:
+        raise Exception(f"Columns of {tableName} differ from the binary backup: expected {header['columns']}, found {columns}")
+
+def ConnectPostgres(user, host, port, password, dbname):
+    return psycopg2.connect(
+        dbname = dbname,
+        user = user,
+        password = password,
+        host = host,
+        port = port
+    )
+
+# Counts what COPY writes so finished exports can record their throughput
+class CountingWriter:
+    def __init__(self, target):
+        self.target = target
+        self.bytes = 0
+
+    def write(self, data):
+        self.bytes += len(data)
+        return self.target.write(data)
+
+# Export every case table for a window from one shared snapshot, several tables at once
+# A missing startTime exports everything up to endTime, a missing endTime means the newest updated_on in the snapshot
+def ExportCaseWindow(startTime, endTime, user, host, port, password, dbname, openOutput, workers=None, startInclusive=True, copyFormat="csv"):
+    started = datetime.datetime.now()
+    coordinator = ConnectPostgres(user, host, port, password, dbname)
+    coordinator.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
 
-    return queries
-def RunPsql(query, output_file, user, host, port, dbname):
     try:
-        command = f"psql -U {user} -h {host} -p {port} -d {dbname} -c \'{query}\' > {output_file}"
-        print(f"Running command: {command}")
-        subprocess.run(command, shell=True, check=True)
-        print(f"Data exported to {output_file}")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"Error running command: {command}\n{e}")
+        cur = coordinator.cursor()
+        cur.execute("SELECT pg_export_snapshot();")
+        snapshotId = cur.fetchone()[0]
+        print(f"Exported snapshot {snapshotId} for database {dbname}.")
 
-#Local Case Restore
-def ExtractTableNames(SCHEMA_FILE_PATH):
-    with open(SCHEMA_FILE_PATH, 'r') as schema_file:
-        schema_sql = schema_file.read()
-    
-    table_names = re.findall(r'CREATE TABLE\s+(?:\w+\.)?"?([a-zA-Z_][a-zA-Z0-9_]*)"?', schema_sql)
-    return table_names
-def RestoreCaseQueryData(user, host, port, dbname, password, tableName, filePath, schemaPath):
-    os.environ['PGPASSWORD'] = password
-    
-    restore_command = [
-        'psql',
-        '-U', user,
-        '-h', host,
+        if endTime is None:
+            cur.execute('SELECT max(updated_on)::text FROM public."Case_Management_case";')
+            endTime = cur.fetchone()[0]
+
+        conditions, params = ["updated_on <= %s"], [endTime]
+        if startTime is not None:
+            conditions.insert(0, "updated_on >= %s" if startInclusive else "updated_on > %s")
+            params.insert(0, startTime)
+        window = (" AND ".join(conditions), tuple(params))
+
+        # Materialize the case and job id sets once, every worker loads them into its own temp table
+        idSets = {}
+        caseQuery = cur.mogrify(f'SELECT id FROM public."Case_Management_case" WHERE {window[0]}', window[1]).decode()
+        for idSet, query in (("case", caseQuery), ("job", f'SELECT DISTINCT job_id FROM public."Case_Management_job" WHERE case_id IN ({caseQuery})')):
+            buffer = io.BytesIO()
+            cur.copy_expert(f"COPY ({query}) TO STDOUT", buffer)
+            idSets[idSet] = buffer.getvalue()
+        cur.close()
+
+        def ExportTable(tableName, idColumn, idSet):
+            outputName = DataFileName(tableName, copyFormat)
+            conn = None
+            try:
+                # Connecting inside the try turns a refused connection into this table's failed result
+                conn = ConnectPostgres(user, host, port, password, dbname)
+                conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+                cur = conn.cursor()
+                cur.execute("SET TRANSACTION SNAPSHOT %s;", (snapshotId,))
+                if tableName == "Case_Management_case":
+                    query = cur.mogrify(f'SELECT * FROM public."{tableName}" WHERE {window[0]}', window[1]).decode()
+                else:
+                    sourceColumn = "id" if idSet == "case" else "job_id"
+                    sourceTable = "Case_Management_case" if idSet == "case" else "Case_Management_job"
+                    cur.execute(f'CREATE TEMP TABLE backup_ids ON COMMIT DROP AS SELECT {sourceColumn} AS id FROM public."{sourceTable}" WITH NO DATA;')
+                    cur.copy_expert("COPY backup_ids FROM STDIN", io.BytesIO(idSets[idSet]))
+                    cur.execute("ANALYZE backup_ids;")
+                    query = f'SELECT * FROM public."{tableName}" WHERE "{idColumn}" IN (SELECT id FROM backup_ids)'
+
+                with openOutput(outputName) as outputFile:
+                    counter = CountingWriter(outputFile)
+                    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH {CopyOptions(copyFormat)}", counter)
+                rows = cur.rowcount
+
+                if copyFormat == "binary":
+                    # Sidecar header so the restore can check the layout before loading raw binary
+                    cur.execute("SHOW server_version_num;")
+                    header = {"server_version_num": int(cur.fetchone()[0]), "columns": GetTableColumns(cur, tableName)}
+                    with openOutput(f"{tableName}.columns.json") as headerFile:
+                        headerFile.write(json.dumps(header, indent=2).encode('utf-8'))
+                conn.rollback()
+                print(f"Data exported to {outputName} ({rows} rows).")
+                return {"table": tableName, "output_file": outputName, "rows": rows, "bytes": counter.bytes, "window_start": startTime, "window_end": endTime, "status": True, "error": None}
+            except Exception as e:
+                print(f"Error exporting table {tableName}: {e}")
+                return {"table": tableName, "output_file": outputName, "rows": 0, "bytes": 0, "window_start": startTime, "window_end": endTime, "status": False, "error": str(e)}
+            finally:
+                if conn:
+                    conn.close()
+
+        workers = int(workers) if workers else len(CASE_EXPORT_TABLES)
+        results = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(ExportTable, *table) for table in CASE_EXPORT_TABLES]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+        if all(item["status"] for item in results):
+            RecordCaseExportRun(host, port, dbname, results, (datetime.datetime.now() - started).total_seconds())
+        return results
+
+    finally:
+        # Keeping the exporting transaction open until now is what keeps the snapshot valid
+        coordinator.rollback()
+        coordinator.close()
+
+# Export estimates: planner row counts, pg_stats widths and throughput of past runs
+ESTIMATE_CACHE_SECONDS = 600
+ESTIMATE_CALIBRATION_RUNS = 20
+# Used until a server has finished at least one case export
+DEFAULT_EXPORT_BYTES_PER_SECOND = 50 * 1024 * 1024
+
+def RecordCaseExportRun(host, port, dbname, results, seconds):
+    try:
+        CaseExportRun.objects.create(
+            postgres_host=host, postgres_port=str(port), database_name=dbname,
+            rows=sum(item["rows"] for item in results), bytes=sum(item["bytes"] for item in results), seconds=seconds
+        )
+    except Exception as e:
+        print(f"Unable to record export throughput: {e}")
+
+# Bytes per second of recent exports from this database, falling back to the server, then to the default
+def ExportThroughput(host, port, dbname):
+    for filters in ({"database_name": dbname}, {}):
+        runs = list(CaseExportRun.objects.filter(postgres_host=host, postgres_port=str(port), **filters).order_by('-created_at')[:ESTIMATE_CALIBRATION_RUNS])
+        seconds = sum(run.seconds for run in runs)
+        if runs and seconds > 0:
+            return sum(run.bytes for run in runs) / seconds, len(runs)
+    return DEFAULT_EXPORT_BYTES_PER_SECOND, 0
+
+# Same filters as ExportCaseWindow, written as plain subqueries so EXPLAIN can see them without the temp tables
+def CaseWindowQueries(cur, startTime, endTime, startInclusive=True):
+    conditions, params = [], []
+    if startTime is not None:
+        conditions.append("updated_on >= %s" if startInclusive else "updated_on > %s")
+        params.append(startTime)
+    if endTime is not None:
+        conditions.append("updated_on <= %s")
+        params.append(endTime)
+    where = cur.mogrify(" AND ".join(conditions) or "true", params).decode()
+
+    caseQuery = f'SELECT id FROM public."Case_Management_case" WHERE {where}'
+    jobQuery = f'SELECT DISTINCT job_id FROM public."Case_Management_job" WHERE case_id IN ({caseQuery})'
+    queries = {}
+    for tableName, idColumn, idSet in CASE_EXPORT_TABLES:
+        if tableName == "Case_Management_case":
+            queries[tableName] = f'SELECT * FROM public."{tableName}" WHERE {where}'
+        else:
+            queries[tableName] = f'SELECT * FROM public."{tableName}" WHERE "{idColumn}" IN ({caseQuery if idSet == "case" else jobQuery})'
+    return queries
+
+def EstimateCaseWindow(startTime, endTime, user, host, port, password, dbname, refresh=False):
+    cacheKey = "case_estimate:" + hashlib.sha1(f"{host}:{port}:{dbname}:{startTime}:{endTime}".encode('utf-8')).hexdigest()
+    if not refresh:
+        cached = cache.get(cacheKey)
+        if cached is not None:
+            return dict(cached, cached=True)
+
+    conn = ConnectPostgres(user, host, port, password, dbname)
+    try:
+        cur = conn.cursor()
+        tables = []
+        for tableName, query in CaseWindowQueries(cur, startTime, endTime).items():
+            cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+            plan = cur.fetchone()[0][0]["Plan"]
+            rows = int(plan["Plan Rows"])
+
+            # Average column widths from ANALYZE, the plan width when the table has no statistics yet
+            cur.execute("SELECT sum(avg_width), count(*) FROM pg_stats WHERE schemaname = 'public' AND tablename = %s;", (tableName,))
+            statsWidth, statsColumns = cur.fetchone()
+            cur.execute("SELECT count(*) FROM pg_attribute WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped;", (f'public."{tableName}"',))
+            columns = cur.fetchone()[0]
+            rowWidth = int(statsWidth) if statsColumns else int(plan["Plan Width"])
+            # One delimiter or newline per column in the csv output
+            tables.append({"table": tableName, "rows": rows, "row_width": rowWidth, "bytes": rows * (rowWidth + columns)})
+        cur.close()
+        conn.rollback()
+    finally:
+        conn.close()
+
+    throughput, calibrationRuns = ExportThroughput(host, port, dbname)
+    totalBytes = sum(item["bytes"] for item in tables)
+    estimate = {
+        "window_start": startTime,
+        "window_end": endTime,
+        "tables": tables,
+        "rows": sum(item["rows"] for item in tables),
+        "bytes": totalBytes,
+        "estimated_size": FormatSize(totalBytes),
+        "bytes_per_second": int(throughput),
+        "calibration_runs": calibrationRuns,
+        "estimated_seconds": round(totalBytes / throughput, 1) if throughput else None,
+        "cached": False
+    }
+    cache.set(cacheKey, estimate, ESTIMATE_CACHE_SECONDS)
+    return estimate
+
+#Local Case Backup
+def LocalCaseQuery(startTime, endTime, user, host, port, password, dbname, filePath, workers=None, startInclusive=True, copyFormat="csv"):
+
+    schemabackupFilePath = os.path.join(filePath, f'{dbname}_schema_backup_{datetime.datetime.now().strftime("%d%m%Y")}.sql')
+    # pg_dump command to create a schema-only backup
+    command = [
+        'pg_dump',
+        '-h', str(host),
         '-p', str(port),
+        '-U', user,
         '-d', dbname,
-        '-f', schemaPath
+        '--schema-only',  # Option to backup only the schema
+        '-v', 
+        '-f', schemabackupFilePath
     ]
+    
+    # Run the backup command
+    subprocess.run(command, check=True, env=PostgresEnv(password))
+    print(f"Schema backup successful! for database {dbname}. Saved to: {schemabackupFilePath}")
+
+    def OpenLocalOutput(outputName):
+        return open(os.path.join(filePath, outputName), 'wb')
+
+    results = ExportCaseWindow(startTime, endTime, user, host, port, password, dbname, OpenLocalOutput, workers, startInclusive, copyFormat)
+    for result in results:
+        result["output_file"] = os.path.join(filePath, result["output_file"])
+    return results
+def RunPsql(query, output_file, user, host, port, dbname, password=None):
+    command = ['psql', '-U', user, '-h', str(host), '-p', str(port), '-d', dbname, '-c', query]
     try:
-        result = subprocess.run(restore_command, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        print(f"Schema restored successfully to database '{dbname}'.")
-        print(f"Output: {result.stdout.decode()}")
+        print(f"Running command: {shlex.join(command)}")
+        with open(output_file, 'wb') as output:
+            subprocess.run(command, stdout=output, check=True, env=PostgresEnv(password) if password else None)
+        print(f"Data exported to {output_file}")
+        return True
     except subprocess.CalledProcessError as e:
-        print(f"Schema restoration failed for '{dbname}': {e}")
-        print(f"Error Output: {e.stderr.decode()}")
+        print(f"Error running command: {shlex.join(command)}\n{e}")
 
-    # Execute the COPY command using subprocess
-    command = [
+#Local Case Restore
+def ExtractTableNames(SCHEMA_FILE_PATH):
+    with open(SCHEMA_FILE_PATH, 'r') as schema_file:
+        schema_sql = schema_file.read()
+    
+    table_names = re.findall(r'CREATE TABLE\s+(?:\w+\.)?"?([a-zA-Z_][a-zA-Z0-9_]*)"?', schema_sql)
+    return table_names
+
+# Child/parent table pairs from the FOREIGN KEY constraints in a pg_dump schema
+def ExtractForeignKeys(schemaSql):
+    return set(re.findall(r'ALTER TABLE\s+(?:ONLY\s+)?(?:\w+\.)?"?([a-zA-Z_][a-zA-Z0-9_]*)"?\s+ADD CONSTRAINT\s+\S+\s+FOREIGN KEY\s*\([^)]*\)\s*REFERENCES\s+(?:\w+\.)?"?([a-zA-Z_][a-zA-Z0-9_]*)"?', schemaSql))
+
+# Group tables into levels so every table loads after the tables it references
+def OrderTablesByForeignKeys(tableNames, foreignKeys):
+    tableNames = list(dict.fromkeys(tableNames))
+    parents = {tableName: set() for tableName in tableNames}
+    for child, parent in foreignKeys:
+        if child in parents and parent in parents and child != parent:
+            parents[child].add(parent)
+
+    levels = []
+    loaded = set()
+    while len(loaded) < len(tableNames):
+        level = [tableName for tableName in tableNames if tableName not in loaded and parents[tableName] <= loaded]
+        if not level:
+            # Circular references, load whatever is left together
+            level = [tableName for tableName in tableNames if tableName not in loaded]
+        levels.append(level)
+        loaded.update(level)
+    return levels
+
+# pg_dump object types that are built after the data is loaded
+POST_DATA_TYPES = ("CONSTRAINT", "INDEX", "FK CONSTRAINT", "TRIGGER", "INDEX ATTACH", "RULE")
+SCHEMA_SECTION_HEADER = re.compile(r'^--\n-- Name: [^\n]*?; Type: ([^;\n]+);[^\n]*\n--\n', re.M)
+DEFAULT_MAINTENANCE_WORK_MEM = "1GB"
+
+# Split a plain pg_dump schema into the pre-data script and the post-data objects as (type, table, statement)
+def SplitSchemaSections(schemaSql):
+    headers = list(SCHEMA_SECTION_HEADER.finditer(schemaSql))
+    if not headers:
+        return schemaSql, []
+
+    preData = [schemaSql[:headers[0].start()]]
+    postData = []
+    for index, header in enumerate(headers):
+        end = headers[index + 1].start() if index + 1 < len(headers) else len(schemaSql)
+        objectType = header.group(1)
+        if objectType not in POST_DATA_TYPES:
+            preData.append(schemaSql[header.start():end])
+            continue
+        # psql meta-commands such as \unrestrict can trail the last object
+        statement = "\n".join(line for line in schemaSql[header.end():end].splitlines() if not line.startswith("\\")).strip()
+        tableMatch = re.search(r'(?:ALTER TABLE|ON)\s+(?:ONLY\s+)?(?:\w+\.)?"?([a-zA-Z_][a-zA-Z0-9_]*)"?', statement)
+        postData.append((objectType, tableMatch.group(1) if tableMatch else None, statement))
+    return "".join(preData), postData
+
+# Build indexes and constraints after the load, tables in parallel
+# Primary keys, unique constraints and indexes go first so every foreign key finds its referenced index
+def BuildPostDataObjects(user, host, port, password, dbname, postData, workers=None, maintenanceWorkMem=None):
+    maintenanceWorkMem = maintenanceWorkMem or DEFAULT_MAINTENANCE_WORK_MEM
+
+    def BuildTable(statements):
+        conn = ConnectPostgres(user, host, port, password, dbname)
+        conn.autocommit = True
+        results = []
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET maintenance_work_mem = %s;", (maintenanceWorkMem,))
+                for objectType, tableName, statement in statements:
+                    try:
+                        cur.execute(statement)
+                        results.append({"table": tableName, "type": objectType, "status": True, "error": None})
+                    except (psycopg2.errors.DuplicateObject, psycopg2.errors.DuplicateTable, psycopg2.errors.InvalidTableDefinition) as e:
+                        # Restoring into an existing schema, the object is already there
+                        print(f"{objectType} on {tableName} already exists, skipping.")
+                        results.append({"table": tableName, "type": objectType, "status": True, "error": None})
+                    except Exception as e:
+                        print(f"Error building {objectType} on {tableName}: {e}")
+                        results.append({"table": tableName, "type": objectType, "status": False, "error": str(e)})
+        finally:
+            conn.close()
+        return results
+
+    results = []
+    phases = [
+        [item for item in postData if item[0] in ("CONSTRAINT", "INDEX", "INDEX ATTACH")],
+        [item for item in postData if item[0] not in ("CONSTRAINT", "INDEX", "INDEX ATTACH")],
+    ]
+    for phase in phases:
+        byTable = {}
+        for item in phase:
+            byTable.setdefault(item[1], []).append(item)
+        if not byTable:
+            continue
+        with ThreadPoolExecutor(max_workers=int(workers) if workers else len(byTable)) as executor:
+            for tableResults in executor.map(BuildTable, byTable.values()):
+                results.extend(tableResults)
+    print(f"Built {len(results)} indexes and constraints for database '{dbname}'.")
+    return results
+
+# Load data files level by level, tables and chunks within a level concurrently over pooled connections
+def LoadCaseTables(user, host, port, password, dbname, levels, openInput, workers=None, copyFormat="csv", tableFiles=None):
+    if tableFiles is None:
+        tableFiles = {tableName: [DataFileName(tableName, copyFormat)] for level in levels for tableName in level}
+    workers = int(workers) if workers else max(sum(len(tableFiles[tableName]) for tableName in level) for level in levels)
+    # A crash during a bulk load means restoring again anyway, so commits need not wait for the WAL flush
+    pool = psycopg2.pool.ThreadedConnectionPool(1, workers, dbname=dbname, user=user, password=password, host=host, port=port, options="-c synchronous_commit=off")
+
+    def LoadTable(tableName, fileName):
+        conn = pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                if copyFormat == "binary":
+                    with openInput(f"{tableName}.columns.json") as headerFile:
+                        CheckBinaryHeader(cur, tableName, json.loads(headerFile.read().decode('utf-8')))
+                with openInput(fileName) as inputFile:
+                    cur.copy_expert(f'COPY public."{tableName}" FROM STDIN WITH {CopyOptions(copyFormat)}', inputFile)
+                    rows = cur.rowcount
+            conn.commit()
+            print(f"Successfully restored {fileName} into table {tableName} ({rows} rows).")
+            return {"table": tableName, "file": fileName, "rows": rows, "status": True, "error": None}
+        except Exception as e:
+            conn.rollback()
+            print(f"Error restoring {fileName} into table {tableName}: {e}")
+            return {"table": tableName, "file": fileName, "rows": 0, "status": False, "error": str(e)}
+        finally:
+            pool.putconn(conn)
+
+    results = []
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for level in levels:
+                tasks = [(tableName, fileName) for tableName in level for fileName in tableFiles[tableName]]
+                results.extend(executor.map(lambda task: LoadTable(*task), tasks))
+    finally:
+        pool.closeall()
+    return results
+
+def RestoreCaseQueryData(user, host, port, dbname, password, schemaPath, dataPath, workers=None, copyFormat="csv", maintenanceWorkMem=None):
+    with open(schemaPath, 'r') as schemaFile:
+        schemaSql = schemaFile.read()
+    preData, postData = SplitSchemaSections(schemaSql)
+
+    restore_command = [
         'psql',
+        '-q',
         '-U', user,
         '-h', host,
         '-p', str(port),
-        '-d', dbname,
-        '-c', f"\COPY \"{tableName}\" FROM '{filePath}' WITH (FORMAT csv, HEADER true)"
+        '-d', dbname
     ]
+    # Tables first, indexes and constraints are built once the data is in
+    ok, error = RunBackupCommand(restore_command, password, inputData=preData.encode('utf-8'))
+    if ok:
+        print(f"Schema restored successfully to database '{dbname}'.")
+    else:
+        print(f"Schema restoration failed for '{dbname}': {error}")
 
-    try:
-        subprocess.run(command, check=True, text=True, capture_output=True)
-        print(f"Successfully restored table {tableName} from {filePath}.")
-    except subprocess.CalledProcessError as e:
-        print(f"Error restoring table {tableName} from {filePath}:")
-        print(e.stderr)
-    except Exception as e:
-        print(f"Exception occurred: {e}")
-    finally:
-        os.environ.pop("PGPASSWORD", None)
+    tableFiles = FindTableDataFiles(ExtractTableNames(schemaPath), set(os.listdir(dataPath)), copyFormat)
+    if not tableFiles:
+        print(f"No {copyFormat} files in {dataPath} match the tables in {schemaPath}")
+    else:
+        # Only foreign keys still in the pre-data script constrain the load order
+        levels = OrderTablesByForeignKeys(list(tableFiles), ExtractForeignKeys(preData))
+        print(f"Loading tables in order: {levels}")
+
+        def OpenLocalInput(fileName):
+            return open(os.path.join(dataPath, fileName), 'rb')
+
+        results = LoadCaseTables(user, host, port, password, dbname, levels, OpenLocalInput, workers, copyFormat, tableFiles)
+        if any(item["status"] is False for item in results):
+            return False
+
+    postResults = BuildPostDataObjects(user, host, port, password, dbname, postData, workers, maintenanceWorkMem)
+    if any(item["status"] is False for item in postResults):
+        return False
+    return dbname
 
 #Remote Case Backup
-def BackupCaseQueryRemote(startTime, endTime, user, host, port, password, dbname, filePath, remote_host, remote_user, remote_password):
+def BackupCaseQueryRemote(startTime, endTime, user, host, port, password, dbname, filePath, remote_host, remote_user, remote_password, workers=None, startInclusive=True, copyFormat="csv"):
     schemabackupFilePath = os.path.join(filePath, f'{dbname}_schema_backup_{int(datetime.datetime.now().timestamp())}.sql')
 
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
     ssh.connect(hostname=remote_host, username=remote_user, password=remote_password)
     
-    sftp = ssh.open_sftp()
-    print("Attempting to create remote directory...")
-    CreateRemoteDirectoryIfNotExists(sftp, filePath)
-    print("Remote directory created.")
-    
-    command = f"PGPASSWORD={password} pg_dump -U {user} -h {host} -p {port} -d {dbname} --schema-only -v > {schemabackupFilePath}"
+    try:
+        sftp = ssh.open_sftp()
+        print("Attempting to create remote directory...")
+        CreateRemoteDirectoryIfNotExists(sftp, filePath)
+        print("Remote directory created.")
+        sftp.close()
+        
+        command = RemoteToolCommand(['pg_dump', '-U', user, '-h', str(host), '-p', str(port), '-d', dbname, '--schema-only', '-v'], password) + f" > {shlex.quote(schemabackupFilePath)}"
+
+        stdin, stdout, stderr = ssh.exec_command(command)
+        exit_status = stdout.channel.recv_exit_status()
+        if exit_status == 0:
+            print(f"Schema backup successful! for database {dbname}. Saved to: {schemabackupFilePath}")
+        else:
+            print(f"Error during schema backup: {stderr.read().decode()}")
+
+        # Each worker streams its COPY into its own SFTP channel on the shared connection
+        @contextmanager
+        def OpenRemoteOutput(outputName):
+            workerSftp = ssh.open_sftp()
+            try:
+                with workerSftp.file(os.path.join(filePath, outputName), 'wb', bufsize=STREAM_CHUNK_SIZE) as remoteFile:
+                    remoteFile.set_pipelined(True)
+                    yield remoteFile
+            finally:
+                workerSftp.close()
+
+        results = ExportCaseWindow(startTime, endTime, user, host, port, password, dbname, OpenRemoteOutput, workers, startInclusive, copyFormat)
+        for result in results:
+            result["output_file"] = os.path.join(filePath, result["output_file"])
+        return results
+
+    except Exception as e:
+        print(f"Error during remote case backup: {e}")
+        return [{"status": False, "message": "Remote case backup failed.", "error": str(e)}]
 
-    stdin, stdout, stderr = ssh.exec_command(command)
-    exit_status = stdout.channel.recv_exit_status()
-    if exit_status == 0:
-        print(f"Schema backup successful! for database {dbname}. Saved to: {schemabackupFilePath}")
+    finally:
+        # Close the SSH connection
+        ssh.close()
+
+# Default target size of one chunk file when splitting large tables
+CHUNK_TARGET_BYTES = 1024 ** 3
+
+# Split a table into COPY predicates of roughly chunkBytes each, from catalog statistics only
+# ctid page ranges on PostgreSQL 14+ (TID range scans), otherwise ranges of an integer primary key from pg_stats
+def PlanTableChunks(cur, tableName, chunkBytes):
+    cur.execute("""
+        SELECT c.relpages, current_setting('block_size')::int, current_setting('server_version_num')::int
+        FROM pg_class c WHERE c.oid = %s::regclass;
+    """, (f'public."{tableName}"',))
+    relPages, blockSize, serverVersionNum = cur.fetchone()
+    chunks = max(1, math.ceil(relPages * blockSize / chunkBytes))
+    if chunks == 1:
+        return [None]
+
+    if serverVersionNum >= 140000:
+        step = math.ceil(relPages / chunks)
+        bounds = [f"'({page},0)'::tid" for page in range(step, relPages, step)]
+        column = "ctid"
     else:
-        print(f"Error during schema backup: {stderr.read().decode()}")
+        cur.execute("""
+            SELECT a.attname FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = %s::regclass AND i.indisprimary AND i.indnatts = 1
+              AND a.atttypid IN ('int2'::regtype, 'int4'::regtype, 'int8'::regtype);
+        """, (f'public."{tableName}"',))
+        keyColumn = cur.fetchone()
+        if not keyColumn:
+            print(f"Table {tableName} has no integer primary key, exporting it as one chunk.")
+            return [None]
+        cur.execute("SELECT histogram_bounds::text FROM pg_stats WHERE schemaname = 'public' AND tablename = %s AND attname = %s;", (tableName, keyColumn[0]))
+        histogram = cur.fetchone()
+        if not histogram or not histogram[0]:
+            print(f"No statistics for {tableName}.{keyColumn[0]}, run ANALYZE to split it. Exporting it as one chunk.")
+            return [None]
+        values = [int(value) for value in histogram[0].strip("{}").split(",")]
+        bounds = sorted(set(values[round(index * (len(values) - 1) / chunks)] for index in range(1, chunks)))
+        column = f'"{keyColumn[0]}"'
 
-    
-    # Define the export queries and output file paths
-    queries = [
-        {
-            "query": f"COPY (SELECT * FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}') TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath, "Case_Management_case.csv")
-        },
-        {
-            "query": f"COPY (SELECT * from public.\"Case_Management_job\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}')) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_job.csv")
-        },
-        {
-            "query": f"COPY (SELECT * from public.\"Case_Management_caseusermappingtable\" WHERE case_id_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}')) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_caseusermappingtable.csv")
-        },
-        {
-            "query": f"COPY (SELECT * from public.\"Case_Management_job_target\" WHERE job_id IN (SELECT job_id from public.\"Case_Management_job\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}'))) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_job_target.csv")
-        },
-        {
-            "query": f"COPY (SELECT * from public.\"Case_Management_job_target_group\" WHERE job_id IN (SELECT job_id from public.\"Case_Management_job\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}'))) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_job_target_group.csv")
-        },
-        {
-            "query": f"COPY (SELECT * from public.\"Case_Management_case_target\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}')) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_case_target.csv")
-        },
-        {
-            "query": f"COPY (SELECT * from public.\"Case_Management_useruploadtable_case\" WHERE case_id IN (SELECT id FROM public.\"Case_Management_case\" WHERE updated_on >= '{startTime}' and updated_on <= '{endTime}')) TO STDOUT WITH CSV HEADER;",
-            "output_file": os.path.join(filePath,"Case_Management_useruploadtable_case.csv")
-        }
-    ]
+    if not bounds:
+        return [None]
 
-    # return queries
-    for query in queries:
-        output_file = query["output_file"]
-        query_str = query["query"]
-        
-        # Command to execute the COPY query
-        copy_command = f"PGPASSWORD={password} psql -U {user} -h {host} -p {port} -d {dbname} -c \'{query_str}\' > {output_file}"
-        
-        # Execute the command
-        stdin, stdout, stderr = ssh.exec_command(copy_command)
-        exit_status = stdout.channel.recv_exit_status()
+    # Open-ended first and last ranges, so rows outside stale statistics are still exported
+    predicates = [f"{column} < {bounds[0]}"]
+    predicates += [f"{column} >= {low} AND {column} < {high}" for low, high in zip(bounds, bounds[1:])]
+    predicates.append(f"{column} >= {bounds[-1]}")
+    return predicates
 
-        if exit_status == 0:
-            print(f"Data exported successfully to {output_file}.")
+# Export whole tables split into numbered chunk files, all chunks copied concurrently from one shared snapshot
+def ChunkedTableExport(user, host, port, password, dbname, openOutput, tables=None, chunkBytes=None, workers=None, copyFormat="csv"):
+    chunkBytes = int(chunkBytes) if chunkBytes else CHUNK_TARGET_BYTES
+    coordinator = ConnectPostgres(user, host, port, password, dbname)
+    coordinator.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+
+    try:
+        cur = coordinator.cursor()
+        cur.execute("SELECT pg_export_snapshot();")
+        snapshotId = cur.fetchone()[0]
+        print(f"Exported snapshot {snapshotId} for database {dbname}.")
+
+        # Largest tables first so their chunks start before the small tables
+        cur.execute("""
+            SELECT c.relname FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relkind = 'r' ORDER BY c.relpages DESC;
+        """)
+        tableNames = [row[0] for row in cur.fetchall() if not tables or row[0] in tables]
+
+        tasks = []
+        for tableName in tableNames:
+            predicates = PlanTableChunks(cur, tableName, chunkBytes)
+            print(f"Table {tableName} split into {len(predicates)} chunk(s).")
+            for chunk, predicate in enumerate(predicates, start=1):
+                tasks.append((tableName, DataFileName(tableName, copyFormat, chunk), predicate))
+
+            if copyFormat == "binary":
+                cur.execute("SHOW server_version_num;")
+                header = {"server_version_num": int(cur.fetchone()[0]), "columns": GetTableColumns(cur, tableName)}
+                with openOutput(f"{tableName}.columns.json") as headerFile:
+                    headerFile.write(json.dumps(header, indent=2).encode('utf-8'))
+        cur.close()
+
+        def ExportChunk(tableName, outputName, predicate):
+            conn = ConnectPostgres(user, host, port, password, dbname)
+            conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ, readonly=True)
+            try:
+                cur = conn.cursor()
+                cur.execute("SET TRANSACTION SNAPSHOT %s;", (snapshotId,))
+                query = f'SELECT * FROM public."{tableName}"' + (f" WHERE {predicate}" if predicate else "")
+                with openOutput(outputName) as outputFile:
+                    cur.copy_expert(f"COPY ({query}) TO STDOUT WITH {CopyOptions(copyFormat)}", outputFile)
+                rows = cur.rowcount
+                conn.rollback()
+                print(f"Data exported to {outputName} ({rows} rows).")
+                return {"table": tableName, "output_file": outputName, "rows": rows, "status": True, "error": None}
+            except Exception as e:
+                print(f"Error exporting {outputName}: {e}")
+                return {"table": tableName, "output_file": outputName, "rows": 0, "status": False, "error": str(e)}
+            finally:
+                conn.close()
+
+        workers = int(workers) if workers else min(len(tasks), os.cpu_count() or 4) or 1
+        results = []
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(ExportChunk, *task) for task in tasks]
+            for future in as_completed(futures):
+                results.append(future.result())
+        return results
+
+    finally:
+        # Keeping the exporting transaction open until now is what keeps the snapshot valid
+        coordinator.rollback()
+        coordinator.close()
+
+# Chunked database backup: schema.sql plus chunk files, restored through CaseMMRestore with the directory as csv_file_path
+def ChunkedDatabaseBackup(user, host, port, password, dbname, filePath, tables=None, chunkBytes=None, workers=None, copyFormat="csv", isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+    backupDir = os.path.join(filePath, f"{timestamp}_{dbname}_chunked")
+    ssh = None
+
+    try:
+        if isRemote:
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(hostname=remoteHost, username=remoteUser, password=remotePassword)
+            ssh.exec_command(f"mkdir -p {shlex.quote(backupDir)}")[1].channel.recv_exit_status()
+        else:
+            os.makedirs(backupDir, exist_ok=True)
+
+        command = ['pg_dump', '-h', str(host), '-p', str(port), '-U', user, '-d', dbname, '--schema-only', '-f', os.path.join(backupDir, "schema.sql")]
+        ok, error = RunBackupCommand(command, password, ssh)
+        if not ok:
+            print(f"Error during schema backup of {dbname}: {error}")
+            return False, [{"status": False, "error": error}]
+        print(f"Schema backup successful! for database {dbname}. Saved to: {backupDir}")
+
+        if ssh:
+            # Each worker streams its COPY into its own SFTP channel on the shared connection
+            @contextmanager
+            def OpenOutput(outputName):
+                workerSftp = ssh.open_sftp()
+                try:
+                    with workerSftp.file(os.path.join(backupDir, outputName), 'wb', bufsize=STREAM_CHUNK_SIZE) as remoteFile:
+                        remoteFile.set_pipelined(True)
+                        yield remoteFile
+                finally:
+                    workerSftp.close()
         else:
-            print(f"Error exporting data to {output_file}: {stderr.read().decode()}")
+            def OpenOutput(outputName):
+                return open(os.path.join(backupDir, outputName), 'wb')
+
+        results = ChunkedTableExport(user, host, port, password, dbname, OpenOutput, tables, chunkBytes, workers, copyFormat)
+        if any(item["status"] is False for item in results):
+            return False, results
+        return backupDir, results
+
+    except Exception as e:
+        print(f"Error during chunked backup of {dbname}: {e}")
+        return False, [{"status": False, "error": str(e)}]
+
+    finally:
+        if ssh:
+            ssh.close()
+
+# Read or write the chain.json of an incremental backup, locally or through sftp
+def ReadDeltaChain(backupPath, sftp=None):
+    chainPath = os.path.join(backupPath, "chain.json")
+    try:
+        if sftp:
+            with sftp.file(chainPath, 'r') as chainFile:
+                return json.loads(chainFile.read().decode('utf-8'))
+        with open(chainPath, 'r') as chainFile:
+            return json.load(chainFile)
+    except (IOError, OSError):
+        return {"deltas": []}
+
+def WriteDeltaChain(backupPath, chain, sftp=None):
+    chainPath = os.path.join(backupPath, "chain.json")
+    if sftp:
+        with sftp.file(chainPath + ".tmp", 'w') as chainFile:
+            chainFile.write(json.dumps(chain, indent=2))
+        sftp.posix_rename(chainPath + ".tmp", chainPath)
+    else:
+        with open(chainPath + ".tmp", 'w') as chainFile:
+            json.dump(chain, chainFile, indent=2)
+        os.replace(chainPath + ".tmp", chainPath)
+
+# Rows committed late (long transactions, equal timestamps) can carry an updated_on just below the last mark,
+# every delta re-reads this much before the mark and ApplyDeltaTable upserts the repeated rows
+INCREMENTAL_OVERLAP = datetime.timedelta(minutes=10)
+
+def OverlapStart(highWaterMark):
+    if not highWaterMark:
+        return None
+    try:
+        mark = datetime.datetime.fromisoformat(highWaterMark)
+    except ValueError:
+        return highWaterMark
+    return (mark - INCREMENTAL_OVERLAP).isoformat(sep=' ')
+
+# A run that died without releasing its claim blocks the next one only this long
+INCREMENTAL_CLAIM_TIMEOUT = datetime.timedelta(hours=12)
+
+# Claims the next sequence in a short transaction, the export itself runs with no transaction open
+def ClaimWatermark(host, port, dbname):
+    claim = uuid.uuid4().hex
+    with transaction.atomic():
+        watermark, created = CaseBackupWatermark.objects.get_or_create(postgres_host=host, postgres_port=str(port), database_name=dbname)
+        claimed = CaseBackupWatermark.objects.filter(pk=watermark.pk).filter(
+            Q(claimed_at__isnull=True) | Q(claimed_at__lt=timezone.now() - INCREMENTAL_CLAIM_TIMEOUT)
+        ).update(claimed_by=claim, claimed_at=timezone.now())
+    if not claimed:
+        return None, None
+    watermark.refresh_from_db()
+    return watermark, claim
+
+def ReleaseWatermark(watermark, claim):
+    CaseBackupWatermark.objects.filter(pk=watermark.pk, claimed_by=claim).update(claimed_by="", claimed_at=None)
 
-    # Close the SSH connection
-    ssh.close()
-    return [{"status": True, "message": "All operations completed successfully."}]
+# Moves the mark only while the claim is still ours and nobody advanced the sequence meanwhile
+def AdvanceWatermark(watermark, claim, highWaterMark, sequence, backupPath):
+    with transaction.atomic():
+        return CaseBackupWatermark.objects.filter(pk=watermark.pk, claimed_by=claim, sequence=sequence - 1).update(
+            high_water_mark=highWaterMark, sequence=sequence, backup_path=backupPath, claimed_by="", claimed_at=None, updated_at=timezone.now()
+        ) == 1
+
+# Incremental case backup, exports only rows changed since the last recorded updated_on
+def IncrementalCaseBackup(user, host, port, password, dbname, backupPath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None, workers=None):
+    watermark, claim = ClaimWatermark(host, port, dbname)
+    if watermark is None:
+        print(f"Incremental backup for {dbname} is already running.")
+        return False, [{"status": False, "error": f"Another incremental backup is running for {dbname}."}]
+    try:
+        return RunIncrementalCaseBackup(watermark, claim, user, host, port, password, dbname, backupPath, isRemote, remoteHost, remoteUser, remotePassword, workers)
+    finally:
+        # No-op once AdvanceWatermark cleared the claim
+        ReleaseWatermark(watermark, claim)
+
+def RunIncrementalCaseBackup(watermark, claim, user, host, port, password, dbname, backupPath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None, workers=None):
+    sequence = watermark.sequence + 1
+    deltaName = f"{sequence:06d}"
+    deltaPath = os.path.join(backupPath, deltaName)
+    windowStart = OverlapStart(watermark.high_water_mark)
+    print(f"Incremental backup {deltaName} for {dbname} from watermark {watermark.high_water_mark} (reading from {windowStart})")
+
+    ssh = None
+    sftp = None
+    try:
+        if isRemote:
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(hostname=remoteHost, username=remoteUser, password=remotePassword)
+            sftp = ssh.open_sftp()
+            ssh.exec_command(f"mkdir -p {shlex.quote(backupPath)}")[1].channel.recv_exit_status()
+            results = BackupCaseQueryRemote(windowStart, None, user, host, port, password, dbname, deltaPath, remoteHost, remoteUser, remotePassword, workers)
+        else:
+            os.makedirs(deltaPath, exist_ok=True)
+            results = LocalCaseQuery(windowStart, None, user, host, port, password, dbname, deltaPath, workers)
+
+        if any(item["status"] is False for item in results):
+            print(f"Incremental backup {deltaName} failed, watermark left at {watermark.high_water_mark}")
+            return False, results
+
+        # An empty case table has no updated_on yet, keep the previous mark
+        windowEnd = results[0]["window_end"] or watermark.high_water_mark
+
+        chain = ReadDeltaChain(backupPath, sftp)
+        chain["database_name"] = dbname
+        chain["deltas"].append({
+            "sequence": sequence,
+            "directory": deltaName,
+            "from": windowStart,
+            "to": windowEnd,
+            "created_at": datetime.datetime.now().isoformat(),
+            "tables": {item["table"]: item["rows"] for item in results}
+        })
+        WriteDeltaChain(backupPath, chain, sftp)
+
+        if not AdvanceWatermark(watermark, claim, windowEnd, sequence, backupPath):
+            print(f"Incremental backup {deltaName} lost its claim, watermark not moved")
+            return False, [{"status": False, "error": "The watermark claim expired or was taken over before the backup finished."}]
+        print(f"Incremental backup {deltaName} saved, watermark moved to {windowEnd}")
+        return deltaPath, results
+
+    except Exception as e:
+        print(f"Error during incremental backup: {e}")
+        return False, [{"status": False, "error": str(e)}]
+
+    finally:
+        if sftp:
+            sftp.close()
+        if ssh:
+            ssh.close()
+
+# Upsert one delta CSV into its table through a staging temp table
+def ApplyDeltaTable(cur, tableName, csvFile):
+    cur.execute(f'CREATE TEMP TABLE delta_stage (LIKE public."{tableName}" INCLUDING DEFAULTS) ON COMMIT DROP;')
+    cur.copy_expert("COPY delta_stage FROM STDIN WITH (FORMAT csv, HEADER true)", csvFile)
+    rows = cur.rowcount
+
+    cur.execute("""
+        SELECT a.attname FROM pg_index i
+        JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+        WHERE i.indrelid = %s::regclass AND i.indisprimary;
+    """, (f'public."{tableName}"',))
+    keyColumns = [row[0] for row in cur.fetchall()]
+    cur.execute("""
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped ORDER BY attnum;
+    """, (f'public."{tableName}"',))
+    columns = [row[0] for row in cur.fetchall()]
+
+    if keyColumns:
+        updates = ", ".join(f'"{column}" = EXCLUDED."{column}"' for column in columns if column not in keyColumns)
+        conflict = ", ".join(f'"{column}"' for column in keyColumns)
+        action = f"DO UPDATE SET {updates}" if updates else "DO NOTHING"
+        cur.execute(f'INSERT INTO public."{tableName}" SELECT * FROM delta_stage ON CONFLICT ({conflict}) {action};')
+    else:
+        cur.execute(f'INSERT INTO public."{tableName}" SELECT * FROM delta_stage;')
+    cur.execute("DROP TABLE delta_stage;")
+    return rows
+
+# Replay a chain of incremental case backups in order, one transaction per delta
+def RestoreCaseDeltaChain(user, host, port, dbname, password, backupPath, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+    sftp = None
+    conn = None
+    try:
+        if isRemote:
+            ssh = paramiko.SSHClient()
+            ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            ssh.connect(hostname=remoteHost, username=remoteUser, password=remotePassword)
+            sftp = ssh.open_sftp()
+
+        chain = ReadDeltaChain(backupPath, sftp)
+        if not chain["deltas"]:
+            print(f"No incremental backups found in {backupPath}")
+            return False
+
+        conn = ConnectPostgres(user, host, port, password, dbname)
+        for delta in sorted(chain["deltas"], key=lambda item: item["sequence"]):
+            deltaPath = os.path.join(backupPath, delta["directory"])
+            cur = conn.cursor()
+            # Parent tables come first in CASE_EXPORT_TABLES so foreign keys resolve
+            for tableName, idColumn, idSet in CASE_EXPORT_TABLES:
+                csvPath = os.path.join(deltaPath, f"{tableName}.csv")
+                try:
+                    csvFile = sftp.file(csvPath, 'rb') if sftp else open(csvPath, 'rb')
+                except (IOError, OSError):
+                    print(f"CSV file {csvPath} not found, skipping.")
+                    continue
+                with csvFile:
+                    rows = ApplyDeltaTable(cur, tableName, csvFile)
+                print(f"Applied {rows} rows to {tableName} from delta {delta['directory']}.")
+            conn.commit()
+            cur.close()
+            print(f"Delta {delta['directory']} replayed up to {delta['to']}.")
+        return dbname
+
+    except Exception as e:
+        print(f"Error replaying incremental backups: {e}")
+        if conn:
+            conn.rollback()
+        return False
+
+    finally:
+        if conn:
+            conn.close()
+        if sftp:
+            sftp.close()
+        if ssh:
+            ssh.close()
+
+# Continuous case capture through a test_decoding logical replication slot
+CDC_TABLE_PREFIX = 'table public."Case_Management_'
+CDC_SEGMENT_BYTES = 64 * 1024 * 1024
+CDC_SEGMENT_SECONDS = 300
+CDC_SEGMENT_SUFFIX = ".jsonl.gz"
+# Capture threads of this process by (host, port, database), the shared state is in CaseCdcCapture
+CDC_STREAMS = {}
+CDC_HEARTBEAT_SECONDS = 5
+# A capture whose owner stopped heartbeating this long ago is treated as dead
+CDC_STALE_SECONDS = 30
+
+def CdcOwner():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def CdcCaptureAlive(capture):
+    return capture.running and capture.heartbeat_at is not None and (timezone.now() - capture.heartbeat_at).total_seconds() < CDC_STALE_SECONDS
+
+# Publish counters and pick up stop requests from other processes
+def CdcHeartbeat(stream):
+    CaseCdcCapture.objects.filter(pk=stream["capture_id"]).update(transactions=stream["transactions"], segments=stream["segments"], heartbeat_at=timezone.now())
+    if CaseCdcCapture.objects.filter(pk=stream["capture_id"], stop_requested=True).exists():
+        stream["stop"].set()
+
+def CdcSlotName(dbname):
+    return "case_cdc_" + re.sub(r'[^a-z0-9_]', '_', dbname.lower())
+
+def FormatLsn(lsn):
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+def ParseLsn(text):
+    high, low = text.split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+# One gzip segment file, written as .partial and renamed once it is complete
+class CdcSegmentWriter:
+    def __init__(self, segmentPath, firstLsn, sftp=None):
+        self.sftp = sftp
+        self.path = os.path.join(segmentPath, f"{firstLsn:016X}{CDC_SEGMENT_SUFFIX}")
+        self.raw = sftp.file(self.path + ".partial", 'wb') if sftp else open(self.path + ".partial", 'wb')
+        self.file = gzip.GzipFile(fileobj=self.raw, mode='wb')
+        self.opened = datetime.datetime.now()
+        self.bytes = 0
+        self.lastLsn = firstLsn
+
+    def Write(self, transaction):
+        line = (json.dumps(transaction) + "\n").encode('utf-8')
+        self.file.write(line)
+        self.bytes += len(line)
+        self.lastLsn = transaction["lsn"]
+
+    def Due(self, segmentBytes, segmentSeconds):
+        return self.bytes >= segmentBytes or (datetime.datetime.now() - self.opened).total_seconds() >= segmentSeconds
+
+    def Close(self):
+        self.file.close()
+        if self.sftp:
+            self.raw.close()
+            self.sftp.posix_rename(self.path + ".partial", self.path)
+        else:
+            self.raw.flush()
+            os.fsync(self.raw.fileno())
+            self.raw.close()
+            os.replace(self.path + ".partial", self.path)
+        print(f"CDC segment {self.path} closed at {FormatLsn(self.lastLsn)}.")
+        return self.lastLsn
+
+# Capture loop, the slot only advances past transactions whose segment is safely closed
+def CaseCdcStream(stream, user, host, port, password, dbname, slotName, segmentPath, segmentBytes, segmentSeconds, sftp=None):
+    conn = None
+    segment = None
+    try:
+        conn = psycopg2.connect(dbname=dbname, user=user, password=password, host=host, port=port, connection_factory=psycopg2.extras.LogicalReplicationConnection)
+        cur = conn.cursor()
+        cur.start_replication(slot_name=slotName, decode=True, options={'include-xids': '1', 'include-timestamp': '1', 'skip-empty-xacts': '1'})
+        print(f"CDC capture for {dbname} streaming from slot {slotName}.")
+
+        transaction = None
+        lastHeartbeat = 0
+        while not stream["stop"].is_set():
+            if time.monotonic() - lastHeartbeat >= CDC_HEARTBEAT_SECONDS:
+                CdcHeartbeat(stream)
+                lastHeartbeat = time.monotonic()
+            message = cur.read_message()
+            if message is None:
+                select.select([cur], [], [], 1)
+            elif message.payload.startswith("BEGIN"):
+                transaction = {"xid": message.payload.split()[1], "changes": []}
+            elif message.payload.startswith("COMMIT"):
+                # Transactions without case changes are only acknowledged
+                if transaction and transaction["changes"]:
+                    transaction["lsn"] = message.data_start
+                    transaction["lsn_text"] = FormatLsn(message.data_start)
+                    transaction["commit_time"] = message.payload.split(" (at ", 1)[1].rstrip(")") if " (at " in message.payload else None
+                    if segment is None:
+                        segment = CdcSegmentWriter(segmentPath, message.data_start, sftp)
+                    segment.Write(transaction)
+                    stream["transactions"] += 1
+                elif segment is None:
+                    cur.send_feedback(flush_lsn=message.data_start)
+                transaction = None
+            elif transaction is not None and message.payload.startswith(CDC_TABLE_PREFIX):
+                transaction["changes"].append(message.payload)
+
+            if segment and transaction is None and segment.Due(segmentBytes, segmentSeconds):
+                cur.send_feedback(flush_lsn=segment.Close(), force=True)
+                stream["segments"] += 1
+                segment = None
+
+        if segment:
+            cur.send_feedback(flush_lsn=segment.Close(), force=True)
+            stream["segments"] += 1
+        stream["error"] = None
+
+    except Exception as e:
+        print(f"CDC capture for {dbname} stopped: {e}")
+        stream["error"] = str(e)
+    finally:
+        stream["running"] = False
+        try:
+            CaseCdcCapture.objects.filter(pk=stream["capture_id"]).update(
+                running=False, transactions=stream["transactions"], segments=stream["segments"], error=stream["error"], heartbeat_at=timezone.now())
+        except Exception as e:
+            print(f"Unable to record CDC state for {dbname}: {e}")
+        close_old_connections()
+        if conn:
+            conn.close()
+        if sftp:
+            sftp.close()
+        if stream.get("ssh"):
+            stream["ssh"].close()
+
+def StartCaseCdc(user, host, port, password, dbname, segmentPath, slotName=None, segmentBytes=None, segmentSeconds=None, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    key = (host, str(port), dbname)
+    capture, _ = CaseCdcCapture.objects.get_or_create(postgres_host=host, postgres_port=str(port), database_name=dbname, defaults={"slot_name": slotName or CdcSlotName(dbname), "segment_path": segmentPath})
+    # Possibly running in another worker process
+    if CdcCaptureAlive(capture):
+        print(f"CDC capture already running for {dbname} in {capture.owner}.")
+        return capture.slot_name
+
+    slotName = slotName or CdcSlotName(dbname)
+    ssh = None
+    sftp = None
+    try:
+        conn = psycopg2.connect(dbname=dbname, user=user, password=password, host=host, port=port, connection_factory=psycopg2.extras.LogicalReplicationConnection)
+        try:
+            cur = conn.cursor()
+            cur.execute("SELECT 1 FROM pg_replication_slots WHERE slot_name = %s;", (slotName,))
+            if not cur.fetchone():
+                # Fails unless the server runs with wal_level=logical
+                cur.create_replication_slot(slotName, output_plugin='test_decoding')
+                print(f"Created logical replication slot {slotName}.")
+        finally:
+            conn.close()
+
+        ssh = ConnectRemote(isRemote, remoteHost, remoteUser, remotePassword)
+        if ssh:
+            ssh.exec_command(f"mkdir -p {shlex.quote(segmentPath)}")[1].channel.recv_exit_status()
+            sftp = ssh.open_sftp()
+        else:
+            os.makedirs(segmentPath, exist_ok=True)
+
+        capture.slot_name = slotName
+        capture.segment_path = segmentPath
+        capture.running = True
+        capture.stop_requested = False
+        capture.owner = CdcOwner()
+        capture.transactions = 0
+        capture.segments = 0
+        capture.error = None
+        capture.heartbeat_at = timezone.now()
+        capture.save()
+
+        stream = {"slot": slotName, "segment_path": segmentPath, "running": True, "transactions": 0, "segments": 0, "error": None, "stop": threading.Event(), "ssh": ssh, "capture_id": capture.pk}
+        stream["thread"] = threading.Thread(
+            target=CaseCdcStream,
+            args=(stream, user, host, port, password, dbname, slotName, segmentPath, int(segmentBytes or CDC_SEGMENT_BYTES), int(segmentSeconds or CDC_SEGMENT_SECONDS), sftp),
+            daemon=True
+        )
+        CDC_STREAMS[key] = stream
+        stream["thread"].start()
+        return slotName
+
+    except Exception as e:
+        print(f"Error starting CDC capture for {dbname}: {e}")
+        if sftp:
+            sftp.close()
+        if ssh:
+            ssh.close()
+        return False
+
+# Stop the capture wherever it runs, optionally dropping the slot so the server stops retaining WAL for it
+def StopCaseCdc(user, host, port, password, dbname, dropSlot=False):
+    capture = CaseCdcCapture.objects.filter(postgres_host=host, postgres_port=str(port), database_name=dbname).first()
+    if capture is None or not capture.running:
+        print(f"No CDC capture running for {dbname}.")
+        return False
+
+    CaseCdcCapture.objects.filter(pk=capture.pk).update(stop_requested=True)
+    stream = CDC_STREAMS.pop((host, str(port), dbname), None)
+    if stream is not None:
+        stream["stop"].set()
+        stream["thread"].join(timeout=30)
+    else:
+        # The owner process notices the request at its next heartbeat
+        deadline = time.monotonic() + CDC_STALE_SECONDS
+        while time.monotonic() < deadline:
+            capture.refresh_from_db()
+            if not CdcCaptureAlive(capture):
+                break
+            time.sleep(1)
+        CaseCdcCapture.objects.filter(pk=capture.pk).update(running=False)
+
+    if dropSlot:
+        try:
+            ExecuteControl(user, host, port, password, "SELECT pg_drop_replication_slot(%s);", (capture.slot_name,), dbname=dbname)
+            print(f"Dropped replication slot {capture.slot_name}.")
+        except Exception as e:
+            print(f"Unable to drop replication slot {capture.slot_name}: {e}")
+            return False
+    return capture.slot_name
+
+def CaseCdcStatus():
+    return [
+        {"postgres_host": capture.postgres_host, "postgres_port": capture.postgres_port, "database_name": capture.database_name, "slot": capture.slot_name,
+         "segment_path": capture.segment_path, "running": CdcCaptureAlive(capture), "owner": capture.owner, "transactions": capture.transactions,
+         "segments": capture.segments, "error": capture.error, "heartbeat_at": capture.heartbeat_at}
+        for capture in CaseCdcCapture.objects.all()
+    ]
+
+# test_decoding only quotes table names that need it, public.data and public."Data" both occur
+TEST_DECODING_CHANGE = re.compile(r'table public\.("(?:[^"]|"")*"|[^\s:]+): (INSERT|UPDATE|DELETE|TRUNCATE): ?(.*)$', re.S)
+# The type runs up to "]:" so array types such as text[] stay whole
+TEST_DECODING_COLUMN = re.compile(r"""("(?:[^"]|"")*"|[^\s\[]+)\[((?:[^\]]|\](?!:))+)\]:('(?:[^']|'')*'|\S+)""")
+
+def UnquoteIdentifier(name):
+    return name[1:-1].replace('""', '"') if name.startswith('"') else name
+
+def QuoteIdentifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def ParseTestDecodingColumns(text):
+    columns = []
+    for name, typeName, value in TEST_DECODING_COLUMN.findall(text):
+        name = UnquoteIdentifier(name)
+        # Unchanged TOAST values are not in the stream, the target already has them
+        if value == "unchanged-toast-datum":
+            continue
+        if value == "null":
+            value = None
+        elif value.startswith("'"):
+            value = value[1:-1].replace("''", "'")
+        columns.append((name, typeName, value))
+    return columns
+
+# One test_decoding change line as table, action, new tuple and old key
+def ParseTestDecodingChange(line):
+    match = TEST_DECODING_CHANGE.match(line)
+    if not match:
+        raise Exception(f"Unrecognized change: {line[:200]}")
+    tableName, action, rest = match.groups()
+    tableName = UnquoteIdentifier(tableName)
+    oldKey = None
+    if rest.startswith("old-key: "):
+        oldText, rest = rest[len("old-key: "):].split(" new-tuple: ", 1)
+        oldKey = ParseTestDecodingColumns(oldText)
+    columns = [] if rest.startswith("(no-") else ParseTestDecodingColumns(rest)
+    return {"table": tableName, "action": action, "columns": columns, "old_key": oldKey}
+
+def ApplyCdcChange(cur, change, keyColumnsCache):
+    table = f'public.{QuoteIdentifier(change["table"])}'
+    if change["action"] == "TRUNCATE":
+        cur.execute(f"TRUNCATE {table};")
+        return
+    if change["table"] not in keyColumnsCache:
+        cur.execute("""
+            SELECT a.attname FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = %s::regclass AND i.indisprimary;
+        """, (table,))
+        keyColumnsCache[change["table"]] = [row[0] for row in cur.fetchall()]
+    keyColumns = keyColumnsCache[change["table"]]
+
+    columns = change["columns"]
+    if change["action"] == "INSERT":
+        names = ", ".join(QuoteIdentifier(name) for name, typeName, value in columns)
+        values = ", ".join(f"%s::{typeName}" for name, typeName, value in columns)
+        keyList = ", ".join(QuoteIdentifier(column) for column in keyColumns)
+        conflict = f" ON CONFLICT ({keyList}) DO NOTHING" if keyColumns else ""
+        cur.execute(f"INSERT INTO {table} ({names}) VALUES ({values}){conflict};", [value for name, typeName, value in columns])
+        return
+
+    keySource = change["old_key"] or change["columns"]
+    key = [column for column in keySource if not keyColumns or column[0] in keyColumns]
+    if not key:
+        raise Exception(f"No key for {change['action']} on {change['table']}, set REPLICA IDENTITY on the source table")
+    where = " AND ".join(f'{QuoteIdentifier(name)} = %s::{typeName}' for name, typeName, value in key)
+    if change["action"] == "UPDATE":
+        assignments = ", ".join(f'{QuoteIdentifier(name)} = %s::{typeName}' for name, typeName, value in columns)
+        cur.execute(f"UPDATE {table} SET {assignments} WHERE {where};", [value for name, typeName, value in columns] + [value for name, typeName, value in key])
+    else:
+        cur.execute(f"DELETE FROM {table} WHERE {where};", [value for name, typeName, value in key])
+
+# Replay closed segments in LSN order, one target transaction per source transaction
+def ReplayCaseCdcSegments(user, host, port, password, dbname, segmentPath, afterLsn=None, isRemote=False, remoteHost=None, remoteUser=None, remotePassword=None):
+    ssh = None
+    sftp = None
+    conn = None
+    afterLsn = ParseLsn(afterLsn) if afterLsn else 0
+    lastLsn = afterLsn
+    try:
+        ssh = ConnectRemote(isRemote, remoteHost, remoteUser, remotePassword)
+        sftp = ssh.open_sftp() if ssh else None
+        segments = sorted(name for name in (sftp.listdir(segmentPath) if sftp else os.listdir(segmentPath)) if name.endswith(CDC_SEGMENT_SUFFIX))
+        if not segments:
+            print(f"No CDC segments found in {segmentPath}")
+            return False
+
+        conn = ConnectPostgres(user, host, port, password, dbname)
+        keyColumnsCache = {}
+        transactions = 0
+        for segmentName in segments:
+            raw = sftp.file(os.path.join(segmentPath, segmentName), 'rb') if sftp else open(os.path.join(segmentPath, segmentName), 'rb')
+            with raw, gzip.GzipFile(fileobj=raw, mode='rb') as segmentFile:
+                for line in segmentFile:
+                    transaction = json.loads(line)
+                    # Segments can repeat transactions after a capture restart
+                    if transaction["lsn"] <= lastLsn:
+                        continue
+                    with conn.cursor() as cur:
+                        for changeLine in transaction["changes"]:
+                            ApplyCdcChange(cur, ParseTestDecodingChange(changeLine), keyColumnsCache)
+                    conn.commit()
+                    lastLsn = transaction["lsn"]
+                    transactions += 1
+            print(f"Replayed CDC segment {segmentName}.")
+
+        print(f"Replayed {transactions} transactions up to {FormatLsn(lastLsn)}.")
+        return FormatLsn(lastLsn)
+
+    except Exception as e:
+        print(f"Error replaying CDC segments: {e}")
+        if conn:
+            conn.rollback()
+        return False
+
+    finally:
+        if conn:
+            conn.close()
+        if sftp:
+            sftp.close()
+        if ssh:
+            ssh.close()
 
 #Remote Case Restore
 def ExtractTableNamesFromRemote(remote_host, remote_user, remote_password, schema_file_path):
@@ -539,91 +2210,205 @@ def ExtractTableNamesFromRemote(remote_host, remote_user, remote_password, schem
     except Exception as e:
         print(f"An error occurred: {e}")
         return []
-def RestoreCaseQueryFromRemote(remote_host, remote_user, remote_password, local_host, db_user, db_port, db_password, db_name, schema_file_path, data_file_path):
-    os.environ['PGPASSWORD'] = db_password
-
+def RestoreCaseQueryFromRemote(remote_host, remote_user, remote_password, local_host, db_user, db_port, db_password, db_name, schema_file_path, data_file_path, workers=None, copy_format="csv", maintenance_work_mem=None):
+    ssh = None
     try:
-        table_names = ExtractTableNamesFromRemote(remote_host, remote_user, remote_password, schema_file_path)
-
         ssh = paramiko.SSHClient()
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
         ssh.connect(remote_host, username=remote_user, password=remote_password)
 
-        restore_schema_command = f"PGPASSWORD={db_password} psql -U {db_user} -h {local_host} -d {db_name} -f {schema_file_path}"
-        
-        stdin, stdout, stderr = ssh.exec_command(restore_schema_command)
-        exit_status = stdout.channel.recv_exit_status()  # Wait for command to complete
+        # Schema and CSV listing are read once over a single SFTP session
+        with ssh.open_sftp() as sftp:
+            with sftp.open(schema_file_path, 'r') as schema_file:
+                schema_sql = schema_file.read().decode('utf-8')
+            data_files = set(sftp.listdir(data_file_path))
+        pre_data, post_data = SplitSchemaSections(schema_sql)
 
-        for table_name in table_names:
-            remote_csv_file_path = os.path.join(data_file_path, f"{table_name}.csv")
-            
-            check_csv_command = f"ls {remote_csv_file_path}"
-            stdin, stdout, stderr = ssh.exec_command(check_csv_command)
-            exit_status = stdout.channel.recv_exit_status()
-
-            if exit_status == 0:  # The file exists
-                qtablename = f'\\\"{table_name}\\\"'
-                copy_command = f"\\COPY {qtablename} FROM '{remote_csv_file_path}' WITH (FORMAT csv, HEADER true)"
-                restore_data_command = f"PGPASSWORD={db_password} psql -U {db_user} -h {local_host} -p {db_port} -d {db_name} -c \"{copy_command}\" "
-                
-                print("Restore Data Command:", restore_data_command)
-                stdin, stdout, stderr = ssh.exec_command(restore_data_command)
-                exit_status = stdout.channel.recv_exit_status()
+        # Tables first, indexes and constraints are built once the data is in
+        restore_schema_command = ['psql', '-q', '-U', db_user, '-h', str(local_host), '-p', str(db_port), '-d', db_name]
+        ok, error = RunBackupCommand(restore_schema_command, db_password, ssh, pre_data.encode('utf-8'))
+        if not ok:
+            print(f"Schema restoration failed for '{db_name}': {error}")
 
-                if exit_status == 0:
-                    print(f"Successfully restored data from {remote_csv_file_path} into table '{table_name}'.")
-                else:
-                    error_output = stderr.read().decode()
-                    print(f"Error restoring table {table_name} from {remote_csv_file_path}: {error_output}")
-                    print(f"Table Name: {table_name}")
-                    print(f"Remote CSV File Path: {remote_csv_file_path}")
-                    print(f"Copy Command: {copy_command}")
-            else:
-                print(f"CSV file {remote_csv_file_path} does not exist on the remote machine.")
+        table_files = FindTableDataFiles(re.findall(r'CREATE TABLE\s+(?:\w+\.)?"?([a-zA-Z_][a-zA-Z0-9_]*)"?', schema_sql), data_files, copy_format)
+        if not table_files:
+            print(f"No {copy_format} files in {data_file_path} match the tables in {schema_file_path}")
+        else:
+            levels = OrderTablesByForeignKeys(list(table_files), ExtractForeignKeys(pre_data))
+            print(f"Loading tables in order: {levels}")
+
+            # Each worker reads its data file through its own SFTP channel on the shared connection
+            @contextmanager
+            def OpenRemoteInput(file_name):
+                worker_sftp = ssh.open_sftp()
+                try:
+                    with worker_sftp.file(os.path.join(data_file_path, file_name), 'rb', bufsize=STREAM_CHUNK_SIZE) as remote_file:
+                        remote_file.prefetch()
+                        yield remote_file
+                finally:
+                    worker_sftp.close()
+
+            results = LoadCaseTables(db_user, local_host, db_port, db_password, db_name, levels, OpenRemoteInput, workers, copy_format, table_files)
+            if any(item["status"] is False for item in results):
+                return False
+
+        post_results = BuildPostDataObjects(db_user, local_host, db_port, db_password, db_name, post_data, workers, maintenance_work_mem)
+        return not any(item["status"] is False for item in post_results)
 
     except Exception as e:
         print(f"An error occurred: {e}")
         return False
     finally:
-        os.environ.pop("PGPASSWORD", None)  # Clean up the environment variable
         if ssh:
             ssh.close()
 
+# Case restores served from template databases, evicted by idle age and total size per server
+TEMPLATE_MAX_AGE_HOURS = 24 * 7
+TEMPLATE_MAX_BYTES = 100 * 1024 ** 3
+
+def TemplateDatabaseName(backupId):
+    return "case_tpl_" + hashlib.sha1(backupId.encode('utf-8')).hexdigest()[:16]
+
+def DropTemplateDatabase(cur, templateName):
+    cur.execute("SELECT 1 FROM pg_database WHERE datname = %s;", (templateName,))
+    if cur.fetchone():
+        cur.execute(f'ALTER DATABASE "{templateName}" WITH IS_TEMPLATE false;')
+        cur.execute(f'DROP DATABASE "{templateName}";')
+        print(f"Template database '{templateName}' dropped.")
+
+# Session advisory lock per template: restores hold it shared while cloning and exclusive while building,
+# eviction only drops templates it can lock exclusively
+TEMPLATE_LOCK_CLASS = "case_tpl"
+
+# function is one of lock, try_lock or unlock, with shared=True for their _shared variants
+def TemplateAdvisoryLock(cur, templateName, function="lock", shared=False):
+    cur.execute(f"SELECT pg_advisory_{function}{'_shared' if shared else ''}(hashtext(%s), hashtext(%s));", (TEMPLATE_LOCK_CLASS, templateName))
+    return cur.fetchone()[0] if function == "try_lock" else True
+
+# Exclusive lock for eviction, yields False instead of waiting when a restore holds it
+@contextmanager
+def TryTemplateLock(cur, templateName):
+    acquired = TemplateAdvisoryLock(cur, templateName, "try_lock")
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            TemplateAdvisoryLock(cur, templateName, "unlock")
+
+def EvictCaseTemplates(user, host, port, password, maxAgeHours=None, maxBytes=None, keep=None):
+    maxAgeHours = float(maxAgeHours) if maxAgeHours else TEMPLATE_MAX_AGE_HOURS
+    maxBytes = int(maxBytes) if maxBytes else TEMPLATE_MAX_BYTES
+    cutoff = timezone.now() - datetime.timedelta(hours=maxAgeHours)
+
+    # Most recently used templates are kept first, the rest go once they are idle too long or over the size budget
+    totalBytes = 0
+    candidates = []
+    for template in CaseRestoreTemplate.objects.filter(postgres_host=host, postgres_port=str(port)).order_by('-last_used_at'):
+        if template.template_name == keep or (template.last_used_at >= cutoff and totalBytes + template.size_bytes <= maxBytes):
+            totalBytes += template.size_bytes
+        else:
+            candidates.append(template)
+    if not candidates:
+        return []
+
+    evicted = []
+    with ControlConnection(user, host, port, password) as conn:
+        with conn.cursor() as cur:
+            for template in candidates:
+                # A restore building or cloning this template holds its lock, it waits for the next round
+                with TryTemplateLock(cur, template.template_name) as acquired:
+                    if not acquired:
+                        print(f"Template database '{template.template_name}' is in use, not evicting it.")
+                        continue
+                    DropTemplateDatabase(cur, template.template_name)
+                    template.delete()
+                    evicted.append(template.template_name)
+    return evicted
+
+# Restore a backup once into a template database, then serve every restore of it with CREATE DATABASE ... TEMPLATE
+# restoreInto(databaseName) runs the normal case restore and returns a falsy value on failure
+def RestoreCaseThroughTemplate(user, host, port, password, dbName, backupId, restoreInto, maxAgeHours=None, maxBytes=None):
+    templateName = TemplateDatabaseName(backupId)
+    # CREATE DATABASE ... TEMPLATE cannot restore into an existing database, the regular path can
+    if DatabaseExists(user, host, port, password, dbName):
+        print(f"Database '{dbName}' already exists, restoring without the template.")
+        return (dbName if restoreInto(dbName) else False), False
+
+    lockConn = None
+    try:
+        # Held for the whole build or clone, a dedicated connection keeps it off the control pool
+        lockConn = ConnectPostgres(user, host, port, password, "postgres")
+        lockConn.autocommit = True
+        lockCur = lockConn.cursor()
+
+        template = CaseRestoreTemplate.objects.filter(postgres_host=host, postgres_port=str(port), template_name=templateName).first()
+        shared = template is not None
+        TemplateAdvisoryLock(lockCur, templateName, "lock", shared)
+        # Whoever held the lock before may have built or evicted it
+        template = CaseRestoreTemplate.objects.filter(postgres_host=host, postgres_port=str(port), template_name=templateName).first()
+        if template and not DatabaseExists(user, host, port, password, templateName):
+            print(f"Template database '{templateName}' is gone, restoring it again.")
+            template.delete()
+            template = None
+        if template is None and shared:
+            # Building needs the lock exclusively
+            TemplateAdvisoryLock(lockCur, templateName, "unlock", shared=True)
+            TemplateAdvisoryLock(lockCur, templateName, "lock")
+            template = CaseRestoreTemplate.objects.filter(postgres_host=host, postgres_port=str(port), template_name=templateName).first()
+        fromTemplate = template is not None
+
+        if template is None:
+            with ControlConnection(user, host, port, password) as conn:
+                with conn.cursor() as cur:
+                    # Under the exclusive lock a template without a record can only be left over from a failed build
+                    DropTemplateDatabase(cur, templateName)
+                    cur.execute(f'CREATE DATABASE "{templateName}" TEMPLATE template0;')
+            print(f"Restoring backup '{backupId}' into template database '{templateName}'.")
+            restored = restoreInto(templateName)
+            with ControlConnection(user, host, port, password) as conn:
+                with conn.cursor() as cur:
+                    if not restored:
+                        DropTemplateDatabase(cur, templateName)
+                        return False, False
+                    # Cloning fails while anyone is connected to the template
+                    cur.execute(f'ALTER DATABASE "{templateName}" WITH IS_TEMPLATE true ALLOW_CONNECTIONS false;')
+                    cur.execute("SELECT pg_database_size(%s);", (templateName,))
+                    template = CaseRestoreTemplate.objects.create(postgres_host=host, postgres_port=str(port), backup_id=backupId, template_name=templateName, size_bytes=cur.fetchone()[0])
+
+        with ControlConnection(user, host, port, password) as conn:
+            with conn.cursor() as cur:
+                # FILE_COPY copies the template's files directly instead of writing every block through WAL
+                cur.execute("SHOW server_version_num;")
+                strategy = " STRATEGY = FILE_COPY" if int(cur.fetchone()[0]) >= 150000 else ""
+                cur.execute(f'CREATE DATABASE "{dbName}" TEMPLATE "{templateName}"{strategy};')
+        print(f"Database '{dbName}' cloned from template '{templateName}'.")
+
+        template.last_used_at = timezone.now()
+        template.save()
+    except Exception as e:
+        print(f"Error restoring '{dbName}' through template '{templateName}': {e}")
+        return False, False
+    finally:
+        # Closing the session releases its advisory locks
+        if lockConn:
+            lockConn.close()
+
+    evicted = EvictCaseTemplates(user, host, port, password, maxAgeHours, maxBytes, keep=templateName)
+    if evicted:
+        print(f"Evicted template databases: {evicted}")
+    return dbName, fromTemplate
+
 # Optional use of scheme restore of database
 def RestoreSchemaForDatabase(user, host, port, dbname, password, schemaBackupPath):
-    os.environ['PGPASSWORD'] = password
-
-    checkDbCommand = [
-        'psql',
-        '-U', user,
-        '-h', host,
-        '-p', str(port),
-        '-d', 'postgres',  # Connect to default database to check
-        '-tAc', f"SELECT 1 FROM pg_database WHERE datname = '{dbname}'"
-    ]
     try:
         print(f"Checking if database '{dbname}' exists...")
-        result = subprocess.run(checkDbCommand, check=True, stderr=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
-        
-        # If result stdout is empty, it means the database doesn't exist
-        if not result.stdout.strip():
-            raise Exception("Database does not exist")
-        print(f"Database '{dbname}' exists.")
-    except Exception as e:
-        print(f"Database '{dbname}' does not exist, creating database...")
-        try:
-            createDbCommand = f'CREATE DATABASE "{dbname}";'
-            subprocess.run(
-                ['psql', '-U', user, '-h', host, '-p', str(port), '-d', 'postgres', '-c', createDbCommand],
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
-            print(f"Database '{dbname}' created successfully.")
-        except subprocess.CalledProcessError as e:
-            print(f"Error during database creation: {e.stderr}")
-            return False
+        if CreateDatabaseIfNotExists(user, host, port, password, dbname):
+            print(f"Database '{dbname}' did not exist and was created.")
+        else:
+            print(f"Database '{dbname}' exists.")
+    except psycopg2.Error as e:
+        print(f"Error during database creation: {e}")
+        return False
             
     try:
         # Restore schema
@@ -635,19 +2420,16 @@ def RestoreSchemaForDatabase(user, host, port, dbname, password, schemaBackupPat
             '-d', dbname,
             '-f', schemaBackupPath
         ]
-        subprocess.run(command, check=True)
+        subprocess.run(command, check=True, env=PostgresEnv(password))
         print(f"Schema restoration successful for database: {dbname}")
     except subprocess.CalledProcessError as e:
         print(f"Error during schema restoration: {str(e)}")
         return False
-    finally:
-        os.environ.pop('PGPASSWORD', None)
     
     return dbname
 
 # CMM only Schema backup
 def DatabaseSchemaBackup(user, host, port, password, dbName, filePath):
-    os.environ['PGPASSWORD'] = password
     filePath = os.path.join(filePath, f'{datetime.datetime.now().strftime("%d%m%Y")}_{host}_{dbName}_schema.sql')
     tempFilepath = filePath + ".tmp"
     
@@ -662,7 +2444,7 @@ def DatabaseSchemaBackup(user, host, port, password, dbName, filePath):
         dbName
     ]
     
-    result = subprocess.run(command, check=True)
+    result = subprocess.run(command, check=True, env=PostgresEnv(password))
     
     with open(tempFilepath, 'r') as infile, open(filePath, 'w') as outfile:
         for line in infile:
@@ -21,27 +21,20 @@ class PostgresBackup(APIView):
         postgresUser=request.query_params.get("postgres_user",None)
         postgresPassword=request.query_params.get("postgres_password",None)
         
-        conn = psycopg2.connect(
-            dbname = "postgres",
-            user = postgresUser,
-            password = postgresPassword,
-            host = postgresHost,
-            port = postgresPort
-        )
-        cur = conn.cursor()
-        
-        # Fetch databases
-        cur.execute("SELECT datname, pg_database_size(datname) AS size_in_bytes FROM pg_database WHERE datistemplate = false;")
-        databases = cur.fetchall()
-        cur.execute("""
-            SELECT SUM(pg_database_size(datname)) AS total_size_in_bytes
-            FROM pg_database
-            WHERE datistemplate = false;
-        """)
-        total_size = cur.fetchone()[0]
-        
-        cur.close()
-        conn.close()
+        with ControlConnection(postgresUser, postgresHost, postgresPort, postgresPassword) as conn:
+            cur = conn.cursor()
+            
+            # Fetch databases
+            cur.execute("SELECT datname, pg_database_size(datname) AS size_in_bytes FROM pg_database WHERE datistemplate = false;")
+            databases = cur.fetchall()
+            cur.execute("""
+                SELECT SUM(pg_database_size(datname)) AS total_size_in_bytes
+                FROM pg_database
+                WHERE datistemplate = false;
+            """)
+            total_size = cur.fetchone()[0]
+            
+            cur.close()
         
         result = []
         for db in databases:
@@ -79,11 +72,34 @@ class PostgresBackup(APIView):
         remoteUser = request.data.get('remote_user',None)
         remotePassword = request.data.get('remote_password',None)
         isRemote = request.data.get('remote',None)
-        
-        
-        if backupType.lower() == "server":
-            schemaPath = ServerSchemaBackup(postgresUser, postgresHost, postgresPort, postgresPassword, backupPath, isRemote, remoteHost, remoteUser, remotePassword)
-            dataPath =  ServerDataBackup(postgresUser, postgresHost, postgresPort, postgresPassword, backupPath, isRemote, remoteHost, remoteUser, remotePassword)
+
+        dumpFormat = request.data.get('dump_format',"plain")
+        jobs = request.data.get('jobs',None)
+        parallelDatabases = request.data.get('parallel_databases',None)
+        compress = request.data.get('compress',False)
+        workers = request.data.get('workers',None)
+        incremental = request.data.get('incremental',False)
+        copyFormat = request.data.get('format',"csv")
+
+        if backupType.lower() == "server" and dumpFormat.lower() == "directory":
+            backupDir = ServerParallelBackup(postgresUser, postgresHost, postgresPort, postgresPassword, backupPath, jobs, parallelDatabases, isRemote, remoteHost, remoteUser, remotePassword)
+            if backupDir:
+                return Response({
+                    "status":True,
+                    "message":"Backup successfull.",
+                    "backupDirectory":backupDir,
+                    "error":None
+                }, status=status.HTTP_200_OK)
+            else:
+                return Response({
+                    "status":False,
+                    "message":"Backup failed.",
+                    "backupDirectory":None,
+                    "error":"Parallel backup operation failed"
+                }, status=status.HTTP_400_BAD_REQUEST)
+        elif backupType.lower() == "server":
+            schemaPath = ServerSchemaBackup(postgresUser, postgresHost, postgresPort, postgresPassword, backupPath, isRemote, remoteHost, remoteUser, remotePassword, compress)
+            dataPath =  ServerDataBackup(postgresUser, postgresHost, postgresPort, postgresPassword, backupPath, isRemote, remoteHost, remoteUser, remotePassword, compress)
             if schemaPath and dataPath:
                 payload = {
                     "status":True,
@@ -102,6 +118,53 @@ class PostgresBackup(APIView):
                     "error": "Backup operation failed"
                 }
                 return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+        elif backupType.lower() == "chunked":
+            # Whole tables, large ones split into ranges exported concurrently
+            backupDir, result = ChunkedDatabaseBackup(postgresUser, postgresHost, postgresPort, postgresPassword, dbName, backupPath, request.data.get('tables',None), request.data.get('chunk_size',None), workers, copyFormat, isRemote, remoteHost, remoteUser, remotePassword)
+            if not backupDir:
+                return Response({
+                    "status": False,
+                    "message": "Backup failed.",
+                    "backupDirectory": None,
+                    "error": next(item["error"] for item in result if item["status"] is False)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({
+                "status": True,
+                "message": "Backup successful.",
+                "backupDirectory": backupDir,
+                "schemaFilePath": os.path.join(backupDir, "schema.sql"),
+                "chunks": len(result),
+                "error": None
+            }, status=status.HTTP_200_OK)
+        elif backupType.lower() == "physical":
+            walPath = None
+            if request.data.get('wal_archive',False):
+                # The slot and receiver come first so no WAL after the base backup can be recycled before it is archived
+                walPath = StartWalArchiver(postgresUser, postgresHost, postgresPort, postgresPassword, backupPath, isRemote, remoteHost, remoteUser, remotePassword)
+                if not walPath:
+                    return Response({
+                        "status":False,
+                        "message":"Backup failed.",
+                        "backupDirectory":None,
+                        "error":"WAL archiver could not be started"
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            backupDir = PhysicalBaseBackup(postgresUser, postgresHost, postgresPort, postgresPassword, backupPath, isRemote, remoteHost, remoteUser, remotePassword)
+            if backupDir:
+                return Response({
+                    "status":True,
+                    "message":"Backup successfull.",
+                    "backupDirectory":backupDir,
+                    "walArchivePath":walPath,
+                    "error":None
+                }, status=status.HTTP_200_OK)
+            else:
+                return Response({
+                    "status":False,
+                    "message":"Backup failed.",
+                    "backupDirectory":None,
+                    "error":"Physical backup operation failed"
+                }, status=status.HTTP_400_BAD_REQUEST)
         elif backupType.lower() == "database":
             # if DatabaseSchemaBackup(POSTGRES_USER, POSTGRES_HOST, POSTGRES_PORT, POSTGRES_PASSWORD, dbName, backupPath):
             #     payload = {
@@ -112,14 +175,31 @@ class PostgresBackup(APIView):
             #     }
             #     return Response(payload, status=status.HTTP_200_OK)
             
-            if isRemote:
+            if incremental:
+                # Only rows changed since the last recorded watermark
+                deltaPath, result = IncrementalCaseBackup(postgresUser, postgresHost, postgresPort, postgresPassword, dbName, backupPath, isRemote, remoteHost, remoteUser, remotePassword, workers)
+                if not deltaPath:
+                    return Response({
+                        "status": False,
+                        "message": "Incremental backup failed.",
+                        "error": next(item["error"] for item in result if item["status"] is False)
+                    }, status=status.HTTP_400_BAD_REQUEST)
+
+                return Response({
+                    "status": True,
+                    "message": "Incremental backup successful.",
+                    "backup_path": deltaPath,
+                    "watermark": result[0]["window_end"],
+                    "error": None
+                }, status=status.HTTP_200_OK)
+            elif isRemote:
                 # Backing up data with queries
-                result = BackupCaseQueryRemote(startTime, endTime, postgresUser, postgresHost, postgresPort, postgresPassword, dbName, backupPath, remoteHost, remoteUser, remotePassword)
+                result = BackupCaseQueryRemote(startTime, endTime, postgresUser, postgresHost, postgresPort, postgresPassword, dbName, backupPath, remoteHost, remoteUser, remotePassword, workers, copyFormat=copyFormat)
                 if any(item["status"] is False for item in result):
                     return Response({
                         "status": False,
                         "message": "Backup failed.",
-                        "error": result[0]["error"]  # Provide the first error encountered
+                        "error": next(item["error"] for item in result if item["status"] is False)  # Provide the first error encountered
                     }, status=status.HTTP_400_BAD_REQUEST)
 
                 # Return success response
@@ -131,9 +211,14 @@ class PostgresBackup(APIView):
                 }, status=status.HTTP_200_OK)    
             else:
                 if startTime is not None and endTime is not None:
-                    queryResults = LocalCaseQuery(startTime, endTime, postgresUser, postgresHost, postgresPort, postgresPassword, dbName, backupPath)
-                    for query_info in queryResults:
-                        RunPsql(query_info["query"], query_info["output_file"], postgresUser, postgresHost, postgresPort, dbName)    
+                    queryResults = LocalCaseQuery(startTime, endTime, postgresUser, postgresHost, postgresPort, postgresPassword, dbName, backupPath, workers, copyFormat=copyFormat)
+                    if any(item["status"] is False for item in queryResults):
+                        return Response({
+                            "status":False,
+                            "message":"Backup failed.",
+                            "data":None,
+                            "error":next(item["error"] for item in queryResults if item["status"] is False)
+                        }, status=status.HTTP_400_BAD_REQUEST)
                     
                     return Response({
                         "status":True,
@@ -150,6 +235,34 @@ class PostgresBackup(APIView):
                     }, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CaseWindowEstimate(APIView):
+    def get(self, request):
+        postgresHost= request.query_params.get("postgres_host",None)
+        postgresPort=request.query_params.get("postgres_port",None)
+        postgresUser=request.query_params.get("postgres_user",None)
+        postgresPassword=request.query_params.get("postgres_password",None)
+        dbName = request.query_params.get("database_name",None)
+        startTime = request.query_params.get('start_time',None)
+        endTime = request.query_params.get('end_time',None)
+        refresh = request.query_params.get('refresh',"false").lower() == "true"
+
+        try:
+            estimate = EstimateCaseWindow(startTime, endTime, postgresUser, postgresHost, postgresPort, postgresPassword, dbName, refresh)
+        except Exception as e:
+            return Response({
+                "status":False,
+                "message":"Estimate failed.",
+                "data":None,
+                "error":str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            "status":True,
+            "message":"Estimated case window export.",
+            "data":estimate,
+            "error":None
+        }, status=status.HTTP_200_OK)
+
 class PostgresRestoreServer(APIView):
     def post(self, request):
         postgresHost= request.data.get("postgres_host",None)
@@ -164,7 +277,48 @@ class PostgresRestoreServer(APIView):
         remoteUser = request.data.get('remote_user',None)
         remotePassword = request.data.get('remote_password',None)
         isRemote = request.data.get('remote',None)
-        
+
+        backupDir = request.data.get("backup_directory",None)
+        jobs = request.data.get('jobs',None)
+        parallelDatabases = request.data.get('parallel_databases',None)
+        dbName = request.data.get("database_name",None)
+        tables = request.data.get("tables",None)
+
+        if dbName and filePath:
+            # Seek straight to one database section, or to some of its tables, using the dump index
+            if RestoreFromDumpIndex(postgresUser, postgresHost, postgresPort, postgresPassword, filePath, dbName, tables, isRemote, remoteHost, remoteUser, remotePassword):
+                return Response({
+                    "status":True,
+                    "message":"Database restored successfully from path.",
+                    "database_name":dbName,
+                    "tables":tables,
+                    "error":None
+                }, status=status.HTTP_200_OK)
+            else:
+                return Response({
+                    "status":False,
+                    "message":"Selective restoration failed.",
+                    "data":None,
+                    "error":"Error restoring database or tables from dump."
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        if backupDir:
+            # Directory/custom format dumps restored with parallel pg_restore
+            if ServerParallelRestore(postgresUser, postgresHost, postgresPort, postgresPassword, backupDir, jobs, parallelDatabases, isRemote, remoteHost, remoteUser, remotePassword):
+                return Response({
+                    "status":True,
+                    "message":"Server restored successfully from path.",
+                    "backup_directory":backupDir,
+                    "error":None
+                }, status=status.HTTP_200_OK)
+            else:
+                return Response({
+                    "status":False,
+                    "message":"Server restoration failed.",
+                    "data":None,
+                    "error":"Error restoring databases from backup directory."
+                }, status=status.HTTP_400_BAD_REQUEST)
+
         if not isRemote:
             # Restore for local
             if filePath and schemaPath:
@@ -196,19 +350,20 @@ class PostgresRestoreServer(APIView):
                 }
                 return Response(payload, status=status.HTTP_400_BAD_REQUEST)
         else:
-            if RestoreServerFromRemote(remote_host=remoteHost, remote_user=remoteUser, remote_password=remotePassword, local_host=postgresHost, db_user=postgresUser, db_port=postgresPort, db_password=postgresPassword, schema_file_path=schemaPath, data_file_path=filePath):
+            restored, report = RestoreServerFromRemote(remote_host=remoteHost, remote_user=remoteUser, remote_password=remotePassword, local_host=postgresHost, db_user=postgresUser, db_port=postgresPort, db_password=postgresPassword, schema_file_path=schemaPath, data_file_path=filePath, parallel_databases=parallelDatabases)
+            if restored:
                 return Response({
                     "status":True,
                     "message":"Server Restored Successfully",
-                    "data":None,
+                    "data":report,
                     "error":None
                 }, status=status.HTTP_200_OK)
             else:
                 return Response({
                     "status":False,
                     "message":"Server Restored Failed",
-                    "data":None,
-                    "error":None
+                    "data":report,
+                    "error":report.get("error")
                 }, status=status.HTTP_400_BAD_REQUEST)
 
 class CaseMMRestoreSchemaWithData(APIView):
@@ -226,17 +381,71 @@ class CaseMMRestoreSchemaWithData(APIView):
         remoteUser = request.data.get('remote_user',None)
         remotePassword = request.data.get('remote_password',None)
         isRemote = request.data.get('remote',None)
-        
+        incremental = request.data.get('incremental',False)
+        copyFormat = request.data.get('format',"csv")
+        workers = request.data.get('workers',None)
+        maintenanceWorkMem = request.data.get('maintenance_work_mem',None)
+        useTemplate = request.data.get('use_template',False)
+
+        if incremental:
+            # csv_file_path points at the incremental backup directory holding chain.json
+            if schemaFilePath and not isRemote:
+                if not RestoreSchemaForDatabase(postgresUser, postgresHost, postgresPort, dbName, postgresPassword, schemaFilePath):
+                    return Response({
+                        "status":False,
+                        "message":"Schema restoration failed.",
+                        "dbname":dbName,
+                        "error":"Incremental restore will not proceed."
+                    }, status=status.HTTP_400_BAD_REQUEST)
+            if RestoreCaseDeltaChain(postgresUser, postgresHost, postgresPort, dbName, postgresPassword, dataFilePath, isRemote, remoteHost, remoteUser, remotePassword):
+                return Response({
+                    "status":True,
+                    "message":"Incremental backups replayed successfully",
+                    "dbname":dbName,
+                    "error":None
+                }, status=status.HTTP_200_OK)
+            else:
+                return Response({
+                    "status":False,
+                    "message":"Incremental restore failed.",
+                    "dbname":dbName,
+                    "error":"Error replaying incremental backups."
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        if useTemplate:
+            # Repeat restores of the same backup are cloned from a template database
+            backupId = request.data.get('backup_id',None) or f"{remoteHost if isRemote else 'local'}:{schemaFilePath}:{dataFilePath}:{copyFormat}"
+            if isRemote:
+                restoreInto = lambda target: RestoreCaseQueryFromRemote(remoteHost, remoteUser, remotePassword, postgresHost, postgresUser, postgresPort, postgresPassword, target, schemaFilePath, dataFilePath, workers, copyFormat, maintenanceWorkMem)
+            else:
+                restoreInto = lambda target: RestoreCaseQueryData(postgresUser, postgresHost, postgresPort, target, postgresPassword, schemaFilePath, dataFilePath, workers, copyFormat, maintenanceWorkMem)
+            restored, fromTemplate = RestoreCaseThroughTemplate(postgresUser, postgresHost, postgresPort, postgresPassword, dbName, backupId, restoreInto, request.data.get('template_max_age_hours',None), request.data.get('template_max_bytes',None))
+            if restored:
+                return Response({
+                    "status":True,
+                    "message":"Case Data Restored Successfully",
+                    "dbname":dbName,
+                    "from_template":fromTemplate,
+                    "error":None
+                }, status=status.HTTP_200_OK)
+            else:
+                return Response({
+                    "status":False,
+                    "message":"Case data restoration failed.",
+                    "dbname":dbName,
+                    "error":"Error restoring through the template database."
+                }, status=status.HTTP_400_BAD_REQUEST)
+
         if not isRemote:
             if schemaFilePath:
                 # dbname = RestoreSchema(POSTGRES_USER, POSTGRES_HOST, POSTGRES_PORT, dbName, POSTGRES_PASSWORD, schemaFilePath)
-                tableNames = ExtractTableNames(schemaFilePath)
-                for tablename in tableNames:
-                    for csv_file in os.listdir(dataFilePath):
-                        if csv_file.endswith('.csv'):
-                            if csv_file.replace('.csv', '') == tablename:
-                                csv_file_path = os.path.join(dataFilePath, csv_file)
-                                RestoreCaseQueryData(postgresUser, postgresHost, postgresPort, dbName, postgresPassword ,tablename, csv_file_path, schemaFilePath)
+                if not RestoreCaseQueryData(postgresUser, postgresHost, postgresPort, dbName, postgresPassword, schemaFilePath, dataFilePath, workers, copyFormat, maintenanceWorkMem):
+                    return Response({
+                        "status":False,
+                        "message":"Case data restoration failed.",
+                        "dbname":dbName,
+                        "error":"Error loading one or more tables."
+                    }, status=status.HTTP_400_BAD_REQUEST)
 
                 return Response({
                     "status":True,
@@ -252,7 +461,7 @@ class CaseMMRestoreSchemaWithData(APIView):
                     "error":"Schema restoration will not proceed."
                 }, status=status.HTTP_400_BAD_REQUEST)
         else:
-            if RestoreCaseQueryFromRemote(remoteHost, remoteUser, remotePassword, postgresHost, postgresUser, postgresPort, postgresPassword, dbName, schemaFilePath, dataFilePath):
+            if RestoreCaseQueryFromRemote(remoteHost, remoteUser, remotePassword, postgresHost, postgresUser, postgresPort, postgresPassword, dbName, schemaFilePath, dataFilePath, workers, copyFormat, maintenanceWorkMem):
                 return Response({
                     "status":True,
                     "message":"Case Data Restored Successfully",
@@ -267,3 +476,191 @@ class CaseMMRestoreSchemaWithData(APIView):
                     "error":None
                 }, status=status.HTTP_200_OK)
 
+class PostgresWalArchive(APIView):
+    def post(self, request):
+        postgresHost= request.data.get("postgres_host",None)
+        postgresPort=request.data.get("postgres_port",None)
+        postgresUser=request.data.get("postgres_user",None)
+        postgresPassword=request.data.get("postgres_password",None)
+        backupPath = request.data.get("backup_file",None)
+
+        remoteHost = request.data.get('remote_host',None)
+        remoteUser = request.data.get('remote_user',None)
+        remotePassword = request.data.get('remote_password',None)
+        isRemote = request.data.get('remote',None)
+
+        walPath = StartWalArchiver(postgresUser, postgresHost, postgresPort, postgresPassword, backupPath, isRemote, remoteHost, remoteUser, remotePassword)
+        if walPath:
+            return Response({
+                "status":True,
+                "message":"WAL archiving started.",
+                "walArchivePath":walPath,
+                "error":None
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status":False,
+                "message":"WAL archiving could not be started.",
+                "walArchivePath":None,
+                "error":"Error starting pg_receivewal."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request):
+        postgresHost= request.data.get("postgres_host",None)
+        postgresPort=request.data.get("postgres_port",None)
+        backupPath = request.data.get("backup_file",None)
+
+        remoteHost = request.data.get('remote_host',None)
+        remoteUser = request.data.get('remote_user',None)
+        remotePassword = request.data.get('remote_password',None)
+        isRemote = request.data.get('remote',None)
+
+        walPath = StopWalArchiver(postgresHost, postgresPort, backupPath, isRemote, remoteHost, remoteUser, remotePassword)
+        if walPath:
+            return Response({
+                "status":True,
+                "message":"WAL archiving stopped.",
+                "walArchivePath":walPath,
+                "error":None
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status":False,
+                "message":"WAL archiving could not be stopped.",
+                "walArchivePath":None,
+                "error":"No running pg_receivewal found."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+class PostgresCaseCdc(APIView):
+    def get(self, request):
+        return Response({
+            "status":True,
+            "message":"CDC captures listed.",
+            "data":CaseCdcStatus(),
+            "error":None
+        }, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        postgresHost= request.data.get("postgres_host",None)
+        postgresPort=request.data.get("postgres_port",None)
+        postgresUser=request.data.get("postgres_user",None)
+        postgresPassword=request.data.get("postgres_password",None)
+        dbName = request.data.get("database_name",None)
+        segmentPath = request.data.get("segment_path",None)
+        slotName = request.data.get("slot_name",None)
+        segmentBytes = request.data.get("segment_bytes",None)
+        segmentSeconds = request.data.get("segment_seconds",None)
+
+        remoteHost = request.data.get('remote_host',None)
+        remoteUser = request.data.get('remote_user',None)
+        remotePassword = request.data.get('remote_password',None)
+        isRemote = request.data.get('remote',None)
+
+        slot = StartCaseCdc(postgresUser, postgresHost, postgresPort, postgresPassword, dbName, segmentPath, slotName, segmentBytes, segmentSeconds, isRemote, remoteHost, remoteUser, remotePassword)
+        if slot:
+            return Response({
+                "status":True,
+                "message":"CDC capture started.",
+                "slot":slot,
+                "segmentPath":segmentPath,
+                "error":None
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status":False,
+                "message":"CDC capture could not be started.",
+                "slot":None,
+                "error":"Error creating or reading the replication slot, check wal_level=logical."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    # Replay captured segments into a target database
+    def put(self, request):
+        postgresHost= request.data.get("postgres_host",None)
+        postgresPort=request.data.get("postgres_port",None)
+        postgresUser=request.data.get("postgres_user",None)
+        postgresPassword=request.data.get("postgres_password",None)
+        dbName = request.data.get("database_name",None)
+        segmentPath = request.data.get("segment_path",None)
+        afterLsn = request.data.get("after_lsn",None)
+
+        remoteHost = request.data.get('remote_host',None)
+        remoteUser = request.data.get('remote_user',None)
+        remotePassword = request.data.get('remote_password',None)
+        isRemote = request.data.get('remote',None)
+
+        lastLsn = ReplayCaseCdcSegments(postgresUser, postgresHost, postgresPort, postgresPassword, dbName, segmentPath, afterLsn, isRemote, remoteHost, remoteUser, remotePassword)
+        if lastLsn:
+            return Response({
+                "status":True,
+                "message":"CDC segments replayed.",
+                "lastLsn":lastLsn,
+                "error":None
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status":False,
+                "message":"CDC replay failed.",
+                "lastLsn":None,
+                "error":"Error applying CDC segments."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+    def delete(self, request):
+        postgresHost= request.data.get("postgres_host",None)
+        postgresPort=request.data.get("postgres_port",None)
+        postgresUser=request.data.get("postgres_user",None)
+        postgresPassword=request.data.get("postgres_password",None)
+        dbName = request.data.get("database_name",None)
+        dropSlot = request.data.get("drop_slot",False)
+
+        slot = StopCaseCdc(postgresUser, postgresHost, postgresPort, postgresPassword, dbName, dropSlot)
+        if slot:
+            return Response({
+                "status":True,
+                "message":"CDC capture stopped.",
+                "slot":slot,
+                "error":None
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status":False,
+                "message":"CDC capture could not be stopped.",
+                "slot":None,
+                "error":"No running CDC capture found."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+class PostgresPhysicalRestore(APIView):
+    def post(self, request):
+        backupDir = request.data.get("backup_directory",None)
+        walPath = request.data.get("wal_archive_path",None)
+        dataDir = request.data.get("data_directory",None)
+        targetTime = request.data.get("target_time",None)
+        startServer = request.data.get("start_server",False)
+        serverPort = request.data.get("server_port",None)
+
+        remoteHost = request.data.get('remote_host',None)
+        remoteUser = request.data.get('remote_user',None)
+        remotePassword = request.data.get('remote_password',None)
+        isRemote = request.data.get('remote',None)
+
+        if not (backupDir and walPath and dataDir):
+            return Response({
+                "status":False,
+                "message":"Backup directory, WAL archive path and data directory are required.",
+                "data":None,
+                "error":"Restoration will not proceed."
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        if RestorePhysicalBackup(backupDir, walPath, dataDir, targetTime, startServer, serverPort, isRemote, remoteHost, remoteUser, remotePassword):
+            return Response({
+                "status":True,
+                "message":"Data directory restored successfully.",
+                "data_directory":dataDir,
+                "error":None
+            }, status=status.HTTP_200_OK)
+        else:
+            return Response({
+                "status":False,
+                "message":"Physical restore failed.",
+                "data":None,
+                "error":"Error rebuilding data directory."
+            }, status=status.HTTP_400_BAD_REQUEST)
@@ -1,12 +1,26 @@
 from .views import *
 import paramiko
-from scp import SCPClient
 import re
 from cassandra.auth import PlainTextAuthProvider
-from cassandra.query import SimpleStatement
 from cassandra.cluster import Cluster
+from cassandra.policies import TokenAwarePolicy, DCAwareRoundRobinPolicy
+from cassandra.metadata import Murmur3Token
 import os
 import time
+import datetime
+import queue
+import threading
+import json
+import hashlib
+import shlex
+import subprocess
+import tarfile
+import io
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from django.core.cache import cache
+from minio.commonconfig import ComposeSource
+from minio.deleteobjects import DeleteObject
 
 def CreateSshClient(server, port, user, password):
     client = paramiko.SSHClient()
@@ -106,6 +120,116 @@ def GetEstimatedBackupSize(hostIP, username, password, keySpaces):
 
     return backupSizeEstimates, formattedTotalSize
 
+# Size inventory: one nodetool tablestats per node, summed across nodes and cached
+# Entries older than SIZE_INVENTORY_TTL are still served while a background thread refreshes them
+SIZE_INVENTORY_TTL = 300
+SIZE_INVENTORY_MAX_AGE = 3600
+_inventoryRefreshes = set()
+_inventoryRefreshLock = threading.Lock()
+
+# {keyspace: {table: bytes}} from nodetool tablestats output
+def ParseTableStats(output):
+    inventory = {}
+    keySpace = None
+    tableName = None
+    for line in output.splitlines():
+        line = line.strip()
+        keySpaceMatch = re.match(r'Keyspace\s*:\s*(\S+)', line)
+        if keySpaceMatch:
+            keySpace = keySpaceMatch.group(1)
+            inventory.setdefault(keySpace, {})
+            tableName = None
+            continue
+        tableMatch = re.match(r'Table(?: \(index\))?\s*:\s*(\S+)', line)
+        if tableMatch and keySpace:
+            tableName = tableMatch.group(1)
+            inventory[keySpace][tableName] = 0
+            continue
+        sizeMatch = re.match(r'Space used \(total\)\s*:\s*(\d+)', line)
+        if sizeMatch and keySpace and tableName:
+            inventory[keySpace][tableName] = int(sizeMatch.group(1))
+    return inventory
+
+def NodeTableStats(hostIP, username, password):
+    sshClient = CreateSshClient(hostIP, 22, username, password)
+    try:
+        stdin, stdout, stderr = sshClient.exec_command("nodetool tablestats")
+        output = stdout.read().decode()
+        if stdout.channel.recv_exit_status() != 0:
+            raise Exception(f"nodetool tablestats failed on {hostIP}: {stderr.read().decode().strip()}")
+        return ParseTableStats(output)
+    finally:
+        sshClient.close()
+
+def BuildSizeInventory(endPoints, username, password):
+    keySpaces = {}
+    nodes = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(endPoints))) as executor:
+        futures = {node: executor.submit(NodeTableStats, node, username, password) for node in endPoints}
+        for node, future in futures.items():
+            try:
+                nodeInventory = future.result()
+            except Exception as e:
+                print(f"Error reading table sizes from {node}: {e}")
+                nodes[node] = {"bytes": None, "error": str(e)}
+                continue
+            nodeBytes = 0
+            for keySpace, tables in nodeInventory.items():
+                entry = keySpaces.setdefault(keySpace, {"bytes": 0, "tables": {}})
+                for tableName, tableBytes in tables.items():
+                    entry["tables"][tableName] = entry["tables"].get(tableName, 0) + tableBytes
+                    entry["bytes"] += tableBytes
+                    nodeBytes += tableBytes
+            nodes[node] = {"bytes": nodeBytes, "error": None}
+
+    return {
+        "keyspaces": keySpaces,
+        "nodes": nodes,
+        "total_bytes": sum(entry["bytes"] for entry in keySpaces.values()),
+        "complete": all(node["error"] is None for node in nodes.values()),
+        "fetched_at": time.time()
+    }
+
+# Keyed on the credentials as well, so an inventory is only served to the user who could read it
+def SizeInventoryCacheKey(endPoints, username, password):
+    credentials = hashlib.sha256(f"{username}\0{password}".encode('utf-8')).hexdigest()
+    return "scylla_inventory:" + hashlib.sha256(f"{','.join(sorted(endPoints))}\0{username}\0{credentials}".encode('utf-8')).hexdigest()
+
+def RefreshSizeInventory(endPoints, username, password):
+    cacheKey = SizeInventoryCacheKey(endPoints, username, password)
+    inventory = BuildSizeInventory(endPoints, username, password)
+    # Keep the previous inventory when no node answered
+    if any(node["error"] is None for node in inventory["nodes"].values()):
+        cache.set(cacheKey, inventory, SIZE_INVENTORY_MAX_AGE)
+    return inventory
+
+def RefreshSizeInventoryInBackground(endPoints, username, password):
+    cacheKey = SizeInventoryCacheKey(endPoints, username, password)
+    with _inventoryRefreshLock:
+        if cacheKey in _inventoryRefreshes:
+            return
+        _inventoryRefreshes.add(cacheKey)
+
+    def Worker():
+        try:
+            RefreshSizeInventory(endPoints, username, password)
+        except Exception as e:
+            print(f"Error refreshing size inventory: {e}")
+        finally:
+            with _inventoryRefreshLock:
+                _inventoryRefreshes.discard(cacheKey)
+
+    threading.Thread(target=Worker, daemon=True).start()
+
+def GetSizeInventory(endPoints, username, password, refresh=False):
+    endPoints = NormalizeKeyspaces(endPoints)
+    cached = None if refresh else cache.get(SizeInventoryCacheKey(endPoints, username, password))
+    if cached is None:
+        return dict(RefreshSizeInventory(endPoints, username, password), cached=False)
+    if time.time() - cached["fetched_at"] > SIZE_INVENTORY_TTL:
+        RefreshSizeInventoryInBackground(endPoints, username, password)
+    return dict(cached, cached=True)
+
 def KeyspaceExists(host, username, password, keyspace):
     authProvider = PlainTextAuthProvider(username, password)
     cluster = Cluster([host], auth_provider=authProvider)
@@ -136,28 +260,6 @@ def CheckTablesExist(host, username, password, keyspace, tableName):
     finally:
         cluster.shutdown()
 
-def GetTableUuid(host, keyspace, tablename):
-    # Connect to the ScyllaDB cluster
-    cluster = Cluster([host])
-    session = cluster.connect()
-
-    # Switch to the desired keyspace
-    session.set_keyspace(keyspace)
-
-    # Query to get the UUID of the table
-    query = "SELECT id FROM system_schema.tables WHERE keyspace_name = %s AND table_name = %s"
-    statement = SimpleStatement(query)
-    result = session.execute(statement, (keyspace, tablename))
-
-    # Close the connection
-    cluster.shutdown()
-
-    # Check if we got a result
-    if result and len(result.current_rows) > 0:
-        return result[0].id  # Assuming `table_id` returns the UUID
-    else:
-        return None
-    
 def StartScylla(host, username, password):
     try:
         sshclient = CreateSshClient(host, 22, username, password)
@@ -169,69 +271,7 @@ def StartScylla(host, username, password):
     except Exception as e:
         print(e)
 
-def CopyFilesToDestination(host, username, password, sourcePath):
-    temp_path = "/tmp/scylla_tmp"
-    try:
-        sshClient = CreateSshClient(host, 22, username, password)
-        stdin, stdout, stderr = sshClient.exec_command(f"mkdir -p {temp_path}")
-        CheckForErrors(stdout, stderr)
-        
-        with SCPClient(sshClient.get_transport()) as scp:
-            # List files in the local source directory
-            local_files = os.listdir(sourcePath)
-            # print("Files to copy:", local_files)
-
-            for file in local_files:
-                local_file_path = os.path.join(sourcePath, file)
-                remote_file_path = os.path.join(temp_path, file)
-                print(f"Copying {file} to {remote_file_path}...")
-                # Copy file to the remote destination
-                try:
-                    scp.put(local_file_path, remote_file_path)
-                    print(f"Successfully copied {file} to {remote_file_path}")
-                except Exception as e:
-                    print(f"Error copying {file}: {e}")
-    except Exception as e:
-        print(f"SSH connection failed: {e}")
-        return False
-    finally:
-        sshClient.close()
-
-def ChangeOwnership(host, username, password):
-    try:
-        sshClient = CreateSshClient(host, 22, username, password)
-        tempPath = "/tmp/scylla_tmp"
-        command = f'echo {password} | sudo -S chown scylla:scylla {tempPath}/*'
-        stdin, stdout, stderr = sshClient.exec_command(command)
-        CheckForErrors(stdout, stderr)
-            
-    except Exception as e:
-        print(f"SSH connection failed: {e}")
-        return False
-    finally:
-        if sshClient:
-            sshClient.close()
-
-def MoveFiles(host, username, password, keyspace, tablename):
-    try:
-        with CreateSshClient(host, 22, username, password) as sshClient:
-            tempPath = "/tmp/scylla_tmp"
-            uuid= GetTableUuid(host, keyspace, tablename)
-            tableid = str(uuid).replace("-", "")
-            destinationPath = f"/var/lib/scylla/data/{keyspace}/{tablename}-{tableid}"
-
-            command = f'echo {password} | sudo -S mv "{tempPath}"/* "{destinationPath}"'
-            stdin, stdout, stderr = sshClient.exec_command(command)
-            CheckForErrors(stdout, stderr)
-            command = f'echo {password} | sudo -S rm -rf "{tempPath}"'
-            stdin, stdout, stderr = sshClient.exec_command(command)
-            CheckForErrors(stdout, stderr)
-            
-    except Exception as e:
-        print(f"SSH connection failed: {e}")
-        return False
-
-def CaptureDataForSingleTable(host, username, password, keyspace, tablename, backupPath):
+def CaptureDataForSingleTable(host, username, password, keyspace, tablename, backupPath, transferMode="sftp", compression="zstd"):
     sshClient = CreateSshClient(host, 22, username, password)
     
     snapshot_tag = f"{tablename}_snapshot"
@@ -260,6 +300,14 @@ def CaptureDataForSingleTable(host, username, password, keyspace, tablename, bac
 
     print(f"Snapshot directory found: {snapshot_dir}")
     
+    if backupPath and transferMode == "tar":
+        checksums = ReceiveTarStream(sshClient, snapshot_dir, ["."], backupPath, compression)
+        # Next to the table directory so a restore of backupPath does not pick it up
+        WriteChecksumFile(os.path.normpath(backupPath) + ".sha256", checksums)
+        sshClient.close()
+        print(f"Backup of table {tablename} completed successfully.")
+        return backupPath
+
     scpClient = paramiko.SFTPClient.from_transport(sshClient.get_transport())
     
     if backupPath:
@@ -279,159 +327,882 @@ def CaptureDataForSingleTable(host, username, password, keyspace, tablename, bac
     
     return backupPath if backupPath else None
 
-def RestoreDataForSingleTable(host, username, password, keyspace, tablename, backupPath):
+def RestoreDataForSingleTable(host, username, password, keyspace, tablename, backupPath, transferMode="sftp", compression="zstd"):
+    sshClient = None
     try:
-        sshClient= CreateSshClient(host, 22, username, password)
-        
-        if KeyspaceExists(host, username, password, keyspace):
-            if CheckTablesExist(host, username, password, keyspace):
-        
-                CopyFilesToDestination(host, username, password, backupPath)
-                time.sleep(2)
-                ChangeOwnership(host, username, password)
-                time.sleep(2)
-                MoveFiles(host, username, password, keyspace, tablename)
-            
-                print("Data restoration completed successfully.")
-                return True
-    
+        tableDirs = GetKeyspaceTableDirs(host, username, password, keyspace)
+        if tablename not in tableDirs:
+            print(f"Table {keyspace}.{tablename} does not exist.")
+            return False
+        sshClient = CreateSshClient(host, 22, username, password)
+        tableDir = tableDirs[tablename]
+        failed = RestoreStagedTables(sshClient, password, [{
+            "label": f"{keyspace}.{tablename}",
+            "local_dir": backupPath,
+            "staged_path": f"/tmp/scylla_tmp/{keyspace}/{tableDir}",
+            "destination": f"{SCYLLA_DATA_DIR}/{keyspace}/{tableDir}"
+        }], transferMode, compression)
+        if failed:
+            return False
+        print("Data restoration completed successfully.")
+        return True
     except Exception as e:
         print(f"An error occurred during restoration: {e}")
         return False
     finally:
         if sshClient:
-            sshClient.close() 
+            sshClient.close()
 
-def CaptureKeySpaceSnapshot(hostIP, username, password, keySpaces, backupPath=None):
-    snapshotResults = {}
-    
+SCYLLA_DATA_DIR = "/var/lib/scylla/data"
+SNAPSHOT_TRANSFER_STREAMS = 8
+
+# Keyspaces arrive as a list or a comma separated string
+def NormalizeKeyspaces(keySpaces):
+    if isinstance(keySpaces, str):
+        keySpaces = keySpaces.split(',')
+    return [keySpace.strip() for keySpace in keySpaces if keySpace and keySpace.strip()]
+
+# All files of one snapshot tag in the given keyspaces with a single remote find, largest first
+# pathPattern lists another per-table directory instead, such as the incremental_backups '*/backups/*'
+def ListSnapshotFiles(sshClient, keySpaces, snapshotTag, dataDir=SCYLLA_DATA_DIR, pathPattern=None):
+    roots = " ".join(f'"{dataDir}/{keySpace}"' for keySpace in keySpaces)
+    pathPattern = pathPattern or f"*/snapshots/{snapshotTag}/*"
+    command = f"find {roots} -path '{pathPattern}' -type f -printf '%s %p\\n'"
+    stdin, stdout, stderr = sshClient.exec_command(command)
+    output = stdout.read().decode()
+    errorOutput = stderr.read().decode()
+    if errorOutput:
+        print(f"Error listing snapshot files: {errorOutput}")
+
+    files = []
+    for line in output.splitlines():
+        size, remotePath = line.split(" ", 1)
+        # <dataDir>/<keyspace>/<table>-<uuid>/snapshots/<tag>/<file>
+        keySpace, tableDir = os.path.relpath(remotePath, dataDir).split("/")[:2]
+        files.append({"keyspace": keySpace, "table_dir": tableDir, "size": int(size), "remote_path": remotePath})
+    files.sort(key=lambda item: item["size"], reverse=True)
+    return files
+
+# Download files over several ssh connections at once, each worker takes the largest file still waiting
+def TransferSnapshotFiles(hostIP, username, password, files, localPathFor, streams=None):
+    streams = max(1, min(int(streams) if streams else SNAPSHOT_TRANSFER_STREAMS, len(files)))
+    pending = queue.Queue()
+    for item in files:
+        pending.put(item)
+    failures = []
+    lock = threading.Lock()
+
+    def Worker():
+        try:
+            sshClient = CreateSshClient(hostIP, 22, username, password)
+            sftpClient = sshClient.open_sftp()
+        except Exception as e:
+            # The other workers take over the queue, whatever nobody fetched is reported after join
+            print(f"Transfer stream to {hostIP} could not connect: {e}")
+            return
+        try:
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    return
+                localFilePath = localPathFor(item)
+                try:
+                    sftpClient.get(item["remote_path"], localFilePath)
+                    print(f"Transferred {item['remote_path']} to {localFilePath}")
+                except Exception as e:
+                    print(f"Error transferring {item['remote_path']}: {e}")
+                    with lock:
+                        failures.append({"remote_path": item["remote_path"], "error": str(e)})
+        finally:
+            sftpClient.close()
+            sshClient.close()
+
+    workers = [threading.Thread(target=Worker) for _ in range(streams)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    while not pending.empty():
+        item = pending.get_nowait()
+        failures.append({"remote_path": item["remote_path"], "error": "Not transferred, no transfer stream could connect."})
+    return failures
+
+# Tar-stream transfers: a whole directory tree travels as one tar over a single exec channel, compressed
+# on the sending side, so small SSTable components do not each cost a round trip. Both ends need the codec binary
+TAR_STREAM_CODECS = {
+    "zstd": ("zstd -1 -T0 -q -c", "zstd -d -q -c"),
+    "gzip": ("gzip -1 -c", "gzip -d -c"),
+    "none": (None, None)
+}
+TAR_STREAM_BLOCK = 1024 * 1024
+
+# pipefail so a failing tar is not hidden behind the exit status of the codec
+def RemotePipeline(command):
+    return f"bash -o pipefail -c {shlex.quote(command)}"
+
+def PumpStream(source, target, closeTarget=True):
+    try:
+        for block in iter(lambda: source.read(TAR_STREAM_BLOCK), b''):
+            target.write(block)
+    except (BrokenPipeError, OSError) as e:
+        print(f"Stream closed early: {e}")
+    finally:
+        if closeTarget:
+            target.close()
+
+class HashingReader:
+    def __init__(self, fileObj):
+        self.fileObj = fileObj
+        self.digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fileObj.read(size)
+        self.digest.update(data)
+        return data
+
+# Pull members of remoteRoot as one tar stream and unpack it under localRoot while hashing every file
+# Returns {path relative to localRoot: {size, sha256}}
+def ReceiveTarStream(sshClient, remoteRoot, members, localRoot, compression="zstd"):
+    compress, decompress = TAR_STREAM_CODECS[compression]
+    command = f"tar -C {shlex.quote(remoteRoot)} -cf - {' '.join(shlex.quote(member) for member in members)}"
+    if compress:
+        command += f" | {compress}"
+    stdin, stdout, stderr = sshClient.exec_command(RemotePipeline(command))
+
+    source = stdout
+    decoder = None
+    if decompress:
+        decoder = subprocess.Popen(shlex.split(decompress), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        feeder = threading.Thread(target=PumpStream, args=(stdout, decoder.stdin), daemon=True)
+        feeder.start()
+        source = decoder.stdout
+
+    localRoot = os.path.abspath(localRoot)
+    checksums = {}
     try:
+        with tarfile.open(fileobj=source, mode='r|') as archive:
+            for member in archive:
+                target = os.path.abspath(os.path.join(localRoot, member.name))
+                if os.path.commonpath([localRoot, target]) != localRoot:
+                    raise Exception(f"Refusing to unpack {member.name} outside {localRoot}")
+                if member.isdir():
+                    os.makedirs(target, exist_ok=True)
+                    continue
+                if not member.isfile():
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                digest = hashlib.sha256()
+                with archive.extractfile(member) as memberFile, open(target, 'wb') as outputFile:
+                    for block in iter(lambda: memberFile.read(TAR_STREAM_BLOCK), b''):
+                        digest.update(block)
+                        outputFile.write(block)
+                checksums[os.path.relpath(target, localRoot)] = {"size": member.size, "sha256": digest.hexdigest()}
+        # tar pads the archive past its end marker, drain it so neither side blocks
+        for _ in iter(lambda: source.read(TAR_STREAM_BLOCK), b''):
+            pass
+    finally:
+        if decoder:
+            decoder.stdout.close()
+            feeder.join()
+            decoder.wait()
+
+    if stdout.channel.recv_exit_status() != 0:
+        raise Exception(f"Remote tar failed: {stderr.read().decode().strip()}")
+    if decoder and decoder.returncode != 0:
+        raise Exception(f"Local {compression} decompression failed with exit code {decoder.returncode}")
+    return checksums
+
+# Push fileNames from localDir as one tar stream into remoteDir, checksums are taken while sending and
+# checked on the node with sha256sum afterwards
+def SendTarStream(sshClient, localDir, fileNames, remoteDir, compression="zstd"):
+    compress, decompress = TAR_STREAM_CODECS[compression]
+    command = f"mkdir -p {shlex.quote(remoteDir)} && " + (f"{decompress} | " if decompress else "") + f"tar -C {shlex.quote(remoteDir)} -xf -"
+    stdin, stdout, stderr = sshClient.exec_command(RemotePipeline(command))
+    checksums = {}
+
+    def WriteArchive(target):
+        with tarfile.open(fileobj=target, mode='w|') as archive:
+            for fileName in fileNames:
+                localFilePath = os.path.join(localDir, fileName)
+                tarInfo = archive.gettarinfo(localFilePath, arcname=fileName)
+                with open(localFilePath, 'rb') as inputFile:
+                    reader = HashingReader(inputFile)
+                    archive.addfile(tarInfo, reader)
+                checksums[fileName] = {"size": tarInfo.size, "sha256": reader.digest.hexdigest()}
+
+    if compress:
+        encoder = subprocess.Popen(shlex.split(compress), stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        pump = threading.Thread(target=PumpStream, args=(encoder.stdout, stdin, False), daemon=True)
+        pump.start()
+        try:
+            WriteArchive(encoder.stdin)
+        finally:
+            encoder.stdin.close()
+            pump.join()
+            encoder.wait()
+        if encoder.returncode != 0:
+            raise Exception(f"Local {compression} compression failed with exit code {encoder.returncode}")
+    else:
+        WriteArchive(stdin)
+    stdin.channel.shutdown_write()
+    if stdout.channel.recv_exit_status() != 0:
+        raise Exception(f"Remote tar failed: {stderr.read().decode().strip()}")
+
+    stdin, stdout, stderr = sshClient.exec_command(f"cd {shlex.quote(remoteDir)} && sha256sum --quiet -c -")
+    stdin.write("".join(f"{checksums[fileName]['sha256']}  {fileName}\n" for fileName in fileNames))
+    stdin.channel.shutdown_write()
+    if stdout.channel.recv_exit_status() != 0:
+        raise Exception(f"Checksum mismatch in {remoteDir}: {stdout.read().decode().strip()}")
+    return checksums
+
+# sha256sum -c compatible listing, paths relative to the directory the checksums were taken in
+def WriteChecksumFile(path, checksums):
+    with open(path, 'w') as checksumFile:
+        for name in sorted(checksums):
+            checksumFile.write(f"{checksums[name]['sha256']}  {name}\n")
+
+# Table snapshot directories spread over the streams by size, each stream is one tar on its own connection
+def TarTransferSnapshotTables(hostIP, username, password, files, backupPath, snapshotTag, streams=None, compression="zstd"):
+    tableBytes = {}
+    for item in files:
+        member = f"{item['keyspace']}/{item['table_dir']}/snapshots/{snapshotTag}"
+        tableBytes[member] = tableBytes.get(member, 0) + item["size"]
+    streams = max(1, min(int(streams) if streams else SNAPSHOT_TRANSFER_STREAMS, len(tableBytes)))
+    groups = [[] for _ in range(streams)]
+    groupBytes = [0] * streams
+    for member, size in sorted(tableBytes.items(), key=lambda entry: entry[1], reverse=True):
+        index = groupBytes.index(min(groupBytes))
+        groups[index].append(member)
+        groupBytes[index] += size
+
+    def Transfer(members):
         sshClient = CreateSshClient(hostIP, 22, username, password)
-        sftpClient = sshClient.open_sftp()
-        for keySpace in keySpaces:
-            command = f'nodetool snapshot -t {keySpace} {keySpace}'
-            stdin, stdout, stderr = sshClient.exec_command(command)
-            
-            # Read stdout and stderr
-            stdoutOutput = stdout.read().decode()
-            errorOutput = stderr.read().decode()
+        try:
+            return ReceiveTarStream(sshClient, SCYLLA_DATA_DIR, members, backupPath, compression)
+        finally:
+            sshClient.close()
 
-            print(stdoutOutput)
-            if errorOutput:
-                print(errorOutput)
-
-            snapshotIdMatch = re.search(r'snapshot name \[(\S+)\]', stdoutOutput)
-            if snapshotIdMatch:
-                snapshotId = snapshotIdMatch.group(1)
-                print(f"Snapshot for keyspace '{keySpace}' taken successfully. Snapshot ID: {snapshotId}")
-                
-                basePath = f"/var/lib/scylla/data/{keySpace}/"
-                
-                # List all tables in the keyspace
-                listTablesCommand = f'ls {basePath}'
-                stdin, stdout, stderr = sshClient.exec_command(listTablesCommand)
-                tablePaths = stdout.read().decode().splitlines()
-                
-                snapshotPaths = []
-                localSnapshotPaths = []
-                for tablePath in tablePaths:
-                    tableUUIDMatch = re.search(r'-(\S+)', tablePath)
-                    if tableUUIDMatch:
-                        tableUUID = tableUUIDMatch.group(1)
-                        
-                    # Construct the path to the snapshot for each table
-                    snapshotPath = f"{basePath}{tablePath}/snapshots/{snapshotId}/"
-                    if CheckDirExists(sshClient, snapshotPath):
-                        snapshotPaths.append((snapshotPath, tableUUID))
-                        
-                        if backupPath:
-                            localTableBackupPath = os.path.join(backupPath, keySpace, tablePath, "snapshots", snapshotId)
-                            os.makedirs(localTableBackupPath, exist_ok=True)
-
-                            # Copy each file from the remote snapshot directory to the local machine
-                            remoteFiles = sftpClient.listdir(snapshotPath)
-                            for remoteFile in remoteFiles:
-                                remoteFilePath = os.path.join(snapshotPath, remoteFile)
-                                localFilePath = os.path.join(localTableBackupPath, remoteFile)
-                                sftpClient.get(remoteFilePath, localFilePath)  # Transfer file
-                                print(f"Transferred {remoteFilePath} to {localFilePath}")
-                            localSnapshotPaths.append(localTableBackupPath)
-
-                print(snapshotPaths)
-                snapshotResults = {
-                    'remote_paths': snapshotPaths,
-                    'local_paths': localSnapshotPaths if backupPath else None
-                }
+    failures = []
+    checksums = {}
+    with ThreadPoolExecutor(max_workers=streams) as executor:
+        futures = [(members, executor.submit(Transfer, members)) for members in groups]
+        for members, future in futures:
+            try:
+                checksums.update(future.result())
+            except Exception as e:
+                print(f"Error streaming {members}: {e}")
+                failures.extend({"remote_path": f"{SCYLLA_DATA_DIR}/{member}", "error": str(e)} for member in members)
+    return failures, checksums
+
+# Snapshot keyspaces on one node under one tag and list the files it produced
+def TakeNodeSnapshot(hostIP, username, password, keySpaces, snapshotTag):
+    sshClient = CreateSshClient(hostIP, 22, username, password)
+    try:
+        command = f'nodetool snapshot -t {snapshotTag} {" ".join(keySpaces)}'
+        stdin, stdout, stderr = sshClient.exec_command(command)
+        stdoutOutput = stdout.read().decode()
+        errorOutput = stderr.read().decode()
+        print(stdoutOutput)
+        if stdout.channel.recv_exit_status() != 0:
+            raise Exception(f"Snapshot failed on {hostIP}: {errorOutput.strip()}")
+        print(f"Snapshot {snapshotTag} taken on {hostIP} for keyspaces {keySpaces}.")
+        return ListSnapshotFiles(sshClient, keySpaces, snapshotTag)
+    finally:
+        sshClient.close()
+
+def ClearNodeSnapshot(hostIP, username, password, keySpaces, snapshotTag):
+    sshClient = CreateSshClient(hostIP, 22, username, password)
+    try:
+        stdin, stdout, stderr = sshClient.exec_command(f"nodetool clearsnapshot -t {snapshotTag} {' '.join(keySpaces)}")
+        CheckForErrors(stdout, stderr)
+        print(f"Snapshot {snapshotTag} cleared on {hostIP}.")
+    finally:
+        sshClient.close()
+
+def CaptureKeySpaceSnapshot(hostIP, username, password, keySpaces, backupPath=None, streams=None, transferMode="sftp", compression="zstd"):
+    keySpaces = NormalizeKeyspaces(keySpaces)
+    snapshotTag = f"backup_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+    try:
+        files = TakeNodeSnapshot(hostIP, username, password, keySpaces, snapshotTag)
+
+        snapshotResults = {"snapshot_tag": snapshotTag, "keyspaces": {}, "remote_paths": [], "local_paths": [] if backupPath else None, "snapshot_cleared": False}
+        for item in files:
+            keySpaceResult = snapshotResults["keyspaces"].setdefault(item["keyspace"], {"remote_paths": [], "local_paths": [] if backupPath else None, "files": 0, "bytes": 0})
+            snapshotPath = f"{SCYLLA_DATA_DIR}/{item['keyspace']}/{item['table_dir']}/snapshots/{snapshotTag}/"
+            tableUUID = item["table_dir"].rsplit("-", 1)[-1]
+            if (snapshotPath, tableUUID) not in keySpaceResult["remote_paths"]:
+                keySpaceResult["remote_paths"].append((snapshotPath, tableUUID))
+                snapshotResults["remote_paths"].append((snapshotPath, tableUUID))
+                if backupPath:
+                    localTableBackupPath = os.path.join(backupPath, item["keyspace"], item["table_dir"], "snapshots", snapshotTag)
+                    os.makedirs(localTableBackupPath, exist_ok=True)
+                    keySpaceResult["local_paths"].append(localTableBackupPath)
+                    snapshotResults["local_paths"].append(localTableBackupPath)
+            keySpaceResult["files"] += 1
+            keySpaceResult["bytes"] += item["size"]
+
+        if backupPath and files:
+            totalBytes = sum(item["size"] for item in files)
+            print(f"Transferring {len(files)} files ({FormatSize(totalBytes)}) for {len(keySpaces)} keyspaces.")
+
+            def LocalPathFor(item):
+                return os.path.join(backupPath, item["keyspace"], item["table_dir"], "snapshots", snapshotTag, os.path.basename(item["remote_path"]))
+
+            if transferMode == "tar":
+                snapshotResults["failed"], checksums = TarTransferSnapshotTables(hostIP, username, password, files, backupPath, snapshotTag, streams, compression)
+                snapshotResults["checksum_file"] = os.path.join(backupPath, f"{snapshotTag}.sha256")
+                WriteChecksumFile(snapshotResults["checksum_file"], checksums)
             else:
-                print("Error: Snapshot directory not found in the output.")
-                snapshotResults = None
-        
+                snapshotResults["failed"] = TransferSnapshotFiles(hostIP, username, password, files, LocalPathFor, streams)
+            if snapshotResults["failed"]:
+                print(f"{len(snapshotResults['failed'])} snapshot files failed to transfer.")
+            else:
+                try:
+                    ClearNodeSnapshot(hostIP, username, password, keySpaces, snapshotTag)
+                    # The snapshot directories are gone, only the local copies remain
+                    snapshotResults["remote_paths"] = []
+                    for keySpaceResult in snapshotResults["keyspaces"].values():
+                        keySpaceResult["remote_paths"] = []
+                    snapshotResults["snapshot_cleared"] = True
+                except Exception as e:
+                    print(f"Error clearing snapshot {snapshotTag} on {hostIP}: {e}")
+
         return snapshotResults
 
     except Exception as e:
         print(f"Error taking remote snapshot: {e}")
         return None
 
+# Snapshot every node of the ring with one shared tag, then pull all nodes at once into <backupPath>/<tag>/<node>/
+# The backup is only complete when every node's snapshot made it, manifest.json records which did
+def ClusterKeyspaceSnapshot(endPoints, username, password, keySpaces, backupPath, streams=None):
+    keySpaces = NormalizeKeyspaces(keySpaces)
+    if isinstance(endPoints, str):
+        endPoints = endPoints.split(',')
+    endPoints = [endPoint.strip() for endPoint in endPoints if endPoint.strip()]
+    snapshotTag = f"backup_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    backupDir = os.path.join(backupPath, snapshotTag)
+    nodes = {endPoint: {"status": False, "error": None, "files": []} for endPoint in endPoints}
+
+    def ClearNode(endPoint):
+        try:
+            ClearNodeSnapshot(endPoint, username, password, keySpaces, snapshotTag)
+        except Exception as e:
+            print(f"Error clearing snapshot {snapshotTag} on {endPoint}: {e}")
+            nodes[endPoint]["clear_error"] = str(e)
+
+    def SnapshotNode(endPoint):
+        try:
+            return TakeNodeSnapshot(endPoint, username, password, keySpaces, snapshotTag)
+        except Exception as e:
+            print(f"Error taking snapshot on {endPoint}: {e}")
+            nodes[endPoint]["error"] = str(e)
+            # Some keyspaces may already be snapshotted when nodetool failed
+            ClearNode(endPoint)
+            return None
+
+    def PullNode(endPoint, files):
+        nodeDir = os.path.join(backupDir, endPoint)
+        for item in files:
+            os.makedirs(os.path.join(nodeDir, item["keyspace"], item["table_dir"]), exist_ok=True)
+
+        def LocalPathFor(item):
+            return os.path.join(nodeDir, item["keyspace"], item["table_dir"], os.path.basename(item["remote_path"]))
+
+        failures = TransferSnapshotFiles(endPoint, username, password, files, LocalPathFor, streams) if files else []
+        nodes[endPoint]["files"] = [{
+            "keyspace": item["keyspace"],
+            "table": item["table_dir"].rsplit("-", 1)[0],
+            "table_dir": item["table_dir"],
+            "file": os.path.basename(item["remote_path"]),
+            "size": item["size"]
+        } for item in files]
+        if failures:
+            nodes[endPoint]["error"] = f"{len(failures)} files failed to transfer"
+            nodes[endPoint]["failed"] = failures
+            return
+        # Every file is stored locally, drop the hard links so the node does not keep the old SSTables around
+        ClearNode(endPoint)
+        nodes[endPoint]["status"] = True
+
+    # All snapshots are triggered together so the nodes are captured at nearly the same moment
+    with ThreadPoolExecutor(max_workers=max(1, len(endPoints))) as executor:
+        snapshotFiles = dict(zip(endPoints, executor.map(SnapshotNode, endPoints)))
+    with ThreadPoolExecutor(max_workers=max(1, len(endPoints))) as executor:
+        list(executor.map(lambda endPoint: PullNode(endPoint, snapshotFiles[endPoint]), [endPoint for endPoint in endPoints if snapshotFiles[endPoint] is not None]))
+
+    manifest = {
+        "snapshot_tag": snapshotTag,
+        "created_at": datetime.datetime.now().isoformat(),
+        "keyspaces": keySpaces,
+        "complete": all(node["status"] for node in nodes.values()),
+        "nodes": nodes
+    }
+    os.makedirs(backupDir, exist_ok=True)
+    with open(os.path.join(backupDir, "manifest.json"), 'w') as manifestFile:
+        json.dump(manifest, manifestFile, indent=2)
+    print(f"Cluster snapshot {snapshotTag} saved to {backupDir}, complete: {manifest['complete']}")
+    return backupDir, manifest
+
+# Incremental keyspace backups: catalog.json in backupPath remembers every SSTable component already stored
+SNAPSHOT_CATALOG_FILE = "catalog.json"
+
+def ReadSnapshotCatalog(backupPath):
+    try:
+        with open(os.path.join(backupPath, SNAPSHOT_CATALOG_FILE), 'r') as catalogFile:
+            return json.load(catalogFile)
+    except (IOError, OSError):
+        return {"files": {}, "backups": []}
+
+def WriteSnapshotCatalog(backupPath, catalog):
+    catalogPath = os.path.join(backupPath, SNAPSHOT_CATALOG_FILE)
+    with open(catalogPath + ".tmp", 'w') as catalogFile:
+        json.dump(catalog, catalogFile, indent=2)
+    os.replace(catalogPath + ".tmp", catalogPath)
+
+def FileChecksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as inputFile:
+        for block in iter(lambda: inputFile.read(4 * 1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# sha256 of files on the node, paths go through stdin so any number of files fits in one command
+def RemoteChecksums(hostIP, username, password, remotePaths):
+    if not remotePaths:
+        return {}
+    sshClient = CreateSshClient(hostIP, 22, username, password)
+    try:
+        stdin, stdout, stderr = sshClient.exec_command("xargs -d '\\n' sha256sum")
+        stdin.write("".join(f"{path}\n" for path in remotePaths))
+        stdin.channel.shutdown_write()
+        output = stdout.read().decode()
+        errorOutput = stderr.read().decode()
+        if errorOutput:
+            print(f"Error computing checksums on {hostIP}: {errorOutput.strip()}")
     finally:
         sshClient.close()
+    checksums = {}
+    for line in output.splitlines():
+        checksum, remotePath = line.split(" ", 1)
+        checksums[remotePath.lstrip(" *")] = checksum
+    return checksums
+
+# SSTables never change once written, so a component with the same table, name and size that is still stored
+# only gets hard-linked into the new backup directory, the rest is transferred. With verify, the node's file and
+# the stored copy are both hashed against the catalog checksum first, this reads every linked file on both sides.
+# With includeIncremental, SSTables flushed into backups/ but no longer in the snapshot land in
+# <tag>/<keyspace>/<table>/incremental/, they are a chain on top of the previous backups and not part of the snapshot
+def IncrementalKeyspaceBackup(hostIP, username, password, keySpaces, backupPath, streams=None, includeIncremental=False, verify=False):
+    keySpaces = NormalizeKeyspaces(keySpaces)
+    snapshotTag = f"backup_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    backupDir = os.path.join(backupPath, snapshotTag)
+    os.makedirs(backupPath, exist_ok=True)
+
+    try:
+        files = TakeNodeSnapshot(hostIP, username, password, keySpaces, snapshotTag)
+        harvested = []
+        if includeIncremental:
+            # Flushes hard-linked by incremental_backups since the last run
+            sshClient = CreateSshClient(hostIP, 22, username, password)
+            try:
+                harvested = ListSnapshotFiles(sshClient, keySpaces, None, pathPattern="*/backups/*")
+            finally:
+                sshClient.close()
+    except Exception as e:
+        print(f"Error taking remote snapshot: {e}")
+        return None
+
+    def CatalogKey(item):
+        return f"{item['keyspace']}/{item['table_dir']}/{os.path.basename(item['remote_path'])}"
+
+    def LocalPathFor(item):
+        if item.get("incremental"):
+            return os.path.join(backupDir, item["keyspace"], item["table_dir"], "incremental", os.path.basename(item["remote_path"]))
+        return os.path.join(backupDir, item["keyspace"], item["table_dir"], "snapshots", snapshotTag, os.path.basename(item["remote_path"]))
+
+    def StoredCopyValid(entry, item):
+        return entry["size"] == item["size"] and os.path.exists(entry["path"]) and os.path.getsize(entry["path"]) == entry["size"]
+
+    def ChecksumsMatch(entry, item):
+        if not entry.get("checksum"):
+            return False
+        return remoteChecksums.get(item["remote_path"]) == entry["checksum"] and FileChecksum(entry["path"]) == entry["checksum"]
+
+    # A flushed SSTable can be in the snapshot and in backups/ at the same time, the snapshot copy wins
+    unique = {}
+    for item in files:
+        unique.setdefault(CatalogKey(item), item)
+    for item in harvested:
+        if CatalogKey(item) not in unique:
+            unique[CatalogKey(item)] = dict(item, incremental=True)
+
+    catalog = ReadSnapshotCatalog(backupPath)
+    remoteChecksums = {}
+    if verify:
+        candidates = [item["remote_path"] for key, item in unique.items() if key in catalog["files"] and StoredCopyValid(catalog["files"][key], item)]
+        try:
+            remoteChecksums = RemoteChecksums(hostIP, username, password, candidates)
+        except Exception as e:
+            print(f"Error verifying stored files on {hostIP}: {e}")
+    verifiedFailed = 0
+    toTransfer = []
+    linkedBytes = 0
+    localPaths = set()
+    incrementalPaths = set()
+    for key, item in unique.items():
+        localFilePath = LocalPathFor(item)
+        os.makedirs(os.path.dirname(localFilePath), exist_ok=True)
+        (incrementalPaths if item.get("incremental") else localPaths).add(os.path.dirname(localFilePath))
+        entry = catalog["files"].get(key)
+        stored = entry is not None and StoredCopyValid(entry, item)
+        if stored and verify and not ChecksumsMatch(entry, item):
+            print(f"Stored copy of {key} does not match the node, transferring it again.")
+            verifiedFailed += 1
+            stored = False
+        elif entry and not stored:
+            print(f"Stored copy of {key} is missing or has the wrong size, transferring it again.")
+        if stored:
+            os.link(entry["path"], localFilePath)
+            entry["path"] = localFilePath
+            linkedBytes += item["size"]
+        else:
+            toTransfer.append(item)
+
+    print(f"{len(unique) - len(toTransfer)} files already stored, transferring {len(toTransfer)} new files.")
+    failures = TransferSnapshotFiles(hostIP, username, password, toTransfer, LocalPathFor, streams) if toTransfer else []
+    failedPaths = {failure["remote_path"] for failure in failures}
+    for item in toTransfer:
+        if item["remote_path"] in failedPaths:
+            continue
+        localFilePath = LocalPathFor(item)
+        if not os.path.exists(localFilePath):
+            failures.append({"remote_path": item["remote_path"], "error": "Transferred file is missing locally."})
+            failedPaths.add(item["remote_path"])
+            continue
+        catalog["files"][CatalogKey(item)] = {"size": item["size"], "checksum": FileChecksum(localFilePath), "path": localFilePath, "first_backup": snapshotTag}
+
+    result = {
+        "snapshot_tag": snapshotTag,
+        "backup_dir": backupDir,
+        "created_at": datetime.datetime.now().isoformat(),
+        "keyspaces": keySpaces,
+        "files": len(unique),
+        "transferred_files": len(toTransfer) - len(failures),
+        "transferred_bytes": sum(item["size"] for item in toTransfer if item["remote_path"] not in failedPaths),
+        "linked_files": len(unique) - len(toTransfer),
+        "linked_bytes": linkedBytes,
+        "verified": verify,
+        "verify_mismatches": verifiedFailed,
+        "local_paths": sorted(localPaths),
+        "incremental_paths": sorted(incrementalPaths),
+        "failed": failures
+    }
+    catalog["backups"].append({key: value for key, value in result.items() if key not in ("local_paths", "incremental_paths", "failed")})
+    WriteSnapshotCatalog(backupPath, catalog)
+
+    if not failures:
+        # Everything is stored locally, the node no longer needs to keep these hard links
+        ClearNodeSnapshot(hostIP, username, password, keySpaces, snapshotTag)
+        if harvested:
+            sshClient = CreateSshClient(hostIP, 22, username, password)
+            try:
+                sftpClient = sshClient.open_sftp()
+                for item in harvested:
+                    sftpClient.remove(item["remote_path"])
+                sftpClient.close()
+            finally:
+                sshClient.close()
+
+    print(f"Incremental backup {snapshotTag}: {result['transferred_files']} files transferred, {result['linked_files']} linked.")
+    return result
+
+# Direct push to MinIO: every node uploads its own snapshot with curl against presigned URLs,
+# Django only signs the requests, joins segmented files and writes the manifest into the bucket
+MINIO_PART_SIZE = 64 * 1024 * 1024
+MINIO_MAX_PARTS = 10000
+MINIO_UPLOAD_PARALLEL = 8
+# URLs are signed per batch right before the node runs it, so they only have to outlive one batch
+MINIO_PRESIGN_EXPIRY = datetime.timedelta(hours=1)
+MINIO_SIGN_BATCH_BYTES = 16 * 1024 * 1024 * 1024
+
+# Runs on the node once per job line: <job id> <file> <offset> <length> <url>, prints "<job id> <etag>"
+NODE_UPLOAD_SCRIPT = """#!/bin/bash
+etag=$(dd if="$2" bs=4M iflag=skip_bytes,count_bytes skip="$3" count="$4" status=none \\
+  | curl -sS --fail -H "Content-Length: $4" -H "Transfer-Encoding:" -H "Expect:" -T - -D - -o /dev/null "$5" \\
+  | tr -d '\r' | sed -n 's/^[Ee][Tt][Aa][Gg]: *//p')
+if [ -z "$etag" ]; then echo "upload failed: $1 $2" >&2; exit 1; fi
+echo "$1 $etag"
+"""
+
+def EnsureMinioBucket(client, bucketName):
+    # Imported here, MinioObjectStore.utils pulls in its views and must not be loaded half way through this module
+    from MinioObjectStore.utils import EnsureBucketExists, ValidateBucketName
+    if EnsureBucketExists(client, bucketName):
+        return True
+    if not ValidateBucketName(bucketName):
+        return False
+    client.make_bucket(bucketName)
+    print(f"Bucket '{bucketName}' created.")
+    return True
+
+# Upload jobs for one node, files above one part are uploaded as segment objects and joined with compose_object afterwards
+def PlanNodeUploads(objectPrefix, files):
+    uploads = []
+    jobs = []
+    for item in files:
+        objectName = f"{objectPrefix}/{item['keyspace']}/{item['table_dir']}/{os.path.basename(item['remote_path'])}"
+        upload = {"object": objectName, "item": item, "segments": []}
+        if item["size"] <= MINIO_PART_SIZE:
+            jobs.append({"id": f"{len(uploads)}.0", "remote_path": item["remote_path"], "offset": 0, "length": item["size"], "object": objectName})
+        else:
+            partSize = max(MINIO_PART_SIZE, -(-item["size"] // MINIO_MAX_PARTS))
+            for partNumber, offset in enumerate(range(0, item["size"], partSize), start=1):
+                segment = {"id": f"{len(uploads)}.{partNumber}", "remote_path": item["remote_path"], "offset": offset,
+                           "length": min(partSize, item["size"] - offset), "object": f"{objectName}.segment{partNumber:05d}"}
+                upload["segments"].append(segment)
+                jobs.append(segment)
+        uploads.append(upload)
+    return uploads, jobs
+
+def SignBatches(jobs):
+    batch = []
+    batchBytes = 0
+    for job in jobs:
+        if batch and batchBytes + job["length"] > MINIO_SIGN_BATCH_BYTES:
+            yield batch
+            batch = []
+            batchBytes = 0
+        batch.append(job)
+        batchBytes += job["length"]
+    if batch:
+        yield batch
+
+# Runs the jobs on the node with xargs -P from a private mktemp directory, returns {job id: etag} for every job that made it
+def RunNodeUploads(client, sshClient, bucketName, jobs, parallel):
+    stdin, stdout, stderr = sshClient.exec_command("mktemp -d /tmp/scylla_push_XXXXXX")
+    workDir = stdout.read().decode().strip()
+    if stdout.channel.recv_exit_status() != 0 or not workDir:
+        raise Exception(f"Could not create a work directory: {stderr.read().decode().strip()}")
+
+    etags = {}
+    sftpClient = sshClient.open_sftp()
+    try:
+        with sftpClient.open(f"{workDir}/upload.sh", 'w') as scriptFile:
+            scriptFile.write(NODE_UPLOAD_SCRIPT)
+        for batch in SignBatches(jobs):
+            with sftpClient.open(f"{workDir}/jobs.txt", 'w') as jobsFile:
+                sftpClient.chmod(f"{workDir}/jobs.txt", 0o600)
+                jobsFile.write("".join(f"{job['id']} {job['remote_path']} {job['offset']} {job['length']} "
+                                       f"{client.presigned_put_object(bucketName, job['object'], expires=MINIO_PRESIGN_EXPIRY)}\n" for job in batch))
+            stdin, stdout, stderr = sshClient.exec_command(f"xargs -P {parallel} -L 1 bash {workDir}/upload.sh < {workDir}/jobs.txt")
+            output = stdout.read().decode()
+            errorOutput = stderr.read().decode()
+            stdout.channel.recv_exit_status()
+            if errorOutput:
+                print(errorOutput.strip())
+            for line in output.splitlines():
+                jobId, etag = line.split(" ", 1)
+                etags[jobId] = etag.strip().strip('"')
+    finally:
         sftpClient.close()
+        stdin, stdout, stderr = sshClient.exec_command(f"rm -rf {workDir}")
+        stdout.channel.recv_exit_status()
+    return etags
 
-def RestoreKeySpaceFromLocal(hostIP, username, password, keySpace, localSnapshotPaths):
+def RemoveSegments(client, bucketName, segments):
+    for error in client.remove_objects(bucketName, [DeleteObject(segment["object"]) for segment in segments]):
+        print(f"Error removing segment {error.name}: {error.message}")
+
+def PushNodeSnapshotToMinio(client, endPoint, username, password, files, bucketName, objectPrefix, parallel):
+    uploads, jobs = PlanNodeUploads(objectPrefix, files)
+    sshClient = CreateSshClient(endPoint, 22, username, password)
     try:
-        # Connect to the remote ScyllaDB server
-        sshClient = CreateSshClient(hostIP, 22, username, password)
+        etags = RunNodeUploads(client, sshClient, bucketName, jobs, parallel)
+    finally:
+        sshClient.close()
 
-        for localPath in localSnapshotPaths:
-            tableNameWithUUID = localPath.split(os.path.sep)[-3]
-            # tableNameWithUUID = path_components[-3] 
-            match = re.match(r'([^\-]+)-(.*)', tableNameWithUUID)
-            tableName = match.group(1)
-            tableId = GetTableUuid(hostIP, keySpace, tableName)
-            uuid = str(tableId).replace("-", "")
-            
-            remoteTablePath = f"/var/lib/scylla/data/{keySpace}/{tableName}-{uuid}"
-            tempRemotePath = f"/tmp/temp_scylla_data/{tableName}-{uuid}"
-            stdin, stdout, stderr = sshClient.exec_command(f"mkdir -p {tempRemotePath}")
-            CheckForErrors(stdout, stderr)
-            snapshotPath = localPath
-            
-            with SCPClient(sshClient.get_transport()) as scp:
-                # Copy files from local backup to the remote snapshot directory
-                localFiles = os.listdir(snapshotPath)
-                for localFile in localFiles:
-                    localFilePath = os.path.join(snapshotPath, localFile)
-                    tmpremoteFilePath = os.path.join(tempRemotePath, localFile)
-                    try:
-                        scp.put(localFilePath, tmpremoteFilePath)
-                        print(f"Restored {localFilePath} to {tmpremoteFilePath}")
-                    except Exception as e:
-                        print(str(e))
-            
-            time.sleep(5)
-                    
-            command = f'echo {password} | sudo -S chown scylla:scylla {tempRemotePath}/*'
-            stdin, stdout, stderr = sshClient.exec_command(command)
-            CheckForErrors(stdout, stderr)
-            
-            command_move_files = f"echo {password} | sudo -S mv {tempRemotePath}/* {remoteTablePath}/"
-            print(command_move_files)
-            stdin, stdout, stderr = sshClient.exec_command(command_move_files)
-            CheckForErrors(stdout, stderr)
-
-            stderr_output = stderr.read().decode()
-            if stderr_output:
-                print("Error during moving files:", stderr_output)
-            
-            command = f'echo {password} | sudo -S rm -rf "{tempRemotePath}"'
-            stdin, stdout, stderr = sshClient.exec_command(command)
-            CheckForErrors(stdout, stderr)
+    results = []
+    for index, upload in enumerate(uploads):
+        item = upload["item"]
+        result = {
+            "keyspace": item["keyspace"],
+            "table": item["table_dir"].rsplit("-", 1)[0],
+            "table_dir": item["table_dir"],
+            "file": os.path.basename(item["remote_path"]),
+            "size": item["size"],
+            "object": upload["object"],
+            "status": False
+        }
+        if not upload["segments"]:
+            result["etag"] = etags.get(f"{index}.0")
+            result["status"] = result["etag"] is not None
+        else:
+            if all(segment["id"] in etags for segment in upload["segments"]):
+                # match_etag makes the join fail if a segment is not the one the node reported
+                sources = [ComposeSource(bucketName, segment["object"], match_etag=etags[segment["id"]]) for segment in upload["segments"]]
+                try:
+                    result["etag"] = client.compose_object(bucketName, upload["object"], sources).etag
+                    result["status"] = True
+                except Exception as e:
+                    print(f"Error joining segments of {upload['object']}: {e}")
+            RemoveSegments(client, bucketName, [segment for segment in upload["segments"] if segment["id"] in etags])
+        results.append(result)
+    return results
+
+# Snapshot all nodes together, then every node pushes its own files to <bucket>/<prefix>/<tag>/<node>/<ks>/<table_dir>/
+def ClusterSnapshotToMinio(endPoints, username, password, keySpaces, client, bucketName, prefix="scylla", parallel=None):
+    keySpaces = NormalizeKeyspaces(keySpaces)
+    endPoints = NormalizeKeyspaces(endPoints)
+    parallel = int(parallel) if parallel else MINIO_UPLOAD_PARALLEL
+    snapshotTag = f"backup_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    backupPrefix = f"{prefix.strip('/')}/{snapshotTag}" if prefix else snapshotTag
+    if not EnsureMinioBucket(client, bucketName):
+        raise Exception(f"Bucket '{bucketName}' is invalid or could not be created.")
+    nodes = {endPoint: {"status": False, "error": None, "files": []} for endPoint in endPoints}
+
+    def ClearNode(endPoint):
+        try:
+            ClearNodeSnapshot(endPoint, username, password, keySpaces, snapshotTag)
+        except Exception as e:
+            print(f"Error clearing snapshot {snapshotTag} on {endPoint}: {e}")
+            nodes[endPoint]["clear_error"] = str(e)
+
+    def SnapshotNode(endPoint):
+        try:
+            return TakeNodeSnapshot(endPoint, username, password, keySpaces, snapshotTag)
+        except Exception as e:
+            print(f"Error taking snapshot on {endPoint}: {e}")
+            nodes[endPoint]["error"] = str(e)
+            # Some keyspaces may already be snapshotted when nodetool failed
+            ClearNode(endPoint)
+            return None
+
+    def PushNode(endPoint, files):
+        try:
+            nodes[endPoint]["files"] = PushNodeSnapshotToMinio(client, endPoint, username, password, files, bucketName, f"{backupPrefix}/{endPoint}", parallel)
+            failed = [result["file"] for result in nodes[endPoint]["files"] if not result["status"]]
+            nodes[endPoint]["status"] = not failed
+            if failed:
+                nodes[endPoint]["error"] = f"{len(failed)} files failed to upload"
+            else:
+                # Every file is in the bucket, drop the hard links so the node does not keep the old SSTables around
+                ClearNode(endPoint)
+        except Exception as e:
+            print(f"Error pushing snapshot from {endPoint}: {e}")
+            nodes[endPoint]["error"] = str(e)
+
+    # Snapshots are triggered together, uploads then run on all nodes at once
+    with ThreadPoolExecutor(max_workers=max(1, len(endPoints))) as executor:
+        snapshotFiles = dict(zip(endPoints, executor.map(SnapshotNode, endPoints)))
+    with ThreadPoolExecutor(max_workers=max(1, len(endPoints))) as executor:
+        list(executor.map(lambda endPoint: PushNode(endPoint, snapshotFiles[endPoint]), [endPoint for endPoint in endPoints if snapshotFiles[endPoint] is not None]))
+
+    manifest = {
+        "snapshot_tag": snapshotTag,
+        "created_at": datetime.datetime.now().isoformat(),
+        "keyspaces": keySpaces,
+        "bucket": bucketName,
+        "prefix": backupPrefix,
+        "complete": all(node["status"] for node in nodes.values()),
+        "nodes": nodes
+    }
+    manifestData = json.dumps(manifest, indent=2).encode('utf-8')
+    client.put_object(bucketName, f"{backupPrefix}/manifest.json", io.BytesIO(manifestData), len(manifestData), content_type="application/json")
+    print(f"Cluster snapshot {snapshotTag} pushed to {bucketName}/{backupPrefix}, complete: {manifest['complete']}")
+    return manifest
 
-            # # Check if files were moved successfully
-            # command_list_dest_files = f"ls -l {remoteTablePath}"
-            # stdin, stdout, stderr = sshClient.exec_command(command_list_dest_files)
-            # print("Files in destination directory:")
-            # print(stdout.read().decode())
+# Restores upload SSTables to a staging directory over sftp, then one sudo command hands them to scylla and moves them
+SNAPSHOT_METADATA_FILES = ("manifest.json", "schema.cql")
 
+# Data directory name of every table in the keyspace from one system_schema query
+def GetKeyspaceTableDirs(host, username, password, keySpace):
+    authProvider = PlainTextAuthProvider(username, password)
+    cluster = Cluster([host], auth_provider=authProvider)
+    try:
+        session = cluster.connect()
+        rows = session.execute("SELECT table_name, id FROM system_schema.tables WHERE keyspace_name = %s", (keySpace,))
+        return {row.table_name: f"{row.table_name}-{str(row.id).replace('-', '')}" for row in rows}
+    finally:
+        cluster.shutdown()
+
+# Local snapshot directories look like <table>-<id>/snapshots/<tag>
+def SnapshotTableName(localPath):
+    tableNameWithUUID = os.path.normpath(localPath).split(os.path.sep)[-3]
+    return re.match(r'([^\-]+)-(.*)', tableNameWithUUID).group(1)
+
+def StageTableFiles(sshClient, sftpClient, localDir, stagedPath, transferMode="sftp", compression="zstd"):
+    localFiles = [localFile for localFile in os.listdir(localDir) if localFile not in SNAPSHOT_METADATA_FILES and os.path.isfile(os.path.join(localDir, localFile))]
+    if not localFiles:
+        raise Exception(f"No SSTables found in {localDir}.")
+    stdin, stdout, stderr = sshClient.exec_command(f"rm -rf {stagedPath} && mkdir -p {stagedPath}")
+    if stdout.channel.recv_exit_status() != 0:
+        raise Exception(f"Error preparing {stagedPath}: {stderr.read().decode().strip()}")
+    if transferMode == "tar":
+        SendTarStream(sshClient, localDir, localFiles, stagedPath, compression)
+        return len(localFiles)
+    for localFile in localFiles:
+        sftpClient.put(os.path.join(localDir, localFile), f"{stagedPath}/{localFile}")
+    return len(localFiles)
+
+# chown, move and cleanup in one sudo call, afterCommand runs once the files are in place
+def MoveStagedFiles(sshClient, password, stagedPath, destinationPath, afterCommand=None):
+    command = (f'echo {password} | sudo -S sh -c "chown scylla:scylla {stagedPath}/* && '
+               f'mv {stagedPath}/* {destinationPath}/ && rm -rf {stagedPath}"')
+    stdin, stdout, stderr = sshClient.exec_command(command)
+    if stdout.channel.recv_exit_status() != 0:
+        print(f"Error moving files into {destinationPath}: {stderr.read().decode()}")
+        return False
+    if afterCommand:
+        stdin, stdout, stderr = sshClient.exec_command(afterCommand)
+        if stdout.channel.recv_exit_status() != 0:
+            print(f"{afterCommand} failed: {stderr.read().decode()}")
+            return False
+        print(stdout.read().decode().strip())
+    return True
+
+# Uploading table N+1 overlaps the chown/mv of table N, both over the one ssh transport
+# tables: [{"label", "local_dir", "staged_path", "destination", "after"}], returns the labels that failed
+def RestoreStagedTables(sshClient, password, tables, transferMode="sftp", compression="zstd"):
+    moves = []
+    sftpClient = sshClient.open_sftp()
+    try:
+        with ThreadPoolExecutor(max_workers=1) as mover:
+            for table in tables:
+                fileCount = StageTableFiles(sshClient, sftpClient, table["local_dir"], table["staged_path"], transferMode, compression)
+                print(f"Staged {fileCount} files for {table['label']}.")
+                moves.append((table["label"], mover.submit(MoveStagedFiles, sshClient, password, table["staged_path"], table["destination"], table.get("after"))))
+    finally:
+        sftpClient.close()
+    return [label for label, move in moves if not move.result()]
+
+def RestoreKeySpaceFromLocal(hostIP, username, password, keySpace, localSnapshotPaths, transferMode="sftp", compression="zstd"):
+    if isinstance(localSnapshotPaths, str):
+        localSnapshotPaths = [localSnapshotPaths]
+    sshClient = None
+    try:
+        tableDirs = GetKeyspaceTableDirs(hostIP, username, password, keySpace)
+        tables = []
+        for localPath in localSnapshotPaths:
+            tableName = SnapshotTableName(localPath)
+            if tableName not in tableDirs:
+                print(f"Table {keySpace}.{tableName} does not exist, create the schema before restoring.")
+                return False
+            tables.append({
+                "label": f"{keySpace}.{tableName}",
+                "local_dir": localPath,
+                "staged_path": f"/tmp/temp_scylla_data/{keySpace}/{tableDirs[tableName]}",
+                "destination": f"{SCYLLA_DATA_DIR}/{keySpace}/{tableDirs[tableName]}"
+            })
+
+        # Connect to the remote ScyllaDB server once for every table
+        sshClient = CreateSshClient(hostIP, 22, username, password)
+        failed = RestoreStagedTables(sshClient, password, tables, transferMode, compression)
+        if failed:
+            print(f"Restoration failed for tables {failed}.")
+            return False
         print(f"Restoration of keyspace '{keySpace}' from local snapshots completed.")
         return True
 
@@ -440,7 +1211,218 @@ def RestoreKeySpaceFromLocal(hostIP, username, password, keySpace, localSnapshot
         return False
 
     finally:
-        sshClient.close()
+        if sshClient:
+            sshClient.close()
+
+# Online restore: SSTables are moved into the live table's upload/ directory and loaded with nodetool refresh,
+# the node keeps serving and nothing needs a restart
+# load-and-stream sends every partition to its current replicas, needed when the topology differs from the backup
+def RefreshTableEntry(keySpace, tableName, tableDir, localDir, loadAndStream=False):
+    refreshOption = " --load-and-stream" if loadAndStream else ""
+    return {
+        "label": f"{keySpace}.{tableName}",
+        "local_dir": localDir,
+        "staged_path": f"/tmp/scylla_upload/{keySpace}/{tableDir}",
+        "destination": f"{SCYLLA_DATA_DIR}/{keySpace}/{tableDir}/upload",
+        "after": f"nodetool refresh{refreshOption} {keySpace} {tableName}"
+    }
+
+# Same input as RestoreKeySpaceFromLocal
+def RestoreKeySpaceOnline(hostIP, username, password, keySpace, localSnapshotPaths, loadAndStream=False, transferMode="sftp", compression="zstd"):
+    if isinstance(localSnapshotPaths, str):
+        localSnapshotPaths = [localSnapshotPaths]
+    sshClient = None
+    try:
+        tableDirs = GetKeyspaceTableDirs(hostIP, username, password, keySpace)
+        tables = []
+        for localPath in localSnapshotPaths:
+            tableName = SnapshotTableName(localPath)
+            if tableName not in tableDirs:
+                print(f"Table {keySpace}.{tableName} does not exist, create the schema before restoring.")
+                return False
+            tables.append(RefreshTableEntry(keySpace, tableName, tableDirs[tableName], localPath, loadAndStream))
+        sshClient = CreateSshClient(hostIP, 22, username, password)
+        failed = RestoreStagedTables(sshClient, password, tables, transferMode, compression)
+        if failed:
+            print(f"Online restore failed for tables {failed}.")
+            return False
+        print(f"Online restore of keyspace '{keySpace}' completed.")
+        return True
+    except Exception as e:
+        print(f"Error during online restore: {e}")
+        return False
+    finally:
+        if sshClient:
+            sshClient.close()
+
+def RestoreTableOnline(host, username, password, keyspace, tablename, backupPath, loadAndStream=False, transferMode="sftp", compression="zstd"):
+    sshClient = None
+    try:
+        tableDirs = GetKeyspaceTableDirs(host, username, password, keyspace)
+        if tablename not in tableDirs:
+            print(f"Table {keyspace}.{tablename} does not exist.")
+            return False
+        sshClient = CreateSshClient(host, 22, username, password)
+        return not RestoreStagedTables(sshClient, password, [RefreshTableEntry(keyspace, tablename, tableDirs[tablename], backupPath, loadAndStream)], transferMode, compression)
+    except Exception as e:
+        print(f"An error occurred during online restore: {e}")
+        return False
+    finally:
+        if sshClient:
+            sshClient.close()
+
+
+# Logical export: SELECT JSON per token range, ranges run concurrently and each goes to a replica that owns it
+# Output is gzip NDJSON chunks plus schema.cql, usable on any topology or schema version that accepts INSERT JSON
+MURMUR3_MIN_TOKEN = -2 ** 63
+MURMUR3_MAX_TOKEN = 2 ** 63 - 1
+EXPORT_WORKERS = 16
+EXPORT_RANGES_PER_WORKER = 4
+EXPORT_FETCH_SIZE = 5000
+EXPORT_CHUNK_ROWS = 1000000
+EXPORT_RANGE_RETRIES = 3
+
+# (start, end] ranges covering the whole ring, cut at the ring's own tokens and split further up to `splits` ranges
+def SplitTokenRing(ringTokens, splits):
+    points = sorted(set(token for token in ringTokens if MURMUR3_MIN_TOKEN < token < MURMUR3_MAX_TOKEN))
+    bounds = [MURMUR3_MIN_TOKEN] + points + [MURMUR3_MAX_TOKEN]
+    ringRanges = list(zip(bounds, bounds[1:]))
+    perRange = max(1, -(-splits // len(ringRanges)))
+    ranges = []
+    for start, end in ringRanges:
+        step = max(1, (end - start) // perRange)
+        edges = sorted(set([start + step * index for index in range(perRange) if start + step * index < end] + [end]))
+        ranges.extend(zip(edges, edges[1:]))
+    return ranges
+
+# gzip NDJSON files of at most chunkRows rows, written as .partial and renamed once closed
+class NdjsonChunkWriter:
+    def __init__(self, exportDir, filePrefix, chunkRows=EXPORT_CHUNK_ROWS):
+        self.exportDir = exportDir
+        self.filePrefix = filePrefix
+        self.chunkRows = chunkRows
+        self.files = []
+        self.file = None
+        self.path = None
+        self.rows = 0
+
+    def Roll(self):
+        self.Close()
+        self.path = os.path.join(self.exportDir, f"{self.filePrefix}.{len(self.files):04d}.ndjson.gz")
+        self.file = gzip.open(self.path + ".partial", 'wt', encoding='utf-8', compresslevel=1)
+        self.rows = 0
+
+    def Write(self, line):
+        if self.file is None or self.rows >= self.chunkRows:
+            self.Roll()
+        self.file.write(line)
+        self.file.write("\n")
+        self.rows += 1
+
+    def Close(self):
+        if self.file is None:
+            return
+        self.file.close()
+        os.replace(self.path + ".partial", self.path)
+        self.files.append({"file": os.path.basename(self.path), "rows": self.rows, "bytes": os.path.getsize(self.path)})
+        self.file = None
+
+def ExportTableByTokenRange(endPoints, username, password, keyspace, tableName, backupPath, port=None, workers=None, splits=None):
+    endPoints = NormalizeKeyspaces(endPoints)
+    workers = int(workers) if workers else EXPORT_WORKERS
+    authProvider = PlainTextAuthProvider(username, password)
+    cluster = Cluster(endPoints, port=int(port) if port else 9042, auth_provider=authProvider,
+                      load_balancing_policy=TokenAwarePolicy(DCAwareRoundRobinPolicy()), executor_threads=max(2, workers // 4))
+    try:
+        session = cluster.connect()
+        keyspaceMeta = cluster.metadata.keyspaces.get(keyspace)
+        tableMeta = keyspaceMeta.tables.get(tableName) if keyspaceMeta else None
+        if tableMeta is None:
+            raise Exception(f"Table {keyspace}.{tableName} does not exist.")
+
+        exportDir = os.path.join(backupPath, f"{keyspace}.{tableName}_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}_logical")
+        os.makedirs(exportDir, exist_ok=True)
+        with open(os.path.join(exportDir, "schema.cql"), 'w') as schemaFile:
+            schemaFile.write(tableMeta.export_as_string())
+
+        partitionKey = ", ".join(f'"{column.name}"' for column in tableMeta.partition_key)
+        statement = session.prepare(f'SELECT JSON * FROM "{keyspace}"."{tableName}" WHERE token({partitionKey}) > ? AND token({partitionKey}) <= ?')
+        statement.fetch_size = EXPORT_FETCH_SIZE
+
+        tokenMap = cluster.metadata.token_map
+        ringTokens = [token.value for token in tokenMap.ring] if tokenMap else []
+        ranges = SplitTokenRing(ringTokens, int(splits) if splits else workers * EXPORT_RANGES_PER_WORKER)
+        print(f"Exporting {keyspace}.{tableName} as {len(ranges)} token ranges with {workers} workers.")
+
+        pending = queue.Queue()
+        for tokenRange in ranges:
+            pending.put(tokenRange)
+        lock = threading.Lock()
+        files = []
+        failedRanges = []
+        totals = {"rows": 0}
+
+        def ReplicaFor(start, end):
+            if not tokenMap:
+                return None
+            replicas = [host for host in tokenMap.get_replicas(keyspace, Murmur3Token(end)) if host.is_up]
+            return replicas[start % len(replicas)] if replicas else None
+
+        def Worker(workerId):
+            writer = NdjsonChunkWriter(exportDir, f"{tableName}.{workerId:03d}")
+            try:
+                while True:
+                    try:
+                        start, end = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    host = ReplicaFor(start, end)
+                    for attempt in range(1, EXPORT_RANGE_RETRIES + 1):
+                        try:
+                            rows = 0
+                            for row in session.execute(statement, (start, end), host=host):
+                                writer.Write(row[0])
+                                rows += 1
+                            with lock:
+                                totals["rows"] += rows
+                            break
+                        except Exception as e:
+                            # Rows of a failed attempt stay in the chunk, INSERT JSON upserts make the repeat harmless
+                            print(f"Error exporting range ({start}, {end}] attempt {attempt}: {e}")
+                            host = None
+                            if attempt == EXPORT_RANGE_RETRIES:
+                                with lock:
+                                    failedRanges.append({"start": start, "end": end, "error": str(e)})
+            finally:
+                writer.Close()
+                with lock:
+                    files.extend(writer.files)
+
+        threads = [threading.Thread(target=Worker, args=(workerId,)) for workerId in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        manifest = {
+            "keyspace": keyspace,
+            "table": tableName,
+            "partition_key": [column.name for column in tableMeta.partition_key],
+            "created_at": datetime.datetime.now().isoformat(),
+            "format": "ndjson.gz",
+            "ranges": len(ranges),
+            "rows": totals["rows"],
+            "bytes": sum(entry["bytes"] for entry in files),
+            "files": sorted(files, key=lambda entry: entry["file"]),
+            "failed_ranges": failedRanges,
+            "complete": not failedRanges
+        }
+        with open(os.path.join(exportDir, "manifest.json"), 'w') as manifestFile:
+            json.dump(manifest, manifestFile, indent=2)
+        print(f"Exported {manifest['rows']} rows of {keyspace}.{tableName} to {exportDir}, complete: {manifest['complete']}")
+        return exportDir, manifest
+    finally:
+        cluster.shutdown()
 
 
 # def CreatNewKeyspace(host, username, password, keyspace):
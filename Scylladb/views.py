@@ -16,45 +16,42 @@ load_dotenv()
 
 class ScyllaBackup(APIView):
     def get(self, request):
-        endPoints = request.query_params.get('end_points').split(',')
+        endPoints = request.query_params.get('end_points',None)
         scyllaHost = request.query_params.get('scylla_host',None)
         scyllaPort = request.query_params.get('scylla_port',None)
         scyllaPassword = request.query_params.get('scylla_password',None)
         scyllaUser = request.query_params.get('scylla_user',None)
+        refresh = request.query_params.get('refresh','false').lower() == 'true'
         
-        cluster = Cluster(endPoints, port=9042)
-        session = cluster.connect()
-        keySpaces = session.execute("SELECT keyspace_name FROM system_schema.keyspaces")
+        try:
+            # Served from the cache, one nodetool tablestats per node when it is missing
+            inventory = GetSizeInventory(endPoints or scyllaHost, scyllaUser, scyllaPassword, refresh)
+        except Exception as e:
+            payload = {
+                "status": False,
+                "message": "Could not read keyspace sizes.",
+                "data": None,
+                "error": str(e)
+            }
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
         
         keySpaceNames = []
-        totalSize = 0
-        for row in keySpaces:
-            keySpaceName=row.keyspace_name
-            try:
-                # Get estimated backup size for each keyspace
-                estimatedSizeDict, _ = GetEstimatedBackupSize(scyllaHost, scyllaUser, scyllaPassword, [keySpaceName])
-                estimatedSize = estimatedSizeDict.get(keySpaceName, "0 B")
-                sizeInBytes = ConvertToBytes(estimatedSize)  # You will need a helper function for this
-                totalSize += sizeInBytes 
-            except Exception as e:
-                estimatedSize = f"Error estimating size: {str(e)}"
-
-            # Add the keyspace and its size to the list
+        for keySpaceName, entry in sorted(inventory["keyspaces"].items()):
             keySpaceNames.append({
                 'keyspace_name': keySpaceName,
-                'estimated_size': estimatedSize
+                'estimated_size': FormatSize(entry["bytes"]),
+                'size_bytes': entry["bytes"],
+                'tables': entry["tables"]
             })
         
-        formattedTotalSize = FormatSize(totalSize)
-        
-        session.shutdown()
-        cluster.shutdown()
-        
         payload = {
                 "status": True,
                 "message": "List of available keyspaces in the cluster",
                 "data": keySpaceNames,
-                "total_size": formattedTotalSize,
+                "total_size": FormatSize(inventory["total_bytes"]),
+                "nodes": inventory["nodes"],
+                "complete": inventory["complete"],
+                "cached": inventory["cached"],
                 "error": None
             }
         return Response(payload, status=status.HTTP_200_OK)
@@ -71,10 +68,37 @@ class ScyllaBackup(APIView):
         tableName = data.get("table_name", None)
         backupPath = data.get("backup_path",None)
         
+        if backupPath and data.get("backup_mode", "snapshot") == "logical":
+            # Token-range parallel SELECT JSON export, restorable on any topology
+            if keySpaceName is None or tableName is None:
+                payload = {
+                    "status": False,
+                    "message": "Backup not initiated.",
+                    "data": None,
+                    "error": "Either keyspace or table not provided"
+                }
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                exportDir, manifest = ExportTableByTokenRange(data.get("end_points", None) or scyllaHost, scyllaUser, scyllaPassword, keySpaceName, tableName, backupPath, scyllaPort, data.get("workers", None), data.get("splits", None))
+            except Exception as e:
+                payload = {
+                    "status": False,
+                    "message": "Backup failed due to an error.",
+                    "data": None,
+                    "error": str(e)
+                }
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            payload = {
+                "status": manifest["complete"],
+                "message": "Backup done successfully" if manifest["complete"] else "Backup incomplete, some token ranges failed.",
+                "data": {"export_dir": exportDir, "manifest": manifest},
+                "error": None if manifest["complete"] else f"{len(manifest['failed_ranges'])} token ranges failed"
+            }
+            return Response(payload, status=status.HTTP_200_OK if manifest["complete"] else status.HTTP_400_BAD_REQUEST)
         if backupPath:
             if keySpaceName is not None and tableName is not None:
                 try:
-                    snapShotPaths = CaptureDataForSingleTable(scyllaHost, scyllaUser, scyllaPassword, keySpaceName, tableName, backupPath)
+                    snapShotPaths = CaptureDataForSingleTable(scyllaHost, scyllaUser, scyllaPassword, keySpaceName, tableName, backupPath, data.get("transfer_mode", "sftp"), data.get("compression", "zstd"))
                     payload = {
                         "status": True,
                         "message": "Backup done successfully",
@@ -161,9 +185,29 @@ class ScyllaRestoreForSingleTable(APIView):
         backupFile = data.get("backup_file", None)
         keyspace = data.get("keyspace",None)
         tableName = data.get("tablename",None)
+        # "tar" sends the files as one compressed stream instead of one sftp put per file
+        transferMode = data.get("transfer_mode", "sftp")
+        compression = data.get("compression", "zstd")
         
         try:
-            if RestoreDataForSingleTable(scyllaHost, scyllaUser, scyllaPassword, keyspace, tableName, backupFile):
+            if data.get("online", False):
+                # Loaded with nodetool refresh, no restart needed
+                if RestoreTableOnline(scyllaHost, scyllaUser, scyllaPassword, keyspace, tableName, backupFile, data.get("load_and_stream", False), transferMode, compression):
+                    payload = {
+                        "status": True,
+                        "message": f"Restoration of table {tableName} completed successfully.",
+                        "data": None,
+                        "error": None
+                    }
+                    return Response(payload, status=status.HTTP_200_OK)
+                payload = {
+                    "status": False,
+                    "message": "Restoration failed",
+                    "data": None,
+                    "error": "Check if the keyspace and table name are correct."
+                }
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            if RestoreDataForSingleTable(scyllaHost, scyllaUser, scyllaPassword, keyspace, tableName, backupFile, transferMode, compression):
                 payload = {
                     "status": True,
                     "message": f"Restoration of table {tableName} completed successfully. Please restart ScyllaDB to reflect the newly backed-up data.",
@@ -197,9 +241,94 @@ class ScyllaBackupKeyspace(APIView):
         
         keyspaceName = request.data.get("keyspace_name",None)
         backupPath = request.data.get("backup_path",None)
+        streams = request.data.get("streams",None)
+        endPoints = request.data.get("end_points",None)
+        minioBucket = request.data.get("minio_bucket",None)
+        if keyspaceName and minioBucket:
+            # Nodes upload their own snapshots straight into the bucket, nothing is stored on this host
+            from MinioObjectStore.utils import InitializeClient
+            client = InitializeClient(request.data.get('minio_endpoint',None), request.data.get('minio_access_key',None), request.data.get('minio_secret_key',None), request.data.get('minio_secure',False))
+            try:
+                manifest = ClusterSnapshotToMinio(endPoints or scyllaHost, scyllaUser, scyllaPassword, keyspaceName, client, minioBucket, request.data.get("minio_prefix","scylla"), request.data.get("upload_parallel",None))
+            except Exception as e:
+                payload = {
+                    "status": False,
+                    "message": "Backup to MinIO failed.",
+                    "data": None,
+                    "error": str(e)
+                }
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            if not manifest["complete"]:
+                payload = {
+                    "status": False,
+                    "message": "Backup to MinIO incomplete.",
+                    "data": manifest,
+                    "error": "; ".join(f"{node}: {result['error']}" for node, result in manifest["nodes"].items() if not result["status"])
+                }
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            payload = {
+                "status": True,
+                "message": f"Backup pushed to {minioBucket}/{manifest['prefix']}",
+                "data": manifest,
+                "error": None
+            }
+            return Response(payload, status=status.HTTP_200_OK)
+        if backupPath and keyspaceName and endPoints:
+            # Every node of the ring under one snapshot tag
+            try:
+                backupDir, manifest = ClusterKeyspaceSnapshot(endPoints, scyllaUser, scyllaPassword, keyspaceName, backupPath, streams)
+            except Exception as e:
+                payload = {
+                    "status": False,
+                    "message": "Cluster backup failed due to an error.",
+                    "data": None,
+                    "error": str(e)
+                }
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            if not manifest["complete"]:
+                payload = {
+                    "status": False,
+                    "message": "Cluster backup incomplete.",
+                    "data": {"backup_dir": backupDir, "manifest": manifest},
+                    "error": "; ".join(f"{node}: {result['error']}" for node, result in manifest["nodes"].items() if not result["status"])
+                }
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            payload = {
+                "status": True,
+                "message": "Cluster backup done",
+                "data": {"backup_dir": backupDir, "manifest": manifest},
+                "error": None
+            }
+            return Response(payload, status=status.HTTP_200_OK)
+        if backupPath and keyspaceName and request.data.get("incremental",False):
+            # Only SSTables not already in the catalog under backup_path are transferred, verify_checksums also hashes the stored ones
+            result = IncrementalKeyspaceBackup(scyllaHost, scyllaUser, scyllaPassword, keyspaceName, backupPath, streams, request.data.get("include_incremental_backups",False), request.data.get("verify_checksums",False))
+            if not result or result["failed"]:
+                payload = {
+                    "status": False,
+                    "message": "Incremental backup failed.",
+                    "data": result,
+                    "error": "Snapshot or file transfer failed."
+                }
+                return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+            payload = {
+                "status": True,
+                "message": "Incremental backup done",
+                "data": result,
+                "error": None
+            }
+            return Response(payload, status=status.HTTP_200_OK)
         if backupPath:
             if keyspaceName:
-                path = CaptureKeySpaceSnapshot(scyllaHost, scyllaUser, scyllaPassword, keyspaceName, backupPath)
+                path = CaptureKeySpaceSnapshot(scyllaHost, scyllaUser, scyllaPassword, keyspaceName, backupPath, streams, request.data.get("transfer_mode","sftp"), request.data.get("compression","zstd"))
+                if not path or path.get("failed"):
+                    payload = {
+                        "status": False,
+                        "message": "Backup failed.",
+                        "data": path,
+                        "error": "Snapshot or file transfer failed."
+                    }
+                    return Response(payload, status=status.HTTP_400_BAD_REQUEST)
                 payload = {
                     "status": True,
                     "message": "Backup done",
@@ -232,16 +361,41 @@ class ScyllaRestoreKeyspace(APIView):
         
         keyspaceName = request.data.get("keyspace_name",None)
         backupFile = request.data.get("backup_file",None)
+        transferMode = request.data.get("transfer_mode","sftp")
+        compression = request.data.get("compression","zstd")
         
-        if backupFile:
-            RestoreKeySpaceFromLocal(scyllaHost, scyllaUser, scyllaPassword, keyspaceName, backupFile)
+        if backupFile and request.data.get("online",False):
+            if RestoreKeySpaceOnline(scyllaHost, scyllaUser, scyllaPassword, keyspaceName, backupFile, request.data.get("load_and_stream",False), transferMode, compression):
+                payload = {
+                    "status": True,
+                    "message": f"Restore done for keyspaces {keyspaceName}.",
+                    "data": None,
+                    "error": None
+                }
+                return Response(payload, status=status.HTTP_200_OK)
             payload = {
+                "status": False,
+                "message": "Restore failed.",
+                "data": None,
+                "error": "Staging the files or nodetool refresh failed."
+            }
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
+        if backupFile:
+            if RestoreKeySpaceFromLocal(scyllaHost, scyllaUser, scyllaPassword, keyspaceName, backupFile, transferMode, compression):
+                payload = {
                     "status": True,
                     "message": f"Restore done for keyspaces {keyspaceName}. Please restart ScyllaDB to reflect the newly backed-up data.",
-                    "data": "path",
+                    "data": None,
                     "error": None
                 }
-            return Response(payload, status=status.HTTP_200_OK)
+                return Response(payload, status=status.HTTP_200_OK)
+            payload = {
+                "status": False,
+                "message": "Restore failed.",
+                "data": None,
+                "error": "Staging or moving the files into the data directory failed."
+            }
+            return Response(payload, status=status.HTTP_400_BAD_REQUEST)
         else:
             payload = {
                 "status": False,